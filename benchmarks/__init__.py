@@ -0,0 +1 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
@@ -0,0 +1,91 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import copy
+import os
+import random
+import tempfile
+import time
+
+import solution
+from benchmarks.schedule import generate_network_schedule
+
+#
+# All bags benchmark: trips for every number of bags (0 to --bags) found by
+# separate searches (one per number of bags) vs. single search without bags
+# whose trips are priced with bags
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.bags --bags 2 --return
+#
+
+
+def separate(flight_oracle: solution.FlightOracle, queries) -> int:
+    trips = 0
+    for query in queries:
+        for bags_count in range(query.bags_count + 1):
+            bags_query = copy.copy(query)
+            bags_query.bags_count = bags_count
+            trips += len(flight_oracle.find_flights(bags_query).trips)
+    return trips
+
+
+def single(flight_oracle: solution.FlightOracle, queries) -> int:
+    return sum(
+        len(result.trips)
+        for query in queries
+        for result in flight_oracle.find_flights_by_bags(query)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="All bags benchmark.")
+    parser.add_argument("--airports", type=int, default=60, help="number of airports")
+    parser.add_argument(
+        "--flights_per_day", type=int, default=1000, help="daily routes count"
+    )
+    parser.add_argument("--days", type=int, default=3, help="schedule span in days")
+    parser.add_argument("--queries", type=int, default=10, help="queries count")
+    parser.add_argument("--max_stops", type=int, default=2, help="query max stops")
+    parser.add_argument("--bags", type=int, default=2, help="maximum number of bags")
+    parser.add_argument(
+        "--return", action="store_true", default=False, help="return trips"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = solution.FlightDataset(
+            generate_network_schedule(
+                os.path.join(tmp_dir, "schedule.csv"),
+                airports=args.airports,
+                flights_per_day=args.flights_per_day,
+                days=args.days,
+            )
+        ).load()
+    rnd = random.Random(42)
+    airports = sorted(dataset.srcs & dataset.dsts)
+    queries = [
+        solution.FlightQuery(
+            origin=origin,
+            destination=destination,
+            bags_count=args.bags,
+            max_stops=args.max_stops,
+            return_ticket=getattr(args, "return"),
+        )
+        for origin, destination in (
+            rnd.sample(airports, 2) for _ in range(args.queries)
+        )
+    ]
+
+    print(f"Flights: {len(dataset)}   queries: {args.queries}   bags: 0-{args.bags}")
+    for name, search in (("separate", separate), ("single", single)):
+        # first run builds reachability indices
+        flight_oracle = solution.FlightOracle(dataset)
+        search(flight_oracle, queries)
+        start = time.perf_counter()
+        trips = search(flight_oracle, queries)
+        print(f"  {name:10} {time.perf_counter() - start:8.3f}s   trips: {trips}")
+
+
+if __name__ == "__main__":
+    main()
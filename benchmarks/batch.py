@@ -0,0 +1,63 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+
+import solution
+from benchmarks.loadtest import random_queries
+from benchmarks.schedule import generate_schedule
+
+#
+# Batch search benchmark: queries per second by number of worker processes
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.batch --rows 100000 --queries 2000 --workers 1 2 4 8
+#
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch search benchmark.")
+    parser.add_argument("--rows", type=int, default=50000, help="number of flights")
+    parser.add_argument("--airports", type=int, default=50, help="number of airports")
+    parser.add_argument("--queries", type=int, default=1000, help="queries count")
+    parser.add_argument("--top_k", type=int, default=10, help="query top K")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+        help="numbers of worker processes",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset_path = generate_schedule(
+            os.path.join(tmp_dir, "schedule.csv"),
+            args.rows,
+            airports=args.airports,
+            days=7,
+        )
+        queries = [
+            json.dumps(q)
+            for q in random_queries(dataset_path, args.queries, 42, args.top_k)
+        ]
+        baseline = None
+        print(f"Flights: {args.rows}   queries: {args.queries}")
+        for workers in args.workers:
+            start = time.perf_counter()
+            solution.search_batch(dataset_path, queries, io.StringIO(), workers)
+            duration = time.perf_counter() - start
+            throughput = args.queries / duration
+            baseline = baseline or throughput
+            print(
+                f"  workers {workers:>3}: {throughput:10.1f} queries/s   "
+                f"speedup {throughput / baseline:5.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import solution
+from benchmarks.schedule import generate_schedule
+
+#
+# Bidirectional search benchmark: breadth first search vs. meet-in-the-middle
+# search of all trips by the maximum number of stops on a dense network
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.bidirectional --rows 3000 --airports 20 --max_stops 3 4 5
+#
+
+
+def run(flight_oracle: solution.FlightOracle, queries, engine: str):
+    trips = 0
+    start = time.perf_counter()
+    for query in queries:
+        query.engine = engine
+        trips += sum(1 for _ in flight_oracle.iter_flights(query))
+    return time.perf_counter() - start, trips
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bidirectional search benchmark.")
+    parser.add_argument("--rows", type=int, default=3000, help="number of flights")
+    parser.add_argument("--airports", type=int, default=20, help="number of airports")
+    parser.add_argument("--days", type=int, default=7, help="schedule span in days")
+    parser.add_argument("--queries", type=int, default=5, help="queries count")
+    parser.add_argument(
+        "--max_stops", type=int, nargs="+", default=[3, 4, 5], help="query max stops"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = solution.FlightDataset(
+            generate_schedule(
+                os.path.join(tmp_dir, "schedule.csv"),
+                args.rows,
+                airports=args.airports,
+                days=args.days,
+            )
+        ).load()
+    flight_oracle = solution.FlightOracle(dataset)
+    rnd = random.Random(42)
+    airports = sorted(dataset.srcs & dataset.dsts)
+    pairs = [rnd.sample(airports, 2) for _ in range(args.queries)]
+
+    print(f"Flights: {args.rows}   airports: {args.airports}   queries: {args.queries}")
+    for max_stops in args.max_stops:
+        queries = [
+            solution.FlightQuery(
+                origin=origin, destination=destination, max_stops=max_stops
+            )
+            for origin, destination in pairs
+        ]
+        bfs_secs, bfs_trips = run(
+            flight_oracle, queries, solution.FlightQuery.ENGINE_BFS
+        )
+        bidi_secs, bidi_trips = run(
+            flight_oracle, queries, solution.FlightQuery.ENGINE_BIDIRECTIONAL
+        )
+        assert bfs_trips == bidi_trips
+        print(
+            f"  {max_stops} stops ({bfs_trips:9} trips)   BFS: {bfs_secs:8.3f}s   "
+            f"bidirectional: {bidi_secs:8.3f}s   ({bfs_secs / bidi_secs:5.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import solution
+from benchmarks.schedule import generate_network_schedule
+
+#
+# Asynchronous search benchmark: query with unlimited stops searched by blocking
+# find_flights() vs. find_flights_async() with a deadline - search time, trips
+# and the maximum event loop lag (delay of a concurrent 1ms ticker task)
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.deadline --deadline 0.1 --yield_every 100 1000 10000
+#
+
+
+async def measure(search) -> tuple:
+    lag: float = 0.0
+
+    async def ticker() -> None:
+        nonlocal lag
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - start - 0.001)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    result = await search()
+    secs = time.perf_counter() - start
+    # the ticker measures delay of the tick blocked by the search
+    await asyncio.sleep(0.01)
+    ticker_task.cancel()
+    return secs, result, lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Asynchronous search benchmark.")
+    parser.add_argument("--airports", type=int, default=60, help="number of airports")
+    parser.add_argument(
+        "--flights_per_day", type=int, default=1000, help="daily routes count"
+    )
+    parser.add_argument("--days", type=int, default=3, help="schedule span in days")
+    parser.add_argument(
+        "--deadline", type=float, default=0.1, help="search deadline (seconds)"
+    )
+    parser.add_argument(
+        "--yield_every",
+        type=int,
+        nargs="+",
+        default=[100, 1000, 10000],
+        help="expansions between yields to the event loop",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = solution.FlightDataset(
+            generate_network_schedule(
+                os.path.join(tmp_dir, "schedule.csv"),
+                airports=args.airports,
+                flights_per_day=args.flights_per_day,
+                days=args.days,
+            )
+        ).load()
+    rnd = random.Random(42)
+    origin, destination = rnd.sample(sorted(dataset.srcs & dataset.dsts), 2)
+    # unlimited stops
+    query = solution.FlightQuery(origin=origin, destination=destination)
+    flight_oracle = solution.FlightOracle(dataset)
+    # reachability index is built by the first search
+    flight_oracle.find_flights(
+        solution.FlightQuery(origin=origin, destination=destination, max_stops=1)
+    )
+
+    async def blocking():
+        return flight_oracle.find_flights(query)
+
+    print(f"Flights: {len(dataset)}   query: {origin} -> {destination}")
+    secs, result, lag = asyncio.run(measure(blocking))
+    print(
+        f"  {'blocking':22} {secs:8.3f}s   trips: {len(result.trips):7}   "
+        f"max lag: {lag * 1000:8.1f}ms"
+    )
+    for yield_every in args.yield_every:
+
+        async def cooperative():
+            return await flight_oracle.find_flights_async(
+                query,
+                deadline=time.monotonic() + args.deadline,
+                yield_every=yield_every,
+            )
+
+        secs, result, lag = asyncio.run(measure(cooperative))
+        print(
+            f"  {f'async yield {yield_every}':22} {secs:8.3f}s   "
+            f"trips: {len(result.trips):7}   max lag: {lag * 1000:8.1f}ms"
+            f"   truncated: {result.truncated}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import solution
+from benchmarks.schedule import generate_network_schedule
+
+#
+# Depth first search benchmark: streamed (not held) trips of queries with
+# increasing max stops searched by breadth first search vs. depth first search
+# engine - time, trips and traced peak memory of the search (by another run -
+# tracing slows the search down)
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.dfs --max_stops 2 4 0
+#
+
+
+def stream(flight_oracle: solution.FlightOracle, query: solution.FlightQuery) -> int:
+    return sum(1 for _ in flight_oracle.iter_flights(query))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Depth first search benchmark.")
+    parser.add_argument("--airports", type=int, default=60, help="number of airports")
+    parser.add_argument(
+        "--flights_per_day", type=int, default=1000, help="daily routes count"
+    )
+    parser.add_argument("--days", type=int, default=3, help="schedule span in days")
+    parser.add_argument(
+        "--max_stops",
+        type=int,
+        nargs="+",
+        default=[2, 4, 0],
+        help="query max stops (0 stands for unlimited)",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = solution.FlightDataset(
+            generate_network_schedule(
+                os.path.join(tmp_dir, "schedule.csv"),
+                airports=args.airports,
+                flights_per_day=args.flights_per_day,
+                days=args.days,
+            )
+        ).load()
+    rnd = random.Random(42)
+    origin, destination = rnd.sample(sorted(dataset.srcs & dataset.dsts), 2)
+    flight_oracle = solution.FlightOracle(dataset)
+    # reachability index is built by the first search
+    flight_oracle.find_flights(
+        solution.FlightQuery(origin=origin, destination=destination, max_stops=1)
+    )
+
+    print(f"Flights: {len(dataset)}   query: {origin} -> {destination}")
+    for max_stops in args.max_stops:
+        for engine in (
+            solution.FlightQuery.ENGINE_BFS,
+            solution.FlightQuery.ENGINE_DFS,
+        ):
+            query = solution.FlightQuery(
+                origin=origin,
+                destination=destination,
+                max_stops=max_stops,
+                engine=engine,
+            )
+            start = time.perf_counter()
+            trips = stream(flight_oracle, query)
+            secs = time.perf_counter() - start
+            tracemalloc.start()
+            stream(flight_oracle, query)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(
+                f"  {f'max stops {max_stops or None}':16} {engine:4} {secs:8.3f}s   "
+                f"trips: {trips:7}   traced peak: {peak / 2**20:7.2f}MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
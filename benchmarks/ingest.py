@@ -0,0 +1,82 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import os
+import tempfile
+import time
+
+import solution
+from benchmarks.memory import DictFlightDataset
+from benchmarks.schedule import generate_schedule
+
+#
+# CSV ingestion benchmark: rows per second of dataset loaders
+#
+# - dict   ... original csv.DictReader + strptime dict store
+# - rows   ... csv.DictReader + FlightDataset.add_row()
+# - fast   ... chunked columnar parser (fromisoformat + cache)
+# - numpy  ... chunked columnar parser with NumPy vectorized parsing
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.ingest --rows 10000000
+#   python3 -m benchmarks.ingest --dataset /tmp/schedule.csv
+#
+
+
+def load_rows(dataset_path: str):
+    return solution.FlightDataset(dataset_path).load(fast=False)
+
+
+def load_fast(dataset_path: str):
+    solution.OPT_NUMPY_CSV_PARSING = False
+    try:
+        return solution.FlightDataset(dataset_path).load()
+    finally:
+        solution.OPT_NUMPY_CSV_PARSING = True
+
+
+def load_numpy(dataset_path: str):
+    return solution.FlightDataset(dataset_path).load()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV ingestion benchmark.")
+    parser.add_argument(
+        "--rows", type=int, default=10000000, help="number of generated flights"
+    )
+    parser.add_argument(
+        "--dataset", type=str, default="", help="optional existing CSV dataset"
+    )
+    parser.add_argument(
+        "--loaders",
+        nargs="+",
+        default=["dict", "rows", "fast", "numpy"],
+        help="loaders to benchmark",
+    )
+    args = parser.parse_args()
+
+    loaders = {
+        "dict": lambda path: DictFlightDataset(path).load(),
+        "rows": load_rows,
+        "fast": load_fast,
+        "numpy": load_numpy,
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset_path = args.dataset or generate_schedule(
+            os.path.join(tmp_dir, "schedule.csv"), args.rows
+        )
+        with open(dataset_path) as csv_file:
+            rows = sum(1 for _ in csv_file) - 1
+        print(f"Flights: {rows}")
+        for name in args.loaders:
+            if name == "numpy" and solution.numpy is None:
+                print(f"  {name:6}: NumPy is not installed")
+                continue
+            start = time.perf_counter()
+            loaders[name](dataset_path)
+            duration = time.perf_counter() - start
+            print(f"  {name:6}: {duration:8.3f}s   {int(rows / duration):>10} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import solution
+from benchmarks.schedule import generate_network_schedule
+
+#
+# Search limits benchmark: query with unlimited stops searched without limits
+# vs. with memory limit which truncates trips or continues by iterative
+# deepening depth first search - time, trips, estimated (stats) and traced peak
+# memory (by another run - tracing slows the search down)
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.limits --max_memory 8
+#
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search limits benchmark.")
+    parser.add_argument("--airports", type=int, default=60, help="number of airports")
+    parser.add_argument(
+        "--flights_per_day", type=int, default=1000, help="daily routes count"
+    )
+    parser.add_argument("--days", type=int, default=3, help="schedule span in days")
+    parser.add_argument("--max_stops", type=int, default=0, help="query max stops")
+    parser.add_argument(
+        "--max_memory", type=int, default=8, help="query memory limit (MB)"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = solution.FlightDataset(
+            generate_network_schedule(
+                os.path.join(tmp_dir, "schedule.csv"),
+                airports=args.airports,
+                flights_per_day=args.flights_per_day,
+                days=args.days,
+            )
+        ).load()
+    rnd = random.Random(42)
+    origin, destination = rnd.sample(sorted(dataset.srcs & dataset.dsts), 2)
+    flight_oracle = solution.FlightOracle(dataset)
+    # reachability index is built by the first search
+    flight_oracle.find_flights(
+        solution.FlightQuery(origin=origin, destination=destination, max_stops=1)
+    )
+
+    print(
+        f"Flights: {len(dataset)}   query: {origin} -> {destination}   "
+        f"max stops: {args.max_stops}"
+    )
+    for name, max_memory, on_limit in (
+        ("unlimited", 0, solution.FlightQuery.ON_LIMIT_TRUNCATE),
+        (
+            f"{args.max_memory}MB truncate",
+            args.max_memory,
+            solution.FlightQuery.ON_LIMIT_TRUNCATE,
+        ),
+        (
+            f"{args.max_memory}MB iddfs",
+            args.max_memory,
+            solution.FlightQuery.ON_LIMIT_IDDFS,
+        ),
+    ):
+        query = solution.FlightQuery(
+            origin=origin,
+            destination=destination,
+            max_stops=args.max_stops,
+            max_memory_mb=max_memory,
+            on_limit=on_limit,
+        )
+        stats = solution.FlightSearchStats()
+        start = time.perf_counter()
+        result = flight_oracle.find_flights(query, stats)
+        secs = time.perf_counter() - start
+        del result
+        tracemalloc.start()
+        result = flight_oracle.find_flights(query)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            f"  {name:16} {secs:8.3f}s   trips: {len(result.trips):7}   "
+            f"truncated: {result.truncated!s:5}   estimated peak: "
+            f"{stats.peak_bytes / 2**20:7.1f}MB   traced peak: {peak / 2**20:7.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Dict
+from typing import List
+
+import solution
+
+#
+# Load test client of flight search server (solution.py serve) reporting
+# latency percentiles and throughput
+#
+# Usage examples:
+#
+#   python3 -m solution serve datasets/example3.csv --port 8642 &
+#   python3 -m benchmarks.loadtest datasets/example3.csv --port 8642
+#
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def random_queries(dataset_path: str, count: int, seed: int, top_k: int) -> List[Dict]:
+    dataset = solution.FlightDataset(dataset_path).load()
+    origins = sorted(dataset.srcs)
+    destinations = sorted(dataset.dsts)
+    rnd = random.Random(seed)
+    queries: List[Dict] = []
+    while len(queries) < count:
+        origin, destination = rnd.choice(origins), rnd.choice(destinations)
+        if origin != destination:
+            queries.append(
+                {
+                    "id": len(queries),
+                    "origin": origin,
+                    "destination": destination,
+                    "bags_count": rnd.randint(0, 2),
+                    "top_k": top_k,
+                }
+            )
+    return queries
+
+
+async def client(host: str, port: int, queries: List[Dict], latencies: List[float]):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for query in queries:
+            start = time.perf_counter()
+            writer.write(json.dumps(query).encode("utf-8") + b"\n")
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+            if "error" in response:
+                raise ValueError(f"Query {query} failed: {response['error']}")
+    finally:
+        writer.close()
+
+
+async def load_test(
+    host: str, port: int, queries: List[Dict], concurrency: int
+) -> Dict:
+    latencies: List[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(
+        *[
+            client(host, port, queries[i::concurrency], latencies)
+            for i in range(concurrency)
+        ]
+    )
+    duration = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "concurrency": concurrency,
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(1000 * percentile(latencies, 50), 2),
+        "p99_ms": round(1000 * percentile(latencies, 99), 2),
+        "mean_ms": round(1000 * statistics.mean(latencies), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flight search server load test.")
+    parser.add_argument(
+        "dataset_path", type=str, help="dataset served by the server (queries)"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="server host")
+    parser.add_argument("--port", type=int, default=8642, help="server port")
+    parser.add_argument("--requests", type=int, default=1000, help="requests count")
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="concurrent connections"
+    )
+    parser.add_argument("--top_k", type=int, default=10, help="query top K")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    args = parser.parse_args()
+
+    queries = random_queries(args.dataset_path, args.requests, args.seed, args.top_k)
+    print(
+        json.dumps(
+            asyncio.run(load_test(args.host, args.port, queries, args.concurrency))
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
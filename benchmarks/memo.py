@@ -0,0 +1,79 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import solution
+from benchmarks.schedule import generate_schedule
+
+#
+# Sub-route cache benchmark: repeated and overlapping queries with and without
+# SubRouteCache on a warm FlightOracle
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.memo --rows 20000 --queries 200
+#
+
+
+def run(flight_oracle: solution.FlightOracle, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        flight_oracle.find_flights(query)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sub-route cache benchmark.")
+    parser.add_argument("--rows", type=int, default=20000, help="number of flights")
+    parser.add_argument("--airports", type=int, default=40, help="number of airports")
+    parser.add_argument("--queries", type=int, default=200, help="queries count")
+    parser.add_argument(
+        "--destinations", type=int, default=5, help="number of query destinations"
+    )
+    parser.add_argument("--max_stops", type=int, default=2, help="query max stops")
+    parser.add_argument("--cache_mb", type=int, default=512, help="cache size")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = solution.FlightDataset(
+            generate_schedule(
+                os.path.join(tmp_dir, "schedule.csv"),
+                args.rows,
+                airports=args.airports,
+                days=7,
+            )
+        ).load()
+    rnd = random.Random(42)
+    airports = sorted(dataset.srcs & dataset.dsts)
+    # overlapping queries - many origins to a few destinations
+    destinations = rnd.sample(airports, args.destinations)
+    queries = []
+    while len(queries) < args.queries:
+        origin, destination = rnd.choice(airports), rnd.choice(destinations)
+        if origin != destination:
+            queries.append(
+                solution.FlightQuery(
+                    origin=origin,
+                    destination=destination,
+                    bags_count=rnd.randint(0, 1),
+                    max_stops=args.max_stops,
+                )
+            )
+
+    cache = solution.SubRouteCache(max_bytes=args.cache_mb * 2**20)
+    no_cache_secs = run(solution.FlightOracle(dataset), queries)
+    cached_oracle = solution.FlightOracle(dataset, cache=cache)
+    cold_secs = run(cached_oracle, queries)
+    cold_stats = cache.stats()
+    warm_secs = run(cached_oracle, queries)
+    print(f"Flights: {args.rows}   queries: {args.queries}")
+    print(f"  no cache  : {no_cache_secs:8.3f}s")
+    print(f"  cold cache: {cold_secs:8.3f}s   {cold_stats}")
+    print(f"  warm cache: {warm_secs:8.3f}s   {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import collections
+import csv
+import datetime
+import os
+import tempfile
+import time
+import tracemalloc
+
+import solution
+from benchmarks.schedule import generate_schedule
+
+#
+# Memory benchmark: columnar FlightDataset vs. original per-row dict store
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.memory --rows 1000000
+#
+
+
+class DictFlightDataset:
+    """Original flight store - one csv.DictReader dict per flight."""
+
+    def __init__(self, dataset_path: str):
+        self._dataset_path = dataset_path
+        self.srcs: set = set()
+        self.dsts: set = set()
+        self.dg_edges_by_src = collections.defaultdict(list)
+        self.dg_edges_by_dst = collections.defaultdict(list)
+
+    def add_row(self, row: dict) -> None:
+        row["departure_obj"] = datetime.datetime.strptime(
+            row["departure"], solution.FlightDataset.FORMAT_DATETIME
+        )
+        row["arrival_obj"] = datetime.datetime.strptime(
+            row["arrival"], solution.FlightDataset.FORMAT_DATETIME
+        )
+        row["flight_seconds"] = (
+            row["arrival_obj"] - row["departure_obj"]
+        ).total_seconds()
+        row["base_price"] = float(row["base_price"])
+        row["bag_price"] = float(row["bag_price"])
+        row["bags_allowed"] = int(row["bags_allowed"])
+        self.srcs.add(row["origin"])
+        self.dg_edges_by_src[row["origin"]].append(row)
+        self.dsts.add(row["destination"])
+        self.dg_edges_by_dst[row["destination"]].append(row)
+
+    def load(self) -> "DictFlightDataset":
+        with open(self._dataset_path, mode="r") as csv_file:
+            for row in csv.DictReader(csv_file):
+                self.add_row(row)
+        return self
+
+
+def measure(name: str, factory, dataset_path: str) -> dict:
+    # load time is measured without tracemalloc which slows allocations down
+    start = time.perf_counter()
+    factory(dataset_path).load()
+    duration = time.perf_counter() - start
+
+    tracemalloc.start()
+    dataset = factory(dataset_path).load()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del dataset
+    return {
+        "store": name,
+        "load_secs": round(duration, 3),
+        "resident_mb": round(current / 2**20, 1),
+        "peak_mb": round(peak / 2**20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flight store memory benchmark.")
+    parser.add_argument("--rows", type=int, default=200000, help="number of flights")
+    parser.add_argument("--airports", type=int, default=100, help="number of airports")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset_path = generate_schedule(
+            os.path.join(tmp_dir, "schedule.csv"), args.rows, args.airports
+        )
+        results = [
+            measure("dict", DictFlightDataset, dataset_path),
+            measure("columnar", solution.FlightDataset, dataset_path),
+        ]
+    print(f"Flights: {args.rows}")
+    for r in results:
+        print(
+            f"  {r['store']:10}: resident {r['resident_mb']:8} MB"
+            f"   peak {r['peak_mb']:8} MB   load {r['load_secs']:6} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
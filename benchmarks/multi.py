@@ -0,0 +1,106 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import solution
+from benchmarks.schedule import generate_network_schedule
+
+#
+# Multiple origins/destinations benchmark: query of origins x destinations
+# (and to anywhere) searched as single traversal vs. loop of queries of all
+# (origin, destination) pairs
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.multi --origins 3 --destinations 10 --top_k 3
+#
+
+
+def loop(flight_oracle: solution.FlightOracle, query: solution.FlightQuery) -> int:
+    top_k = query.top_k or (1 if query.is_anywhere() else 0)
+    destinations = query.destinations() or sorted(flight_oracle.dataset.dsts)
+    trips = 0
+    for origin in query.origins():
+        for destination in destinations:
+            if origin != destination:
+                trips += len(
+                    flight_oracle.find_flights(
+                        solution.FlightQuery(
+                            origin=origin,
+                            destination=destination,
+                            max_stops=query.max_stops,
+                            top_k=top_k,
+                        )
+                    ).trips
+                )
+    return trips
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multiple origins/destinations.")
+    parser.add_argument("--airports", type=int, default=60, help="number of airports")
+    parser.add_argument(
+        "--flights_per_day", type=int, default=1000, help="daily routes count"
+    )
+    parser.add_argument("--days", type=int, default=3, help="schedule span in days")
+    parser.add_argument("--origins", type=int, default=3, help="origins count")
+    parser.add_argument(
+        "--destinations", type=int, default=10, help="destinations count"
+    )
+    parser.add_argument("--max_stops", type=int, default=2, help="query max stops")
+    parser.add_argument("--top_k", type=int, default=3, help="trips per pair")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = solution.FlightDataset(
+            generate_network_schedule(
+                os.path.join(tmp_dir, "schedule.csv"),
+                airports=args.airports,
+                flights_per_day=args.flights_per_day,
+                days=args.days,
+            )
+        ).load()
+    rnd = random.Random(42)
+    airports = sorted(dataset.srcs & dataset.dsts)
+    origins = rnd.sample(airports, args.origins)
+    destinations = rnd.sample(
+        [a for a in airports if a not in origins], args.destinations
+    )
+    queries = {
+        f"{args.origins}x{args.destinations} all": solution.FlightQuery(
+            origin=",".join(origins),
+            destination=",".join(destinations),
+            max_stops=args.max_stops,
+        ),
+        f"{args.origins}x{args.destinations} top {args.top_k}": solution.FlightQuery(
+            origin=",".join(origins),
+            destination=",".join(destinations),
+            max_stops=args.max_stops,
+            top_k=args.top_k,
+        ),
+        f"{args.origins}x anywhere": solution.FlightQuery(
+            origin=",".join(origins),
+            destination=solution.FlightQuery.ANYWHERE,
+            max_stops=args.max_stops,
+        ),
+    }
+
+    print(f"Flights: {len(dataset)}   airports: {len(dataset.airports)}")
+    for name, query in queries.items():
+        start = time.perf_counter()
+        loop_trips = loop(solution.FlightOracle(dataset), query)
+        loop_secs = time.perf_counter() - start
+        start = time.perf_counter()
+        trips = len(solution.FlightOracle(dataset).find_flights(query).trips)
+        secs = time.perf_counter() - start
+        print(
+            f"  {name:16} loop: {loop_secs:8.3f}s   single traversal: {secs:8.3f}s"
+            f"   trips: {trips} ({loop_trips})"
+        )
+
+
+if __name__ == "__main__":
+    main()
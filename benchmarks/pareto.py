@@ -0,0 +1,79 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import solution
+from benchmarks.schedule import generate_network_schedule
+
+#
+# Pareto search benchmark: all trips found by breadth first search and then
+# filtered to the Pareto front (price vs. travel time) vs. label-setting search
+# of the front - time, partial trips expanded and front size by max stops
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.pareto --flights_per_day 1000 --max_stops 2 3 4
+#
+
+
+def run(flight_oracle: solution.FlightOracle, queries, pareto: bool) -> tuple:
+    stats = solution.FlightSearchStats()
+    front = 0
+    start = time.perf_counter()
+    for query in queries:
+        query.pareto = pareto
+        trips = flight_oracle.find_flights(query, stats).trips
+        front += len(solution.FlightSearchResult.pareto_front(trips))
+    return time.perf_counter() - start, stats, front
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pareto search benchmark.")
+    parser.add_argument("--airports", type=int, default=60, help="number of airports")
+    parser.add_argument(
+        "--flights_per_day", type=int, default=1000, help="daily routes count"
+    )
+    parser.add_argument("--hubs", type=int, default=4, help="number of hubs")
+    parser.add_argument("--days", type=int, default=3, help="schedule span in days")
+    parser.add_argument("--queries", type=int, default=5, help="queries count")
+    parser.add_argument(
+        "--max_stops", type=int, nargs="+", default=[2, 3, 4], help="max stops"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = solution.FlightDataset(
+            generate_network_schedule(
+                os.path.join(tmp_dir, "schedule.csv"),
+                airports=args.airports,
+                flights_per_day=args.flights_per_day,
+                hubs=args.hubs,
+                days=args.days,
+            )
+        ).load()
+    rnd = random.Random(42)
+    airports = sorted(dataset.srcs & dataset.dsts)
+    pairs = [rnd.sample(airports, 2) for _ in range(args.queries)]
+
+    print(f"Flights: {len(dataset)}   queries: {args.queries}")
+    for max_stops in args.max_stops:
+        queries = [
+            solution.FlightQuery(
+                origin=origin, destination=destination, max_stops=max_stops
+            )
+            for origin, destination in pairs
+        ]
+        for pareto in (False, True):
+            secs, stats, front = run(solution.FlightOracle(dataset), queries, pareto)
+            print(
+                f"  max stops {max_stops} {'pareto' if pareto else 'bfs   '}: "
+                f"{secs:8.3f}s   expanded: {stats.expanded:9}   "
+                f"trips: {stats.found:9}   front: {front}"
+            )
+
+
+if __name__ == "__main__":
+    main()
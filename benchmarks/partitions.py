@@ -0,0 +1,97 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import solution
+from benchmarks.schedule import generate_schedule
+
+#
+# Departure window benchmark: load and search time and peak memory of a query
+# with departure dates (--from, --to) by window size - whole CSV dataset vs.
+# dataset partitioned by departure day
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.partitions --rows 100000 --days 60 --windows 1 7 30
+#
+
+
+def search(dataset_path: str, query: solution.FlightQuery) -> int:
+    dataset = solution.FlightDataset(dataset_path).load(query=query)
+    solution.FlightOracle(dataset).find_flights(query)
+    return len(dataset)
+
+
+def run(dataset_path: str, queries) -> tuple:
+    # time is measured without tracemalloc which slows allocations down
+    start = time.perf_counter()
+    flights = sum(search(dataset_path, query) for query in queries)
+    secs = time.perf_counter() - start
+    tracemalloc.start()
+    for query in queries:
+        search(dataset_path, query)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return secs / len(queries), peak, flights // len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Departure window benchmark.")
+    parser.add_argument("--rows", type=int, default=100000, help="number of flights")
+    parser.add_argument("--airports", type=int, default=100, help="number of airports")
+    parser.add_argument("--days", type=int, default=60, help="schedule span in days")
+    parser.add_argument("--queries", type=int, default=3, help="queries per window")
+    parser.add_argument("--max_stops", type=int, default=1, help="query max stops")
+    parser.add_argument(
+        "--windows", type=int, nargs="+", default=[1, 7, 30], help="window days"
+    )
+    args = parser.parse_args()
+
+    start = datetime.date(2021, 9, 1)
+    rnd = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = generate_schedule(
+            os.path.join(tmp_dir, "schedule.csv"),
+            args.rows,
+            airports=args.airports,
+            days=args.days,
+        )
+        dataset = solution.FlightDataset(csv_path).load()
+        partition_dir = dataset.save_partitions(os.path.join(tmp_dir, "schedule"))
+        airports = sorted(dataset.srcs & dataset.dsts)
+        del dataset
+
+        print(f"Flights: {args.rows}   days: {args.days}")
+        for window in args.windows:
+            queries = []
+            for _ in range(args.queries):
+                origin, destination = rnd.sample(airports, 2)
+                first_day = start + datetime.timedelta(
+                    days=rnd.randrange(max(args.days - window, 1))
+                )
+                queries.append(
+                    solution.FlightQuery(
+                        origin=origin,
+                        destination=destination,
+                        max_stops=args.max_stops,
+                        departure_from=first_day.isoformat(),
+                        departure_to=(
+                            first_day + datetime.timedelta(days=window - 1)
+                        ).isoformat(),
+                    )
+                )
+            for name, path in (("CSV", csv_path), ("partitions", partition_dir)):
+                secs, peak, flights = run(path, queries)
+                print(
+                    f"  {window:3} day(s) {name:10}: {secs:8.3f}s/query   "
+                    f"{flights:8} flights loaded   peak {peak / 2**20:8.1f}MB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import solution
+from benchmarks.schedule import generate_schedule
+
+#
+# Reachability pruning benchmark: partial trips expanded and pruned by search
+# with and without the destination reachability index
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.pruning --rows 5000 --queries 20 --max_stops 3
+#
+
+
+def run(flight_oracle: solution.FlightOracle, queries, pruning: bool):
+    solution.OPT_REACHABILITY_PRUNING = pruning
+    stats = solution.FlightSearchStats()
+    start = time.perf_counter()
+    for query in queries:
+        for _ in flight_oracle.iter_flights(query, stats=stats):
+            pass
+    return time.perf_counter() - start, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reachability pruning benchmark.")
+    parser.add_argument("--rows", type=int, default=5000, help="number of flights")
+    parser.add_argument("--airports", type=int, default=40, help="number of airports")
+    parser.add_argument("--days", type=int, default=7, help="schedule span in days")
+    parser.add_argument("--queries", type=int, default=20, help="queries count")
+    parser.add_argument("--max_stops", type=int, default=3, help="query max stops")
+    parser.add_argument("--max_price", type=int, default=600, help="query max price")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = solution.FlightDataset(
+            generate_schedule(
+                os.path.join(tmp_dir, "schedule.csv"),
+                args.rows,
+                airports=args.airports,
+                days=args.days,
+            )
+        ).load()
+    rnd = random.Random(42)
+    airports = sorted(dataset.srcs & dataset.dsts)
+    queries = []
+    for _ in range(args.queries):
+        origin, destination = rnd.sample(airports, 2)
+        queries.append(
+            solution.FlightQuery(
+                origin=origin,
+                destination=destination,
+                bags_count=rnd.randint(0, 2),
+                max_stops=args.max_stops,
+                max_price=args.max_price,
+            )
+        )
+
+    print(f"Flights: {args.rows}   queries: {args.queries}")
+    for pruning in (False, True):
+        secs, stats = run(solution.FlightOracle(dataset), queries, pruning)
+        print(f"  pruning {'on ' if pruning else 'off'}: {secs:8.3f}s   {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import datetime
+import math
+import random
+import string
+from typing import List
+from typing import Optional
+
+#
+# Synthetic flight schedule generator - writes CSV with the same columns
+# as datasets/example*.csv: either uniformly random flights (--rows) or
+# a daily schedule of hub and spoke network (--flights_per_day)
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.schedule /tmp/schedule.csv --rows 1000000
+#   python3 -m benchmarks.schedule /tmp/schedule.csv --flights_per_day 2000 --hubs 5
+#
+
+COLUMNS = [
+    "flight_no",
+    "origin",
+    "destination",
+    "departure",
+    "arrival",
+    "base_price",
+    "bag_price",
+    "bags_allowed",
+]
+
+FORMAT_DATETIME = "%Y-%m-%dT%H:%M:%S"
+
+
+def airport_codes(count: int, seed: int = 42) -> List[str]:
+    rnd = random.Random(seed)
+    codes: List[str] = []
+    seen: set = set()
+    while len(codes) < count:
+        code = "".join(rnd.choice(string.ascii_uppercase) for _ in range(3))
+        if code not in seen:
+            seen.add(code)
+            codes.append(code)
+    return codes
+
+
+def generate_schedule(
+    path: str,
+    rows: int,
+    airports: int = 100,
+    days: int = 30,
+    seed: int = 42,
+    start: Optional[datetime.datetime] = None,
+) -> str:
+    """Generate random flight schedule CSV and return its path.
+
+    Parameters
+    ----------
+    path : str
+      Filesystem path of the CSV file to write.
+    rows : int
+      Number of flights.
+    airports : int
+      Number of airports.
+    days : int
+      Number of days the schedule spans.
+    seed : int
+      Random generator seed - same seed produces the same schedule.
+    start : datetime
+      Schedule start, 2021-09-01 by default.
+
+    """
+    rnd = random.Random(seed)
+    codes = airport_codes(airports, seed)
+    start = start or datetime.datetime(2021, 9, 1)
+    span_minutes = days * 24 * 60
+    with open(path, mode="w") as csv_file:
+        csv_file.write(",".join(COLUMNS) + "\n")
+        for _ in range(rows):
+            origin, destination = rnd.sample(codes, 2)
+            departure = start + datetime.timedelta(
+                minutes=5 * rnd.randrange(span_minutes // 5)
+            )
+            arrival = departure + datetime.timedelta(minutes=5 * rnd.randint(6, 96))
+            csv_file.write(
+                f"{rnd.choice(string.ascii_uppercase)}"
+                f"{rnd.choice(string.ascii_uppercase)}{rnd.randint(100, 999)},"
+                f"{origin},{destination},"
+                f"{departure.strftime(FORMAT_DATETIME)},"
+                f"{arrival.strftime(FORMAT_DATETIME)},"
+                f"{float(rnd.randint(10, 400))},{rnd.randint(5, 15)},"
+                f"{rnd.randint(0, 2)}\n"
+            )
+    return path
+
+
+def generate_network_schedule(
+    path: str,
+    airports: int = 100,
+    flights_per_day: int = 1000,
+    hubs: int = 5,
+    days: int = 30,
+    seed: int = 42,
+    start: Optional[datetime.datetime] = None,
+    hub_share: float = 0.8,
+) -> str:
+    """Generate daily flight schedule CSV of hub and spoke network.
+
+    Airports are placed on a map of 4000 x 4000 km. Every route (flight
+    number) is operated (almost) every day at the same time, its duration and
+    price grow with the distance. Routes touch hubs with ``hub_share``
+    probability (spoke-hub or hub-hub), others are point to point. Rows are
+    ordered by departure.
+
+    Parameters
+    ----------
+    path : str
+      Filesystem path of the CSV file to write.
+    airports : int
+      Number of airports (hubs included).
+    flights_per_day : int
+      Number of routes, each operated once a day.
+    hubs : int
+      Number of hub airports, no hubs means uniformly random routes.
+    days : int
+      Number of days the schedule spans.
+    seed : int
+      Random generator seed - same seed produces the same schedule.
+    start : datetime
+      Schedule start, 2021-09-01 by default.
+    hub_share : float
+      Probability of a route to/from a hub.
+
+    """
+    rnd = random.Random(seed)
+    codes = airport_codes(airports, seed)
+    hubs = min(hubs, airports // 2)
+    location = {code: (rnd.uniform(0, 4000), rnd.uniform(0, 4000)) for code in codes}
+    hub_codes, spoke_codes = codes[:hubs], codes[hubs:]
+
+    routes = []
+    for i in range(flights_per_day):
+        if hubs and rnd.random() < hub_share:
+            hub = rnd.choice(hub_codes)
+            other = rnd.choice([c for c in codes if c != hub])
+            origin, destination = (hub, other) if rnd.random() < 0.5 else (other, hub)
+        else:
+            origin, destination = rnd.sample(spoke_codes or codes, 2)
+        (x1, y1), (x2, y2) = location[origin], location[destination]
+        distance = math.hypot(x2 - x1, y2 - y1)
+        # departures between 05:00 and 23:00, 30 minutes plus 800 km/h flight
+        minute = 5 * rnd.randrange(60, 276)
+        duration = 5 * math.ceil((30 + distance * 60 / 800) / 5)
+        price = round(20 + distance * 0.08 * rnd.uniform(0.7, 1.5))
+        flight_no = (
+            f"{string.ascii_uppercase[i // 900 % 26]}"
+            f"{string.ascii_uppercase[i // 900 // 26 % 26]}{100 + i % 900}"
+        )
+        routes.append(
+            (
+                minute,
+                flight_no,
+                origin,
+                destination,
+                duration,
+                price,
+                rnd.randint(5, 15),
+                rnd.randint(0, 2),
+            )
+        )
+    routes.sort()
+
+    start = start or datetime.datetime(2021, 9, 1)
+    with open(path, mode="w") as csv_file:
+        csv_file.write(",".join(COLUMNS) + "\n")
+        for day in range(days):
+            day_start = start + datetime.timedelta(days=day)
+            for (
+                minute,
+                flight_no,
+                origin,
+                destination,
+                duration,
+                price,
+                bag_price,
+                bags_allowed,
+            ) in routes:
+                # 5% of flights are cancelled, prices vary by day
+                if rnd.random() < 0.05:
+                    continue
+                departure = day_start + datetime.timedelta(minutes=minute)
+                arrival = departure + datetime.timedelta(minutes=duration)
+                csv_file.write(
+                    f"{flight_no},{origin},{destination},"
+                    f"{departure.strftime(FORMAT_DATETIME)},"
+                    f"{arrival.strftime(FORMAT_DATETIME)},"
+                    f"{float(round(price * rnd.uniform(0.8, 1.25)))},"
+                    f"{bag_price},{bags_allowed}\n"
+                )
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Synthetic flight schedule.")
+    parser.add_argument("path", type=str, help="path to CSV file to write")
+    parser.add_argument("--rows", type=int, default=100000, help="number of flights")
+    parser.add_argument("--airports", type=int, default=100, help="number of airports")
+    parser.add_argument("--days", type=int, default=30, help="schedule span in days")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument(
+        "--flights_per_day", type=int, default=0, help="daily hub and spoke routes"
+    )
+    parser.add_argument("--hubs", type=int, default=5, help="number of hubs")
+    args = parser.parse_args()
+    if args.flights_per_day:
+        generate_network_schedule(
+            args.path,
+            args.airports,
+            args.flights_per_day,
+            args.hubs,
+            args.days,
+            args.seed,
+        )
+    else:
+        generate_schedule(args.path, args.rows, args.airports, args.days, args.seed)
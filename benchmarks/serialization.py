@@ -0,0 +1,96 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import solution
+from benchmarks.schedule import generate_network_schedule
+
+#
+# Result serialization benchmark: throughput (trips per second), output size
+# and peak memory of the original to_dict() + json.dumps() serialization vs.
+# streaming TripJsonEncoder (pretty, compact and flight references)
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.serialization --flights_per_day 1000 --days 3
+#
+
+
+def dumps_dicts(trips, out) -> None:
+    out.write(json.dumps([t.to_dict() for t in trips], indent=4))
+
+
+def serializers():
+    return {
+        "to_dict + json.dumps": dumps_dicts,
+        "stream": lambda trips, out: solution.FlightSearchResult.write_json(trips, out),
+        "stream compact": lambda trips, out: solution.FlightSearchResult.write_json(
+            trips, out, compact=True
+        ),
+        "stream refs": lambda trips, out: solution.FlightSearchResult.write_json(
+            trips, out, compact=True, flight_refs=True
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serialization benchmark.")
+    parser.add_argument("--airports", type=int, default=40, help="number of airports")
+    parser.add_argument(
+        "--flights_per_day", type=int, default=1000, help="daily routes count"
+    )
+    parser.add_argument("--days", type=int, default=3, help="schedule span in days")
+    parser.add_argument("--max_stops", type=int, default=2, help="query max stops")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = solution.FlightDataset(
+            generate_network_schedule(
+                os.path.join(tmp_dir, "schedule.csv"),
+                airports=args.airports,
+                flights_per_day=args.flights_per_day,
+                days=args.days,
+            )
+        ).load()
+    flight_oracle = solution.FlightOracle(dataset)
+    airports = sorted(dataset.srcs & dataset.dsts)
+    trips = []
+    for origin, destination in zip(airports[:5], airports[5:10]):
+        trips.extend(
+            flight_oracle.find_flights(
+                solution.FlightQuery(
+                    origin=origin,
+                    destination=destination,
+                    max_stops=args.max_stops,
+                    return_ticket=True,
+                )
+            ).trips
+        )
+
+    print(f"Flights: {len(dataset)}   trips: {len(trips)}")
+    for name, serialize in serializers().items():
+        out = io.StringIO()
+        start = time.perf_counter()
+        serialize(trips, out)
+        secs = time.perf_counter() - start
+        size = out.tell()
+        del out
+        # peak memory of serialization to a file (no output buffer)
+        with open(os.devnull, mode="w") as devnull:
+            tracemalloc.start()
+            serialize(trips, devnull)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        print(
+            f"  {name:20} {secs:8.3f}s   {len(trips) / secs:10.0f} trips/s   "
+            f"{size / 2**20:8.1f}MB output   {peak / 2**20:8.1f}MB peak"
+        )
+
+
+if __name__ == "__main__":
+    main()
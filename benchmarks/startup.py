@@ -0,0 +1,57 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import os
+import tempfile
+import time
+
+import solution
+from benchmarks.schedule import generate_schedule
+
+#
+# Startup benchmark: CSV dataset loading vs. memory-mapped snapshot loading
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.startup --rows 10000 100000 1000000
+#
+
+
+def timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dataset startup benchmark.")
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[10000, 100000],
+        help="numbers of flights",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in args.rows:
+            dataset_path = generate_schedule(
+                os.path.join(tmp_dir, f"schedule-{rows}.csv"), rows
+            )
+            snapshot_path = os.path.join(tmp_dir, f"schedule-{rows}.kiwi")
+            csv_secs = timed(lambda: solution.FlightDataset(dataset_path).load())
+            compile_secs = timed(
+                lambda: solution.FlightDataset(dataset_path)
+                .load()
+                .save_snapshot(snapshot_path)
+            )
+            snapshot_secs = timed(lambda: solution.FlightDataset(snapshot_path).load())
+            print(
+                f"Flights {rows:>9}: CSV {csv_secs:8.3f}s   "
+                f"snapshot {snapshot_secs:8.3f}s   "
+                f"(compile {compile_secs:8.3f}s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
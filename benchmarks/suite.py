@@ -0,0 +1,192 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import solution
+from benchmarks.schedule import generate_network_schedule
+
+#
+# Reproducible benchmark suite: seeded hub and spoke schedule (airports,
+# flights per day, hubs, days) and scenarios - dataset loading, one way and
+# return search and max_stops/max_price/bags filters. Results are written as
+# JSON, --compare prints time ratios of scenarios vs. results of another commit.
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.suite --output bench.json
+#   python3 -m benchmarks.suite --flights_per_day 2000 --hubs 10 --days 14
+#   python3 -m benchmarks.suite --output new.json --compare bench.json
+#
+
+SCENARIO_LOAD = "load"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def scenarios(args) -> Dict[str, Dict]:
+    """Get query fields (on top of origin and destination) by scenario name."""
+    return {
+        "one_way": {"max_stops": args.max_stops},
+        "return": {"max_stops": args.max_stops, "return_ticket": True},
+        "max_stops": {"max_stops": 1},
+        "max_price": {"max_stops": args.max_stops, "max_price": args.max_price},
+        "bags": {"max_stops": args.max_stops, "bags_count": 2},
+    }
+
+
+def bench_load(dataset_path: str, repeat: int) -> Dict:
+    secs: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        dataset = solution.FlightDataset(dataset_path).load()
+        secs.append(time.perf_counter() - start)
+    return {
+        "secs": min(secs),
+        "rows": len(dataset),
+        "rows_per_sec": len(dataset) / min(secs),
+    }
+
+
+def bench_search(flight_oracle: solution.FlightOracle, queries, repeat: int) -> Dict:
+    # latency of a query is the best of runs, counters are of the last run
+    latencies: List[float] = [float("inf")] * len(queries)
+    for _ in range(repeat):
+        stats = solution.FlightSearchStats()
+        trips = 0
+        for i, query in enumerate(queries):
+            start = time.perf_counter()
+            trips += len(flight_oracle.find_flights(query, stats).trips)
+            latencies[i] = min(latencies[i], time.perf_counter() - start)
+    return {
+        "secs": sum(latencies),
+        "p50_secs": statistics.median(latencies),
+        "max_secs": max(latencies),
+        "queries": len(queries),
+        "trips": trips,
+        "expanded": stats.expanded,
+        "rejected": sum(stats.rejected.values()),
+        "pruned": sum(stats.pruned.values()),
+    }
+
+
+def compare(results: Dict, baseline_path: str) -> None:
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    print(
+        f"Compared to {baseline['meta'].get('commit')} ({baseline_path}):",
+        file=sys.stderr,
+    )
+    if baseline["params"] != results["params"]:
+        print("  WARNING: different suite parameters", file=sys.stderr)
+    for name, scenario in results["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if not old:
+            continue
+        ratio = scenario["secs"] / old["secs"] if old["secs"] else float("inf")
+        print(
+            f"  {name:10} {old['secs']:8.3f}s -> {scenario['secs']:8.3f}s"
+            f"   x{ratio:.2f}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproducible benchmark suite.")
+    parser.add_argument("--airports", type=int, default=100, help="number of airports")
+    parser.add_argument(
+        "--flights_per_day", type=int, default=1000, help="daily routes count"
+    )
+    parser.add_argument("--hubs", type=int, default=6, help="number of hubs")
+    parser.add_argument("--days", type=int, default=14, help="schedule span in days")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--queries", type=int, default=20, help="queries per scenario")
+    parser.add_argument("--max_stops", type=int, default=2, help="query max stops")
+    parser.add_argument("--max_price", type=int, default=500, help="query max price")
+    parser.add_argument("--repeat", type=int, default=3, help="runs (best is used)")
+    parser.add_argument("--output", type=str, help="JSON results file (or stdout)")
+    parser.add_argument("--compare", type=str, help="JSON results file to compare")
+    args = parser.parse_args()
+
+    params = {
+        k: getattr(args, k)
+        for k in (
+            "airports",
+            "flights_per_day",
+            "hubs",
+            "days",
+            "seed",
+            "queries",
+            "max_stops",
+            "max_price",
+            "repeat",
+        )
+    }
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "params": params,
+        "scenarios": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset_path = generate_network_schedule(
+            os.path.join(tmp_dir, "schedule.csv"),
+            airports=args.airports,
+            flights_per_day=args.flights_per_day,
+            hubs=args.hubs,
+            days=args.days,
+            seed=args.seed,
+        )
+        results["scenarios"][SCENARIO_LOAD] = bench_load(dataset_path, args.repeat)
+        dataset = solution.FlightDataset(dataset_path).load()
+
+    rnd = random.Random(args.seed)
+    airports = sorted(dataset.srcs & dataset.dsts)
+    pairs = [rnd.sample(airports, 2) for _ in range(args.queries)]
+    for name, fields in scenarios(args).items():
+        queries = [
+            solution.FlightQuery(origin=origin, destination=destination, **fields)
+            for origin, destination in pairs
+        ]
+        results["scenarios"][name] = bench_search(
+            solution.FlightOracle(dataset), queries, args.repeat
+        )
+
+    results_json = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, mode="w") as output_file:
+            output_file.write(results_json + "\n")
+    else:
+        print(results_json)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
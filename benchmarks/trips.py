@@ -0,0 +1,166 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List
+
+import solution
+from benchmarks.schedule import generate_schedule
+
+#
+# Partial trips benchmark: parent-pointer Trip vs. original Trip which copies
+# flights and stops lists on every search step - peak memory, allocated memory
+# blocks per partial trip and search time
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.trips --rows 10000 --queries 10 --max_stops 3
+#
+
+
+class ListTrip:
+    """Original trip - flights and stops lists copied by every extension."""
+
+    def __init__(
+        self,
+        dataset: solution.FlightDataset,
+        origin: str,
+        destination: str,
+        bags_count: int,
+    ):
+        self.dataset = dataset
+        self.flights: List[int] = []
+        self.origin = origin
+        self.destination = destination
+        self.bags_allowed = 42
+        self.bags_count = bags_count
+        self.total_price = 0.0
+        self.travel_time = ""
+        self.stops: List[int] = [dataset.airport_id(origin)]
+        self.travel_secs = 0
+
+    # search interface of solution.Trip
+    @property
+    def flight(self) -> int:
+        return self.flights[-1]
+
+    @property
+    def stop(self) -> int:
+        return self.stops[-1]
+
+    @property
+    def length(self) -> int:
+        return len(self.flights)
+
+    def visits(self, airport: int) -> bool:
+        return airport in self.stops
+
+    def extend(self, flight: int) -> "ListTrip":
+        t = self.copy()
+        t.add_stop(flight)
+        return t
+
+    def add_stop(self, flight: int):
+        dataset = self.dataset
+        self.stops.append(dataset.destination[flight])
+        self.total_price += dataset.base_price[flight]
+        self.total_price += float(self.bags_count) * dataset.bag_price[flight]
+        self.travel_secs += dataset.flight_seconds(flight)
+        if self.flights:
+            self.travel_secs += (
+                dataset.departure[flight] - dataset.arrival[self.flights[-1]]
+            )
+        self.flights.append(flight)
+        self.bags_allowed = min(self.bags_allowed, dataset.bags_allowed[flight])
+
+    def copy(self) -> "ListTrip":
+        t = ListTrip(self.dataset, self.origin, self.destination, self.bags_count)
+        t.flights = self.flights.copy()
+        t.bags_allowed = self.bags_allowed
+        t.total_price = self.total_price
+        t.travel_time = self.travel_time
+        t.stops = self.stops.copy()
+        t.travel_secs = self.travel_secs
+        return t
+
+    def release(self):
+        self.finalize()
+
+    def finalize(self):
+        self.travel_time = f"{datetime.timedelta(seconds=self.travel_secs)}"
+
+
+def blocks_per_trip(trip_class, dataset: solution.FlightDataset, count: int) -> float:
+    """Allocated memory blocks per partial trip kept alive (as BFS frontier)."""
+    origin = max(dataset.dg_edges_by_src, key=lambda a: len(dataset.dg_edges_by_src[a]))
+    flights = dataset.flights_from(origin)
+    trip = trip_class(dataset, dataset.airports[origin], "", 0)
+    trip = trip.extend(flights[0])
+    blocks = sys.getallocatedblocks()
+    frontier = [trip.extend(flights[i % len(flights)]) for i in range(count)]
+    blocks = sys.getallocatedblocks() - blocks
+    del frontier
+    return blocks / count
+
+
+def run(trip_class, flight_oracle: solution.FlightOracle, queries):
+    solution.Trip = trip_class
+    start = time.perf_counter()
+    trips = sum(len(flight_oracle.find_flights(q).trips) for q in queries)
+    secs = time.perf_counter() - start
+    peaks = []
+    for query in queries:
+        tracemalloc.start()
+        flight_oracle.find_flights(query)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return secs, trips, max(peaks), sum(peaks) / len(peaks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partial trips benchmark.")
+    parser.add_argument("--rows", type=int, default=10000, help="number of flights")
+    parser.add_argument("--airports", type=int, default=40, help="number of airports")
+    parser.add_argument("--days", type=int, default=7, help="schedule span in days")
+    parser.add_argument("--queries", type=int, default=10, help="queries count")
+    parser.add_argument("--max_stops", type=int, default=3, help="query max stops")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = solution.FlightDataset(
+            generate_schedule(
+                os.path.join(tmp_dir, "schedule.csv"),
+                args.rows,
+                airports=args.airports,
+                days=args.days,
+            )
+        ).load()
+    rnd = random.Random(42)
+    airports = sorted(dataset.srcs & dataset.dsts)
+    queries = [
+        solution.FlightQuery(
+            origin=origin, destination=destination, max_stops=args.max_stops
+        )
+        for origin, destination in (
+            rnd.sample(airports, 2) for _ in range(args.queries)
+        )
+    ]
+    flight_oracle = solution.FlightOracle(dataset)
+
+    print(f"Flights: {args.rows}   queries: {args.queries}")
+    for name, trip_class in (("list", ListTrip), ("parent", solution.Trip)):
+        secs, trips, max_peak, avg_peak = run(trip_class, flight_oracle, queries)
+        print(
+            f"  {name:6} trip: {secs:8.3f}s   trips {trips}   peak memory "
+            f"{avg_peak / 2**20:8.2f}MB avg {max_peak / 2**20:8.2f}MB max   "
+            f"{blocks_per_trip(trip_class, dataset, 100000):5.1f} blocks/partial trip"
+        )
+
+
+if __name__ == "__main__":
+    main()
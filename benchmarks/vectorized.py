@@ -0,0 +1,90 @@
+# Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import solution
+from benchmarks.schedule import generate_network_schedule
+
+#
+# Vectorized admissibility benchmark: breadth first search checking flights
+# one by one vs. NumPy checks of all flights of a stop at once - hub and spoke
+# network where hubs have hundreds of departures within the layover window
+#
+# Usage examples:
+#
+#   python3 -m benchmarks.vectorized --flights_per_day 3000 --hubs 3
+#
+
+
+def run(flight_oracle: solution.FlightOracle, queries, engine: str) -> tuple:
+    trips = 0
+    start = time.perf_counter()
+    for query in queries:
+        query.engine = engine
+        trips += len(flight_oracle.find_flights(query).trips)
+    return time.perf_counter() - start, trips
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized admissibility.")
+    parser.add_argument("--airports", type=int, default=60, help="number of airports")
+    parser.add_argument(
+        "--flights_per_day", type=int, default=3000, help="daily routes count"
+    )
+    parser.add_argument("--hubs", type=int, default=3, help="number of hubs")
+    parser.add_argument("--days", type=int, default=3, help="schedule span in days")
+    parser.add_argument("--queries", type=int, default=10, help="queries count")
+    parser.add_argument("--max_stops", type=int, default=2, help="query max stops")
+    args = parser.parse_args()
+
+    if solution.numpy is None:
+        print("NumPy is not installed - vectorized engine falls back to pure Python")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dataset = solution.FlightDataset(
+            generate_network_schedule(
+                os.path.join(tmp_dir, "schedule.csv"),
+                airports=args.airports,
+                flights_per_day=args.flights_per_day,
+                hubs=args.hubs,
+                days=args.days,
+            )
+        ).load()
+    rnd = random.Random(42)
+    # spoke to spoke trips connect at hubs (the first airports are hubs)
+    airports = sorted(dataset.srcs & dataset.dsts)
+    queries = []
+    for _ in range(args.queries):
+        origin, destination = rnd.sample(airports, 2)
+        queries.append(
+            solution.FlightQuery(
+                origin=origin,
+                destination=destination,
+                bags_count=rnd.randint(0, 1),
+                max_stops=args.max_stops,
+            )
+        )
+    degree = (
+        max(len(dataset.flights_from(dataset.airport_id(a))) for a in dataset.srcs)
+        / args.days
+    )
+
+    print(
+        f"Flights: {len(dataset)}   hubs: {args.hubs}   "
+        f"max departures per day: {degree:.0f}   queries: {args.queries}"
+    )
+    for engine in (
+        solution.FlightQuery.ENGINE_BFS,
+        solution.FlightQuery.ENGINE_VECTORIZED,
+    ):
+        # first run builds reachability indices and NumPy columns
+        flight_oracle = solution.FlightOracle(dataset)
+        run(flight_oracle, queries, engine)
+        secs, trips = run(flight_oracle, queries, engine)
+        print(f"  {engine:12} {secs:8.3f}s   trips: {trips}")
+
+
+if __name__ == "__main__":
+    main()
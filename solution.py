@@ -1,13 +1,47 @@
 # Kiwi.com Python weekend task '21: Martin Dvorak <martin.dvorak@mindforger.com>
 import argparse
+import array
+import asyncio
+import bisect
 import collections
+import concurrent.futures
+import contextlib
+import copy
+import cProfile
 import csv
 import datetime
+import hashlib
+import heapq
+import io
+import itertools
 import json
+import math
+import mmap
+import multiprocessing
 import os
+import pstats
+import struct
+import sys
+import threading
+import time
+from typing import Any
 from typing import Dict
+from typing import FrozenSet
+from typing import Generator
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import TextIO
+from typing import Tuple
+from typing import Union
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 #
 # Solution of https://github.com/kiwicom/python-weekend-xmas-task
@@ -26,6 +60,11 @@ from typing import Optional
 #   (traveller would MISS "back trip" departure in the real world)
 #   - set option below to True to ensure "there trip" arrival < "back trip" departure
 OPT_TIME_ORDERED_RETURN_TRIP = False
+# - CSV datasets are parsed by chunks using NumPy (vectorized) if it is installed
+OPT_NUMPY_CSV_PARSING = True
+# - partial trips which can't reach the destination (within the maximum number of
+#   stops, time or price) are pruned using per destination reachability index
+OPT_REACHABILITY_PRUNING = True
 # - travel_time LONGER than 1 day is serialized using timedelta format,
 #   for instance "1 day, 19:50:00"
 #
@@ -33,10 +72,57 @@ OPT_TIME_ORDERED_RETURN_TRIP = False
 #
 # - breath first search
 # - in-memory
+# - columnar flight store (typed arrays, interned airports and flight numbers)
 #
 
 
 class FlightQuery:
+    # search engines of (all) one way trips: breadth first search from origin,
+    # meet-in-the-middle search from both origin and destination, breadth
+    # first search checking flights of a stop at once using NumPy or depth
+    # first search with backtracking of a single path (low memory)
+    ENGINE_BFS = "bfs"
+    ENGINE_BIDIRECTIONAL = "bidirectional"
+    ENGINE_VECTORIZED = "vectorized"
+    ENGINE_DFS = "dfs"
+    ENGINES = [ENGINE_BFS, ENGINE_BIDIRECTIONAL, ENGINE_VECTORIZED, ENGINE_DFS]
+
+    # search space limit is hit: stop the search and mark the result truncated
+    # or continue by iterative deepening depth first search (low memory)
+    ON_LIMIT_TRUNCATE = "truncate"
+    ON_LIMIT_IDDFS = "iddfs"
+    ON_LIMITS = [ON_LIMIT_TRUNCATE, ON_LIMIT_IDDFS]
+
+    # departure dates (--from, --to)
+    FORMAT_DATE = "%Y-%m-%d"
+
+    # multiple origin/destination airports are comma separated, destination can
+    # be any airport
+    AIRPORTS_SEPARATOR = ","
+    ANYWHERE = "*"
+
+    # query fields which can be set from a dictionary (name -> type)
+    FIELDS = {
+        "origin": str,
+        "destination": str,
+        "bags_count": int,
+        "return_ticket": bool,
+        "min_layover_hours": int,
+        "max_layover_hours": int,
+        "max_stops": int,
+        "max_price": float,
+        "top_k": int,
+        "pareto": bool,
+        "all_bags": bool,
+        "engine": str,
+        "max_frontier": int,
+        "max_results": int,
+        "max_memory_mb": int,
+        "on_limit": str,
+        "departure_from": str,
+        "departure_to": str,
+    }
+
     def __init__(
         self,
         origin: str = "",
@@ -47,6 +133,16 @@ class FlightQuery:
         max_layover_hours: int = 6,
         max_stops: int = 0,
         max_price: float = 0.0,
+        top_k: int = 0,
+        pareto: bool = False,
+        all_bags: bool = False,
+        engine: str = ENGINE_BFS,
+        departure_from: str = "",
+        departure_to: str = "",
+        max_frontier: int = 0,
+        max_results: int = 0,
+        max_memory_mb: int = 0,
+        on_limit: str = ON_LIMIT_TRUNCATE,
     ):
         self.origin = origin
         self.destination = destination
@@ -58,6 +154,21 @@ class FlightQuery:
         # extra
         self.max_stops = max_stops
         self.max_price = max_price
+        self.top_k = top_k
+        # Pareto optimal trips only (total price vs. travel time)
+        self.pareto = pareto
+        # trips for every number of bags from 0 to bags count (single search)
+        self.all_bags = all_bags
+        self.engine = engine
+        # first and last departure date of trips (return trip: of both trips)
+        self.departure_from = departure_from
+        self.departure_to = departure_to
+        # hard limits: queued partial trips, result trips and approximate memory
+        # of both (0 stands for unlimited)
+        self.max_frontier = max_frontier
+        self.max_results = max_results
+        self.max_memory_mb = max_memory_mb
+        self.on_limit = on_limit
 
     def __str__(self) -> str:
         return (
@@ -69,6 +180,17 @@ class FlightQuery:
             f"  ------------\n"
             f"  max stops  : {self.max_stops}\n"
             f"  max price  : {self.max_price}\n"
+            f"  top k      : {self.top_k}\n"
+            f"  pareto     : {self.pareto}\n"
+            f"  all bags   : {self.all_bags}\n"
+            f"  engine     : {self.engine}\n"
+            f"  from       : {self.departure_from}\n"
+            f"  to         : {self.departure_to}\n"
+            f"  ------------\n"
+            f"  max frontier: {self.max_frontier}\n"
+            f"  max results : {self.max_results}\n"
+            f"  max memory  : {self.max_memory_mb}MB\n"
+            f"  on limit    : {self.on_limit}\n"
         )
 
     def init(self, cli_args: Optional[argparse.Namespace] = None) -> "FlightQuery":
@@ -78,19 +200,150 @@ class FlightQuery:
             self.bags_count = cli_args.bags
             self.max_stops = cli_args.max_stops
             self.max_price = cli_args.max_price
+            self.top_k = cli_args.top_k
+            self.pareto = cli_args.pareto
+            self.all_bags = cli_args.all_bags
+            self.engine = cli_args.engine
+            self.departure_from = cli_args.departure_from
+            self.departure_to = cli_args.departure_to
+            self.max_frontier = cli_args.max_frontier
+            self.max_results = cli_args.max_results
+            self.max_memory_mb = cli_args.max_memory
+            self.on_limit = cli_args.on_limit
             self.return_ticket = getattr(cli_args, "return")
         return self
 
+    def init_from_dict(self, data: Dict) -> "FlightQuery":
+        """Initialize query from (JSON) dictionary with ``FIELDS`` keys.
+
+        Values are not coerced - JSON type of a value must match the field type
+        (``"false"`` isn't boolean, ``1.9`` isn't integer), integers are
+        accepted for float fields.
+
+        """
+        for name, value in data.items():
+            if name not in FlightQuery.FIELDS:
+                raise ValueError(f"Unknown query field: '{name}'")
+            field_type: type = FlightQuery.FIELDS[name]
+            if field_type is float:
+                valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+                if valid:
+                    try:
+                        value = float(value)
+                    except OverflowError:
+                        valid = False
+                    valid = valid and math.isfinite(value)
+            elif field_type is int:
+                valid = isinstance(value, int) and not isinstance(value, bool)
+            else:
+                valid = isinstance(value, field_type)
+            if not valid:
+                raise ValueError(
+                    f"Query field '{name}' must be {field_type.__name__}: {value!r}"
+                )
+            setattr(self, name, value)
+        return self
+
+    def origins(self) -> List[str]:
+        """Get origin airports (comma separated ``origin``)."""
+        return FlightQuery._airports(self.origin)
+
+    def destinations(self) -> List[str]:
+        """Get destination airports (empty if the destination is anywhere)."""
+        if self.is_anywhere():
+            return []
+        return FlightQuery._airports(self.destination)
+
+    def is_anywhere(self) -> bool:
+        return self.destination.strip() == FlightQuery.ANYWHERE
+
+    def has_limits(self) -> bool:
+        """Check whether the query has frontier or memory limit."""
+        return bool(self.max_frontier or self.max_memory_mb)
+
+    def is_multi(self) -> bool:
+        """Check whether the query has multiple origins or destinations."""
+        return (
+            self.is_anywhere()
+            or len(self.origins()) > 1
+            or len(self.destinations()) > 1
+        )
+
+    @staticmethod
+    def _airports(airports: str) -> List[str]:
+        return list(
+            dict.fromkeys(
+                a.strip()
+                for a in airports.split(FlightQuery.AIRPORTS_SEPARATOR)
+                if a.strip()
+            )
+        )
+
+    def reversed(self) -> "FlightQuery":
+        """Get one way query for the back trip: destination -> origin."""
+        back = copy.copy(self)
+        back.origin, back.destination = self.destination, self.origin
+        back.return_ticket = False
+        return back
+
+    def departure_window(self) -> Tuple[Optional[int], Optional[int]]:
+        """Get (earliest, latest) departure of the first flight (inclusive).
+
+        Departures are epoch seconds, ``None`` stands for unbounded.
+
+        """
+        earliest: Optional[int] = None
+        latest: Optional[int] = None
+        if self.departure_from:
+            earliest = FlightDataset.to_epoch(f"{self.departure_from}T00:00:00")
+        if self.departure_to:
+            latest = FlightDataset.to_epoch(f"{self.departure_to}T23:59:59")
+        return earliest, latest
+
+    def departure_days(self, max_flight_secs: int) -> Tuple[str, str]:
+        """Get the first and the last departure day of flights the query can use.
+
+        Trip flights depart at most ``max_stops`` times (flight + maximum
+        layover) after the first flight. Empty string stands for unbounded.
+
+        Parameters
+        ----------
+        max_flight_secs : int
+          Maximum flight duration (seconds) of the dataset.
+
+        """
+        earliest, latest = self.departure_window()
+        if latest is not None and self.max_stops:
+            latest += self.max_stops * (max_flight_secs + self.max_layover_hours * 3600)
+        else:
+            latest = None
+        return (
+            "" if earliest is None else FlightDataset.from_epoch(earliest)[:10],
+            "" if latest is None else FlightDataset.from_epoch(latest)[:10],
+        )
+
     def validate(self):
-        if not self.origin:
+        if not self.origins():
             raise ValueError("Origin airport must be specified - it is empty.")
-        if not self.destination:
+        if not self.is_anywhere() and not self.destinations():
             raise ValueError("Destination airport must be specified - it is empty.")
-        if self.origin == self.destination:
+        if FlightQuery.ANYWHERE in self.origins():
+            raise ValueError(
+                f"Origin must be airport(s), '{FlightQuery.ANYWHERE}' stands for any "
+                f"destination only"
+            )
+        if not self.is_multi() and self.origin == self.destination:
             raise ValueError(
                 f"Origin airport {self.origin} must be different from destination "
                 f"airport"
             )
+        if self.is_anywhere() and self.return_ticket:
+            raise ValueError("Return trips must have destination(s) - not anywhere")
+        if self.is_multi() and self.pareto:
+            raise ValueError(
+                "Pareto optimal trips of multiple origins or destinations are not "
+                "supported"
+            )
         if self.bags_count < 0:
             raise ValueError(
                 f"Number of bags must be positive number: {self.bags_count}"
@@ -101,6 +354,22 @@ class FlightQuery:
             )
         if self.max_price < 0.0:
             raise ValueError(f"Maximum price must be positive number: {self.max_price}")
+        if self.top_k < 0:
+            raise ValueError(f"Top K must be positive number: {self.top_k}")
+        if self.engine not in FlightQuery.ENGINES:
+            raise ValueError(
+                f"Search engine must be one of {FlightQuery.ENGINES}: {self.engine}"
+            )
+        for name in ("max_frontier", "max_results", "max_memory_mb"):
+            if getattr(self, name) < 0:
+                raise ValueError(
+                    f"Limit {name} must be positive number: {getattr(self, name)}"
+                )
+        if self.on_limit not in FlightQuery.ON_LIMITS:
+            raise ValueError(
+                f"Limit action must be one of {FlightQuery.ON_LIMITS}: "
+                f"{self.on_limit}"
+            )
         if self.min_layover_hours < 0:
             raise ValueError(
                 f"Minimum layover time must be positive number: "
@@ -116,24 +385,99 @@ class FlightQuery:
                 f"Minimum layover ({self.min_layover_hours}h) must be smaller than "
                 f"maximum layover ({self.max_layover_hours}h)"
             )
+        for name in ("departure_from", "departure_to"):
+            try:
+                if getattr(self, name):
+                    datetime.datetime.strptime(
+                        getattr(self, name), FlightQuery.FORMAT_DATE
+                    )
+            except ValueError:
+                raise ValueError(
+                    f"Departure date must be YYYY-MM-DD date: {getattr(self, name)}"
+                )
+        if self.departure_from and self.departure_to:
+            if self.departure_to < self.departure_from:
+                raise ValueError(
+                    f"First departure date ({self.departure_from}) must not be after "
+                    f"the last departure date ({self.departure_to})"
+                )
 
 
 class FlightDataset:
-    """Flight dataset loading, preprocessing and in-memory representation."""
+    """Flight dataset loading, preprocessing and in-memory representation.
+
+    Flights are stored in a compact columnar form - each column is a typed
+    ``array.array`` indexed by flight index (row number):
+
+    - airports and flight numbers are interned to ``int`` ids
+    - departure and arrival are seconds since the Unix epoch (naive UTC)
+    - prices are ``float`` arrays, allowed bags ``int`` array
+
+    Flights are grouped by origin (``dg_edges_by_src``) and destination
+    (``dg_edges_by_dst``) airport id as arrays of flight indices. Flights from
+    an origin are sorted by departure and ``dg_departures_by_src`` holds
+    their departure times so that flights departing in a time window (layover)
+    are found using binary search - see ``flights_from()``. Likewise flights to
+    a destination are sorted by arrival (``dg_arrivals_by_dst``) - see
+    ``flights_to()``.
+
+    """
 
     COL_FLIGHT = "flight_no"
     COL_ORIGIN = "origin"
     COL_DESTINATION = "destination"
     COL_DEPARTURE = "departure"
     COL_ARRIVAL = "arrival"
-    COL_DEPARTURE_O = "departure_obj"
-    COL_ARRIVAL_O = "arrival_obj"
-    COL_FLIGHT_S = "flight_seconds"
     COL_BASE_PRICE = "base_price"
     COL_BAG_PRICE = "bag_price"
     COL_BAGS_ALLOWED = "bags_allowed"
 
     FORMAT_DATETIME = "%Y-%m-%dT%H:%M:%S"
+    # length of a datetime serialized using FORMAT_DATETIME (zero padded)
+    LEN_DATETIME = 19
+
+    EPOCH = datetime.datetime(1970, 1, 1)
+
+    CSV_COLUMNS = [
+        COL_FLIGHT,
+        COL_ORIGIN,
+        COL_DESTINATION,
+        COL_DEPARTURE,
+        COL_ARRIVAL,
+        COL_BASE_PRICE,
+        COL_BAG_PRICE,
+        COL_BAGS_ALLOWED,
+    ]
+    # approximate size (bytes) of the CSV chunk of whole lines read and parsed at
+    # once by the fast loader (readlines() size hint)
+    CSV_CHUNK_BYTES = 4 * 2**20
+
+    # operation field of delta rows (see apply_delta()) - upsert if not set
+    DELTA_OP = "op"
+    OP_UPSERT = "upsert"
+    OP_REMOVE = "remove"
+
+    # maximum flight duration assumed when CSV flights are filtered by departure
+    # day (partitioned dataset manifest holds the actual one)
+    MAX_FLIGHT_SECS = 24 * 3600
+    # dataset partitioned by departure day (see save_partitions())
+    PARTITION_MANIFEST = "manifest.json"
+
+    # binary snapshot of preprocessed dataset (see save_snapshot())
+    SNAPSHOT_MAGIC = b"KIWI"
+    SNAPSHOT_VERSION = 2
+    SNAPSHOT_HEADER = struct.Struct("<4sII")  # magic, version, metadata length
+    SNAPSHOT_ALIGNMENT = 8
+    SNAPSHOT_COLUMNS = [
+        "flight_no",
+        "origin",
+        "destination",
+        "departure",
+        "arrival",
+        "base_price",
+        "bag_price",
+        "bags_allowed",
+    ]
 
     def __init__(
         self,
@@ -148,77 +492,944 @@ class FlightDataset:
 
         """
         self._dataset_path = dataset_path
+        self._mmap: Optional[mmap.mmap] = None
+        # source CSV (path, size, mtime, checksum) of the loaded snapshot
+        self.snapshot_source: Optional[Dict] = None
+        # loaded partitions (departure days) of partitioned dataset
+        self.partitions: List[str] = []
         self.srcs: set = set()
         self.dsts: set = set()
-        self.dg_edges_by_src: collections.defaultdict[
-            str, List
-        ] = collections.defaultdict(list)
-        self.dg_edges_by_dst: collections.defaultdict[
-            str, List
-        ] = collections.defaultdict(list)
-
-    def add_row(self, row: dict) -> None:
-        src: str = row[FlightDataset.COL_ORIGIN]
-        dst: str = row[FlightDataset.COL_DESTINATION]
-        row[FlightDataset.COL_DEPARTURE_O] = datetime.datetime.strptime(
-            row[FlightDataset.COL_DEPARTURE], FlightDataset.FORMAT_DATETIME
-        )
-        row[FlightDataset.COL_ARRIVAL_O] = datetime.datetime.strptime(
-            row[FlightDataset.COL_ARRIVAL], FlightDataset.FORMAT_DATETIME
-        )
-        row[FlightDataset.COL_FLIGHT_S] = (
-            row[FlightDataset.COL_ARRIVAL_O] - row[FlightDataset.COL_DEPARTURE_O]
-        ).total_seconds()
-        row[FlightDataset.COL_BASE_PRICE] = float(row[FlightDataset.COL_BASE_PRICE])
-        row[FlightDataset.COL_BAG_PRICE] = float(row[FlightDataset.COL_BAG_PRICE])
-        row[FlightDataset.COL_BAGS_ALLOWED] = int(row[FlightDataset.COL_BAGS_ALLOWED])
-        self.srcs.add(src)
-        self.dg_edges_by_src[src].append(row)
-        self.dsts.add(dst)
-        self.dg_edges_by_dst[dst].append(row)
-
-    def load(self) -> "FlightDataset":
+        # interned airport codes and flight numbers
+        self.airports: List[str] = []
+        self.airport_ids: Dict[str, int] = {}
+        self.flight_nos: List[str] = []
+        self.flight_no_ids: Dict[str, int] = {}
+        # columns
+        self.flight_no: array.array = array.array("i")
+        self.origin: array.array = array.array("i")
+        self.destination: array.array = array.array("i")
+        self.departure: array.array = array.array("q")
+        self.arrival: array.array = array.array("q")
+        self.base_price: array.array = array.array("d")
+        self.bag_price: array.array = array.array("d")
+        self.bags_allowed: array.array = array.array("i")
+        # original datetime strings which differ from FORMAT_DATETIME (not padded)
+        self.raw_departure: Dict[int, str] = {}
+        self.raw_arrival: Dict[int, str] = {}
+        # graph: airport id -> flight indices
+        self.dg_edges_by_src: Dict[int, array.array] = {}
+        self.dg_edges_by_dst: Dict[int, array.array] = {}
+        # origin airport id -> departures of dg_edges_by_src flights (sorted)
+        self.dg_departures_by_src: Dict[int, array.array] = {}
+        # destination airport id -> arrivals of dg_edges_by_dst flights (sorted)
+        self.dg_arrivals_by_dst: Dict[int, array.array] = {}
+        self._unsorted_srcs: set = set()
+        self._unsorted_dsts: set = set()
+        # updates: version, (flight number id, departure) -> flight index and
+        # read-only view of the version (see snapshot())
+        self.version: int = 0
+        self._flight_ids: Optional[Dict[tuple, int]] = None
+        self._snapshot: Optional[FlightDataset] = None
+        self._frozen: bool = False
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.departure)
+
+    def intern_airport(self, airport: str) -> int:
+        airport_id = self.airport_ids.get(airport)
+        if airport_id is None:
+            airport_id = len(self.airports)
+            self.airport_ids[airport] = airport_id
+            self.airports.append(airport)
+        return airport_id
+
+    def intern_flight_no(self, flight_no: str) -> int:
+        flight_no_id = self.flight_no_ids.get(flight_no)
+        if flight_no_id is None:
+            flight_no_id = len(self.flight_nos)
+            self.flight_no_ids[flight_no] = flight_no_id
+            self.flight_nos.append(flight_no)
+        return flight_no_id
+
+    def airport_id(self, airport: str) -> int:
+        """Get airport id or -1 if the airport is unknown."""
+        return self.airport_ids.get(airport, -1)
+
+    @staticmethod
+    def to_epoch(value: str) -> int:
+        return (
+            datetime.datetime.strptime(value, FlightDataset.FORMAT_DATETIME)
+            - FlightDataset.EPOCH
+        ) // datetime.timedelta(seconds=1)
+
+    @staticmethod
+    def from_epoch(seconds: int) -> str:
+        return (FlightDataset.EPOCH + datetime.timedelta(seconds=seconds)).strftime(
+            FlightDataset.FORMAT_DATETIME
+        )
+
+    def add_row(self, row: dict) -> int:
+        """Add CSV row (dictionary) to the dataset and return its flight index.
+
+        Call ``index()`` once all rows are added to sort flights by departure.
+        Rows are added in place - use ``upsert_flight()`` to update dataset
+        which is being searched.
+
+        """
+        index: int = self._add_row_columns(row)
+        src_id: int = self.origin[index]
+        dst_id: int = self.destination[index]
+        self.srcs.add(self.airports[src_id])
+        if src_id not in self.dg_edges_by_src:
+            self.dg_edges_by_src[src_id] = array.array("i")
+        self.dg_edges_by_src[src_id].append(index)
+        self._unsorted_srcs.add(src_id)
+        self.dsts.add(self.airports[dst_id])
+        if dst_id not in self.dg_edges_by_dst:
+            self.dg_edges_by_dst[dst_id] = array.array("i")
+        self.dg_edges_by_dst[dst_id].append(index)
+        self._unsorted_dsts.add(dst_id)
+        return index
+
+    def _add_row_columns(self, row: dict) -> int:
+        """Append CSV row (dictionary) to flight columns only."""
+        index: int = len(self.departure)
+        src_id: int = self.intern_airport(row[FlightDataset.COL_ORIGIN])
+        dst_id: int = self.intern_airport(row[FlightDataset.COL_DESTINATION])
+        departure: str = row[FlightDataset.COL_DEPARTURE]
+        arrival: str = row[FlightDataset.COL_ARRIVAL]
+
+        self.flight_no.append(self.intern_flight_no(row[FlightDataset.COL_FLIGHT]))
+        self.origin.append(src_id)
+        self.destination.append(dst_id)
+        self.departure.append(FlightDataset.to_epoch(departure))
+        self.arrival.append(FlightDataset.to_epoch(arrival))
+        self.base_price.append(float(row[FlightDataset.COL_BASE_PRICE]))
+        self.bag_price.append(float(row[FlightDataset.COL_BAG_PRICE]))
+        self.bags_allowed.append(int(row[FlightDataset.COL_BAGS_ALLOWED]))
+        if len(departure) != FlightDataset.LEN_DATETIME:
+            self.raw_departure[index] = departure
+        if len(arrival) != FlightDataset.LEN_DATETIME:
+            self.raw_arrival[index] = arrival
+        return index
+
+    def load(
+        self,
+        verify_snapshot: bool = False,
+        fast: bool = True,
+        query: Optional[FlightQuery] = None,
+    ) -> "FlightDataset":
+        """Load dataset from CSV file, binary snapshot or partitions directory.
+
+        See ``save_snapshot()`` and ``save_partitions()``.
+
+        Parameters
+        ----------
+        verify_snapshot : bool
+          Compare snapshot source CSV checksum (instead of size and modification
+          time only) to detect stale snapshot.
+        fast : bool
+          Load CSV using chunked columnar parser (``csv.DictReader`` rows are
+          added using ``add_row()`` otherwise).
+        query : FlightQuery
+          Load only flights departing on days the query can use (see
+          ``FlightQuery.departure_days()``) - only these partitions of
+          partitioned dataset are loaded. Snapshot is always loaded whole.
+
+        """
+        if FlightDataset.is_partitioned(self._dataset_path):
+            self._load_partitions(query)
+            return self.index()
         if not os.path.isfile(self._dataset_path):
             raise FileNotFoundError(
                 f"Invalid input dataset path: '{self._dataset_path}'"
             )
 
+        if FlightDataset.is_snapshot(self._dataset_path):
+            self._load_snapshot()
+            if self.is_stale(verify=verify_snapshot):
+                raise ValueError(
+                    f"Snapshot '{self._dataset_path}' is stale - source dataset "
+                    f"'{self.snapshot_source['path']}' changed, compile it again"
+                )
+            return self
+
+        days = query.departure_days(FlightDataset.MAX_FLIGHT_SECS) if query else None
         with open(self._dataset_path, mode="r") as csv_file:
-            csv_reader = csv.DictReader(csv_file)
-            for row in csv_reader:
-                self.add_row(row)
+            if fast:
+                self._load_csv_fast(csv_file, days)
+            else:
+                csv_reader = csv.DictReader(csv_file)
+                for row in csv_reader:
+                    if not days or FlightDataset._is_departure_day(
+                        row[FlightDataset.COL_DEPARTURE], days
+                    ):
+                        self.add_row(row)
+
+        return self.index()
+
+    @staticmethod
+    def _is_departure_day(departure: str, days: Tuple[str, str]) -> bool:
+        """Check departure is within (first, last) days (empty is unbounded)."""
+        if len(departure) == FlightDataset.LEN_DATETIME:
+            day = departure[:10]
+        else:
+            day = FlightDataset.from_epoch(FlightDataset.to_epoch(departure))[:10]
+        first, last = days
+        return first <= day and (not last or day <= last)
+
+    def _load_csv_fast(
+        self, csv_file: TextIO, days: Optional[Tuple[str, str]] = None
+    ) -> None:
+        """Load CSV file by chunks of lines - each chunk is parsed column by column.
+
+        Lines are split on commas (``csv`` module is used only for chunks with
+        quotes) and datetimes are parsed by ``_to_epochs()``. Rows departing
+        out of optional (first, last) ``days`` are skipped.
+
+        """
+        header = next(csv.reader([csv_file.readline()]), [])
+        try:
+            positions = [header.index(c) for c in FlightDataset.CSV_COLUMNS]
+        except ValueError:
+            raise ValueError(
+                f"Dataset '{self._dataset_path}' must have columns: "
+                f"{FlightDataset.CSV_COLUMNS}"
+            )
+        departure = positions[
+            FlightDataset.CSV_COLUMNS.index(FlightDataset.COL_DEPARTURE)
+        ]
+        epochs: Dict[str, int] = {}
+        while True:
+            lines = csv_file.readlines(FlightDataset.CSV_CHUNK_BYTES)
+            if not lines:
+                break
+            if any('"' in line for line in lines):
+                rows = [r for r in csv.reader(lines) if r]
+            else:
+                rows = [line.rstrip("\r\n").split(",") for line in lines]
+                rows = [r for r in rows if r != [""]]
+            if days and any(days):
+                rows = [
+                    r
+                    for r in rows
+                    if FlightDataset._is_departure_day(r[departure], days)
+                ]
+            if rows:
+                columns = list(zip(*rows))
+                self._add_columns([columns[p] for p in positions], epochs)
+
+    def _to_epochs(
+        self,
+        values: Sequence[str],
+        start: int,
+        epochs: Dict[str, int],
+        raw: Dict[int, str],
+    ) -> array.array:
+        """Convert datetime strings of rows starting at index to epoch seconds.
+
+        Fixed (zero padded) FORMAT_DATETIME layout is parsed by NumPy (if
+        enabled) or ``datetime.fromisoformat()`` and repeated strings are
+        served from the ``epochs`` cache. Other layouts fall back to
+        ``datetime.strptime()`` and original strings are kept in ``raw``.
+
+        """
+        result = array.array("q")
+        if numpy is not None and OPT_NUMPY_CSV_PARSING:
+            try:
+                result.frombytes(
+                    numpy.array(values, dtype="datetime64[s]")
+                    .astype(numpy.int64)
+                    .tobytes()
+                )
+            except ValueError:
+                pass  # not ISO 8601 datetime(s)
+        if not result:
+            for value in values:
+                epoch = epochs.get(value)
+                if epoch is None:
+                    if len(value) == FlightDataset.LEN_DATETIME:
+                        epoch = (
+                            datetime.datetime.fromisoformat(value) - FlightDataset.EPOCH
+                        ) // datetime.timedelta(seconds=1)
+                    else:
+                        epoch = FlightDataset.to_epoch(value)
+                    epochs[value] = epoch
+                result.append(epoch)
+        for i, value in enumerate(values, start):
+            if len(value) != FlightDataset.LEN_DATETIME:
+                raw[i] = value
+        return result
 
+    @staticmethod
+    def _intern_all(values: Sequence[str], intern) -> array.array:
+        ids: Dict[str, int] = {}
+        return array.array(
+            "i", [ids[v] if v in ids else ids.setdefault(v, intern(v)) for v in values]
+        )
+
+    def _add_columns(self, columns: List[Sequence[str]], epochs: Dict[str, int]):
+        """Add rows given as columns of strings (in ``CSV_COLUMNS`` order)."""
+        (
+            flight_nos,
+            origins,
+            destinations,
+            departures,
+            arrivals,
+            base_prices,
+            bag_prices,
+            bags_allowed,
+        ) = columns
+        start = len(self.departure)
+        # intern new airports in the order of rows (like add_row())
+        if set(origins).union(destinations).difference(self.airport_ids):
+            for origin, destination in zip(origins, destinations):
+                self.intern_airport(origin)
+                self.intern_airport(destination)
+        origin_ids = FlightDataset._intern_all(origins, self.intern_airport)
+        destination_ids = FlightDataset._intern_all(destinations, self.intern_airport)
+        self.flight_no.extend(
+            FlightDataset._intern_all(flight_nos, self.intern_flight_no)
+        )
+        self.origin.extend(origin_ids)
+        self.destination.extend(destination_ids)
+        self.departure.extend(
+            self._to_epochs(departures, start, epochs, self.raw_departure)
+        )
+        self.arrival.extend(self._to_epochs(arrivals, start, epochs, self.raw_arrival))
+        if numpy is not None and OPT_NUMPY_CSV_PARSING:
+            self.base_price.frombytes(numpy.array(base_prices, dtype=float).tobytes())
+            self.bag_price.frombytes(numpy.array(bag_prices, dtype=float).tobytes())
+        else:
+            self.base_price.extend(map(float, base_prices))
+            self.bag_price.extend(map(float, bag_prices))
+        self.bags_allowed.extend(map(int, bags_allowed))
+
+        self.srcs.update(origins)
+        self.dsts.update(destinations)
+        for edges, airport_ids in (
+            (self.dg_edges_by_src, origin_ids),
+            (self.dg_edges_by_dst, destination_ids),
+        ):
+            for airport in set(airport_ids).difference(edges):
+                edges[airport] = array.array("i")
+            for i, airport in enumerate(airport_ids, start):
+                edges[airport].append(i)
+        self._unsorted_srcs.update(origin_ids)
+        self._unsorted_dsts.update(destination_ids)
+
+    def index(self) -> "FlightDataset":
+        """Sort flights of airports (with added rows) by departure / arrival."""
+        for src_id in self._unsorted_srcs:
+            flights = sorted(
+                self.dg_edges_by_src[src_id], key=self.departure.__getitem__
+            )
+            self.dg_edges_by_src[src_id] = array.array("i", flights)
+            self.dg_departures_by_src[src_id] = array.array(
+                "q", [self.departure[f] for f in flights]
+            )
+        self._unsorted_srcs.clear()
+        for dst_id in self._unsorted_dsts:
+            flights = sorted(self.dg_edges_by_dst[dst_id], key=self.arrival.__getitem__)
+            self.dg_edges_by_dst[dst_id] = array.array("i", flights)
+            self.dg_arrivals_by_dst[dst_id] = array.array(
+                "q", [self.arrival[f] for f in flights]
+            )
+        self._unsorted_dsts.clear()
         return self
 
+    def flights_from(
+        self,
+        airport: int,
+        earliest: Optional[int] = None,
+        latest: Optional[int] = None,
+    ) -> Sequence[int]:
+        """Get flights departing from the airport within the time window.
+
+        Parameters
+        ----------
+        airport : int
+          Origin airport id.
+        earliest : int
+          Optional earliest departure (epoch seconds, inclusive).
+        latest : int
+          Optional latest departure (epoch seconds, inclusive).
+
+        """
+        flights = self.dg_edges_by_src.get(airport)
+        if flights is None:
+            return ()
+        if earliest is None and latest is None:
+            return flights
+        departures = self.dg_departures_by_src[airport]
+        lo = 0 if earliest is None else bisect.bisect_left(departures, earliest)
+        hi = len(flights) if latest is None else bisect.bisect_right(departures, latest)
+        return flights[lo:hi]
+
+    def flights_to(
+        self,
+        airport: int,
+        earliest: Optional[int] = None,
+        latest: Optional[int] = None,
+    ) -> Sequence[int]:
+        """Get flights arriving to the airport within the time window.
+
+        Parameters
+        ----------
+        airport : int
+          Destination airport id.
+        earliest : int
+          Optional earliest arrival (epoch seconds, inclusive).
+        latest : int
+          Optional latest arrival (epoch seconds, inclusive).
+
+        """
+        flights = self.dg_edges_by_dst.get(airport)
+        if flights is None:
+            return ()
+        if earliest is None and latest is None:
+            return flights
+        arrivals = self.dg_arrivals_by_dst[airport]
+        lo = 0 if earliest is None else bisect.bisect_left(arrivals, earliest)
+        hi = len(flights) if latest is None else bisect.bisect_right(arrivals, latest)
+        return flights[lo:hi]
+
+    def snapshot(self) -> "FlightDataset":
+        """Get read-only view of the current dataset version.
+
+        Updates (``upsert_flight()``, ``remove_flight()``, ``apply_delta()``)
+        are copy-on-write - per airport arrays are replaced (not modified) and
+        flight columns are append-only, therefore the view shares them with
+        the dataset and copies only airport dictionaries and sets. The view is
+        cached until the next update.
+
+        """
+        if self._frozen:
+            return self
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self.index()
+                    snapshot = copy.copy(self)
+                    for name in (
+                        "srcs",
+                        "dsts",
+                        "airports",
+                        "airport_ids",
+                        "dg_edges_by_src",
+                        "dg_edges_by_dst",
+                        "dg_departures_by_src",
+                        "dg_arrivals_by_dst",
+                    ):
+                        setattr(snapshot, name, copy.copy(getattr(self, name)))
+                    snapshot._unsorted_srcs = set()
+                    snapshot._unsorted_dsts = set()
+                    snapshot._flight_ids = None
+                    snapshot._frozen = True
+                    self._snapshot = snapshot
+                snapshot = self._snapshot
+        return snapshot
+
+    def upsert_flight(self, row: dict) -> int:
+        """Add the flight or replace the flight with the same number and departure.
+
+        Parameters
+        ----------
+        row : dict
+          Flight with ``CSV_COLUMNS`` keys (CSV row or JSON object).
+
+        Returns
+        -------
+        Index of the added flight - replaced flight is removed from the graph,
+        but its row stays in flight columns (used by older snapshots).
+
+        """
+        with self._lock:
+            index = self._upsert_flight(row)
+            self._updated()
+        return index
+
+    def remove_flight(self, flight_no: str, departure: str) -> bool:
+        """Remove (cancel) the flight from the graph, return whether it existed.
+
+        Parameters
+        ----------
+        flight_no : str
+          Flight number.
+        departure : str
+          Flight departure (``FORMAT_DATETIME``).
+
+        """
+        with self._lock:
+            removed = self._remove_flight(flight_no, departure)
+            if removed:
+                self._updated()
+        return removed
+
+    def apply_delta(self, delta_path: str) -> int:
+        """Apply CSV or JSON lines (.jsonl) file of flight updates atomically.
+
+        Rows have ``CSV_COLUMNS`` and optional ``DELTA_OP`` column/field - rows
+        are upserted by default, ``OP_REMOVE`` rows need flight number and
+        departure only. All rows are validated before any of them is applied, so
+        that invalid delta (``ValueError``) leaves the dataset unchanged.
+        Snapshots taken before the delta is applied don't see any of its rows.
+        Returns the number of applied rows.
+
+        """
+        count: int = 0
+        with open(delta_path, mode="r") as delta_file, self._lock:
+            if os.path.splitext(delta_path)[1] in (".jsonl", ".ndjson"):
+                rows: List[Dict] = [
+                    json.loads(line) for line in delta_file if line.strip()
+                ]
+            else:
+                rows = list(csv.DictReader(delta_file))
+            ops: List[str] = [
+                FlightDataset._delta_row_op(row, delta_path) for row in rows
+            ]
+            if rows:
+                self._prepare_update()
+            for op, row in zip(ops, rows):
+                if op == FlightDataset.OP_UPSERT:
+                    self._upsert_flight(row)
+                    count += 1
+                else:
+                    count += self._remove_flight(
+                        row[FlightDataset.COL_FLIGHT],
+                        row[FlightDataset.COL_DEPARTURE],
+                    )
+            if count:
+                self._updated()
+        return count
+
+    @staticmethod
+    def _delta_row_op(row: Dict, delta_path: str) -> str:
+        """Pop delta operation of the row and check that the row can be applied."""
+        if not isinstance(row, dict):
+            raise ValueError(f"Delta row must be object in '{delta_path}': {row!r}")
+        op = row.pop(FlightDataset.DELTA_OP, None) or FlightDataset.OP_UPSERT
+        if op not in (FlightDataset.OP_UPSERT, FlightDataset.OP_REMOVE):
+            raise ValueError(f"Unknown delta operation '{op}' in '{delta_path}'")
+        try:
+            if not isinstance(row[FlightDataset.COL_FLIGHT], str):
+                raise TypeError(f"{FlightDataset.COL_FLIGHT} must be string")
+            FlightDataset.to_epoch(row[FlightDataset.COL_DEPARTURE])
+            if op == FlightDataset.OP_UPSERT:
+                for column in (FlightDataset.COL_ORIGIN, FlightDataset.COL_DESTINATION):
+                    if not isinstance(row[column], str):
+                        raise TypeError(f"{column} must be string")
+                FlightDataset.to_epoch(row[FlightDataset.COL_ARRIVAL])
+                float(row[FlightDataset.COL_BASE_PRICE])
+                float(row[FlightDataset.COL_BAG_PRICE])
+                int(row[FlightDataset.COL_BAGS_ALLOWED])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(
+                f"Invalid delta row in '{delta_path}': {e!r} {row!r}"
+            ) from e
+        return op
+
+    def _upsert_flight(self, row: dict) -> int:
+        self._prepare_update()
+        index = self._add_row_columns(row)
+        flight_ids = self._flight_index()
+        key = (self.flight_no[index], self.departure[index])
+        if key in flight_ids:
+            self._unlink(flight_ids[key])
+        flight_ids[key] = index
+        self._link(index)
+        return index
+
+    def _remove_flight(self, flight_no: str, departure: str) -> bool:
+        self._prepare_update()
+        key = (self.flight_no_ids.get(flight_no), FlightDataset.to_epoch(departure))
+        index = self._flight_index().pop(key, None)
+        if index is None:
+            return False
+        self._unlink(index)
+        return True
+
+    def _prepare_update(self) -> None:
+        if self._frozen:
+            raise ValueError("Dataset snapshot is read-only - update the dataset")
+        self.index()
+        # memory-mapped (read-only) snapshot columns are copied on the first update
+        for c in FlightDataset.SNAPSHOT_COLUMNS:
+            column = getattr(self, c)
+            if not isinstance(column, array.array):
+                setattr(self, c, array.array(column.format, column))
+
+    def _updated(self) -> None:
+        self.version += 1
+        self._snapshot = None
+
+    def _flight_index(self) -> Dict[tuple, int]:
+        """Get (flight number id, departure) -> flight index of graph flights."""
+        if self._flight_ids is None:
+            self._flight_ids = {
+                (self.flight_no[f], self.departure[f]): f
+                for flights in self.dg_edges_by_src.values()
+                for f in flights
+            }
+        return self._flight_ids
+
+    def _graph_indices(self, flight: int) -> tuple:
+        """Get (flights, times, airport, flight time) of flight's airports."""
+        return (
+            (
+                self.dg_edges_by_src,
+                self.dg_departures_by_src,
+                self.origin[flight],
+                self.departure[flight],
+            ),
+            (
+                self.dg_edges_by_dst,
+                self.dg_arrivals_by_dst,
+                self.destination[flight],
+                self.arrival[flight],
+            ),
+        )
+
+    def _link(self, flight: int) -> None:
+        """Add the flight to (copies of) sorted arrays of its airports."""
+        for edges, times, airport, value in self._graph_indices(flight):
+            flights = array.array("i", edges.get(airport, ()))
+            values = array.array("q", times.get(airport, ()))
+            i = bisect.bisect_right(values, value)
+            flights.insert(i, flight)
+            values.insert(i, value)
+            edges[airport] = flights
+            times[airport] = values
+        self.srcs.add(self.airports[self.origin[flight]])
+        self.dsts.add(self.airports[self.destination[flight]])
+
+    def _unlink(self, flight: int) -> None:
+        """Remove the flight from (copies of) sorted arrays of its airports."""
+        for (edges, times, airport, value), airports in zip(
+            self._graph_indices(flight), (self.srcs, self.dsts)
+        ):
+            flights = array.array("i", edges[airport])
+            values = array.array("q", times[airport])
+            i = bisect.bisect_left(values, value)
+            while flights[i] != flight:
+                i += 1
+            del flights[i]
+            del values[i]
+            if flights:
+                edges[airport] = flights
+                times[airport] = values
+            else:
+                del edges[airport]
+                del times[airport]
+                airports.discard(self.airports[airport])
+
     def validate(self, query: FlightQuery) -> "FlightDataset":
-        if query.origin not in self.srcs:
-            raise ValueError(f"Origin airport '{query.origin}' is invalid (unknown)")
-        if query.destination not in self.dsts:
+        for origin in query.origins():
+            if origin not in self.srcs:
+                raise ValueError(f"Origin airport '{origin}' is invalid (unknown)")
+        for destination in query.destinations():
+            if destination not in self.dsts:
+                raise ValueError(
+                    f"Destination airport '{destination}' is invalid (unknown)"
+                )
+
+        return self
+
+    @staticmethod
+    def is_partitioned(path: str) -> bool:
+        return os.path.isfile(os.path.join(path, FlightDataset.PARTITION_MANIFEST))
+
+    def save_partitions(self, partition_dir: str) -> str:
+        """Save dataset to directory of CSV files by departure day.
+
+        Partition ``YYYY-MM-DD.csv`` holds flights departing on the day and
+        ``PARTITION_MANIFEST`` holds days (number of flights) and the maximum
+        flight duration, so that ``load()`` reads only partitions a query can
+        use.
+
+        """
+        self.index()
+        days: Dict[str, List[int]] = collections.defaultdict(list)
+        max_flight_secs: int = 0
+        for flights in self.dg_edges_by_src.values():
+            for flight in flights:
+                days[FlightDataset.from_epoch(self.departure[flight])[:10]].append(
+                    flight
+                )
+                max_flight_secs = max(max_flight_secs, self.flight_seconds(flight))
+        os.makedirs(partition_dir, exist_ok=True)
+        for day, flights in days.items():
+            with open(
+                os.path.join(partition_dir, f"{day}.csv"), mode="w", newline=""
+            ) as csv_file:
+                writer = csv.DictWriter(csv_file, fieldnames=FlightDataset.CSV_COLUMNS)
+                writer.writeheader()
+                for flight in sorted(flights):
+                    writer.writerow(self.flight_to_dict(flight))
+        with open(
+            os.path.join(partition_dir, FlightDataset.PARTITION_MANIFEST), mode="w"
+        ) as manifest_file:
+            json.dump(
+                {
+                    "days": {day: len(days[day]) for day in sorted(days)},
+                    "max_flight_secs": max_flight_secs,
+                },
+                manifest_file,
+                indent=4,
+            )
+        return partition_dir
+
+    def _load_partitions(self, query: Optional[FlightQuery]) -> None:
+        with open(
+            os.path.join(self._dataset_path, FlightDataset.PARTITION_MANIFEST)
+        ) as manifest_file:
+            manifest = json.load(manifest_file)
+        first, last = (
+            query.departure_days(manifest["max_flight_secs"]) if query else ("", "")
+        )
+        for day in sorted(manifest["days"]):
+            if first <= day and (not last or day <= last):
+                with open(os.path.join(self._dataset_path, f"{day}.csv")) as csv_file:
+                    self._load_csv_fast(csv_file)
+                self.partitions.append(day)
+
+    @staticmethod
+    def is_snapshot(path: str) -> bool:
+        with open(path, mode="rb") as f:
+            return f.read(len(FlightDataset.SNAPSHOT_MAGIC)) == (
+                FlightDataset.SNAPSHOT_MAGIC
+            )
+
+    @staticmethod
+    def _file_info(path: str, checksum: bool = True) -> Dict:
+        stat = os.stat(path)
+        info = {
+            "path": os.path.abspath(path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        if checksum:
+            sha256 = hashlib.sha256()
+            with open(path, mode="rb") as f:
+                for chunk in iter(lambda: f.read(2**20), b""):
+                    sha256.update(chunk)
+            info["sha256"] = sha256.hexdigest()
+        return info
+
+    def is_stale(self, verify: bool = False) -> bool:
+        """Check whether the loaded snapshot is older than its source CSV.
+
+        Source size and modification time are compared by default, ``verify``
+        compares the source checksum (reads whole source). Snapshot with missing
+        source is not stale.
+
+        """
+        if not self.snapshot_source or not os.path.isfile(self.snapshot_source["path"]):
+            return False
+        info = FlightDataset._file_info(self.snapshot_source["path"], verify)
+        if verify:
+            return info["sha256"] != self.snapshot_source["sha256"]
+        return (info["size"], info["mtime_ns"]) != (
+            self.snapshot_source["size"],
+            self.snapshot_source["mtime_ns"],
+        )
+
+    def save_snapshot(self, snapshot_path: str) -> str:
+        """Save preprocessed and indexed dataset to versioned binary file.
+
+        Snapshot layout: header (magic, version, metadata length), JSON metadata
+        (source CSV info, string tables and column offsets) and aligned column
+        arrays - flight columns followed by flights grouped by origin (sorted
+        by departure) and destination (sorted by arrival) with per-airport
+        offsets (CSR). Snapshot is memory-mapped by ``load()`` so the startup
+        doesn't depend on the number of flights.
+
+        """
+        self.index()
+        airports_count = len(self.airports)
+        columns: Dict[str, Sequence] = {
+            c: getattr(self, c) for c in FlightDataset.SNAPSHOT_COLUMNS
+        }
+        for direction, edges in (
+            ("src", self.dg_edges_by_src),
+            ("dst", self.dg_edges_by_dst),
+        ):
+            flights = array.array("i")
+            offsets = array.array("q", [0])
+            for airport in range(airports_count):
+                flights.extend(edges.get(airport, ()))
+                offsets.append(len(flights))
+            columns[f"{direction}_flights"] = flights
+            columns[f"{direction}_offsets"] = offsets
+        columns["src_departures"] = array.array(
+            "q", [self.departure[f] for f in columns["src_flights"]]
+        )
+        columns["dst_arrivals"] = array.array(
+            "q", [self.arrival[f] for f in columns["dst_flights"]]
+        )
+
+        metadata: Dict = {
+            "source": (
+                FlightDataset._file_info(self._dataset_path)
+                if os.path.isfile(self._dataset_path)
+                else None
+            ),
+            "airports": self.airports,
+            "flight_nos": self.flight_nos,
+            "raw_departure": self.raw_departure,
+            "raw_arrival": self.raw_arrival,
+            "columns": {},
+        }
+        offset = 0
+        for name, column in columns.items():
+            column = memoryview(column)
+            metadata["columns"][name] = [offset, column.format, len(column)]
+            offset += column.nbytes
+            offset += -offset % FlightDataset.SNAPSHOT_ALIGNMENT
+        metadata_bytes = json.dumps(metadata).encode("utf-8")
+        header_size = FlightDataset.SNAPSHOT_HEADER.size + len(metadata_bytes)
+        padding = -header_size % FlightDataset.SNAPSHOT_ALIGNMENT
+
+        with open(snapshot_path, mode="wb") as f:
+            f.write(
+                FlightDataset.SNAPSHOT_HEADER.pack(
+                    FlightDataset.SNAPSHOT_MAGIC,
+                    FlightDataset.SNAPSHOT_VERSION,
+                    len(metadata_bytes) + padding,
+                )
+            )
+            f.write(metadata_bytes)
+            f.write(b" " * padding)
+            for column in columns.values():
+                column = memoryview(column)
+                f.write(column)
+                f.write(b"\0" * (-column.nbytes % FlightDataset.SNAPSHOT_ALIGNMENT))
+        return snapshot_path
+
+    def _load_snapshot(self) -> None:
+        with open(self._dataset_path, mode="rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        magic, version, metadata_size = FlightDataset.SNAPSHOT_HEADER.unpack_from(
+            buffer
+        )
+        if version != FlightDataset.SNAPSHOT_VERSION:
             raise ValueError(
-                f"Destination airport '{query.destination}' is invalid (unknown)"
+                f"Snapshot '{self._dataset_path}' version {version} is not "
+                f"supported (expected {FlightDataset.SNAPSHOT_VERSION}) - "
+                f"compile it again"
             )
+        start = FlightDataset.SNAPSHOT_HEADER.size
+        end = start + metadata_size
+        metadata = json.loads(bytes(buffer[start:end]))
+        start = end
 
-        return self
+        columns: Dict[str, memoryview] = {}
+        for name, (offset, typecode, length) in metadata["columns"].items():
+            offset += start
+            end = offset + length * array.array(typecode).itemsize
+            columns[name] = buffer[offset:end].cast(typecode)
+
+        self.snapshot_source = metadata["source"]
+        self.airports = metadata["airports"]
+        self.airport_ids = {a: i for i, a in enumerate(self.airports)}
+        self.flight_nos = metadata["flight_nos"]
+        self.flight_no_ids = {f: i for i, f in enumerate(self.flight_nos)}
+        self.raw_departure = {int(k): v for k, v in metadata["raw_departure"].items()}
+        self.raw_arrival = {int(k): v for k, v in metadata["raw_arrival"].items()}
+        for c in FlightDataset.SNAPSHOT_COLUMNS:
+            setattr(self, c, columns[c])
+        src_offsets = columns["src_offsets"]
+        dst_offsets = columns["dst_offsets"]
+        for airport in range(len(self.airports)):
+            lo, hi = src_offsets[airport], src_offsets[airport + 1]
+            if lo < hi:
+                self.srcs.add(self.airports[airport])
+                self.dg_edges_by_src[airport] = columns["src_flights"][lo:hi]
+                self.dg_departures_by_src[airport] = columns["src_departures"][lo:hi]
+            lo, hi = dst_offsets[airport], dst_offsets[airport + 1]
+            if lo < hi:
+                self.dsts.add(self.airports[airport])
+                self.dg_edges_by_dst[airport] = columns["dst_flights"][lo:hi]
+                self.dg_arrivals_by_dst[airport] = columns["dst_arrivals"][lo:hi]
+
+    def flight_seconds(self, flight: int) -> int:
+        return self.arrival[flight] - self.departure[flight]
+
+    def flight_to_dict(self, flight: int) -> Dict:
+        departure = self.raw_departure.get(flight)
+        arrival = self.raw_arrival.get(flight)
+        return {
+            FlightDataset.COL_FLIGHT: self.flight_nos[self.flight_no[flight]],
+            FlightDataset.COL_ORIGIN: self.airports[self.origin[flight]],
+            FlightDataset.COL_DESTINATION: self.airports[self.destination[flight]],
+            FlightDataset.COL_DEPARTURE: departure
+            or FlightDataset.from_epoch(self.departure[flight]),
+            FlightDataset.COL_ARRIVAL: arrival
+            or FlightDataset.from_epoch(self.arrival[flight]),
+            FlightDataset.COL_BASE_PRICE: self.base_price[flight],
+            FlightDataset.COL_BAG_PRICE: self.bag_price[flight],
+            FlightDataset.COL_BAGS_ALLOWED: self.bags_allowed[flight],
+        }
 
 
 class Trip:
-    def __init__(self, origin: str, destination: str, bags_count: int):
-        self.flights: List[Dict] = []
+    """Flight trip - path of flights from the origin.
+
+    Trips are linked nodes: trip extended by a flight (``extend()``) points to
+    its parent trip (prefix) and holds the accumulated price, travel seconds
+    and the minimum of bags allowed. Partial trips therefore share their
+    prefixes and extension doesn't copy them. Flights are materialized by
+    ``finalize()``.
+
+    """
+
+    __slots__ = (
+        "dataset",
+        "origin",
+        "destination",
+        "bags_count",
+        "parent",
+        "flight",
+        "stop",
+        "length",
+        "bags_allowed",
+        "total_price",
+        "travel_time",
+        "travel_secs",
+        "back_secs",
+        "_flights",
+    )
+
+    def __init__(
+        self, dataset: FlightDataset, origin: str, destination: str, bags_count: int
+    ):
+        self.dataset: FlightDataset = dataset
         self.origin: str = origin
         self.destination: str = destination
-        self.bags_allowed: int = 42  # min of bags allowed @ all flights
         self.bags_count: int = bags_count
+        self.parent: Optional[Trip] = None  # trip without the last flight
+        self.flight: int = -1  # last flight index
+        self.stop: int = dataset.airport_id(origin)  # last stop airport id
+        self.length: int = 0  # number of flights
+        self.bags_allowed: int = 42  # min of bags allowed @ all flights
         self.total_price: float = 0.0
         self.travel_time: str = ""
-
-        self.stops: List[str] = [origin]
         self.travel_secs: int = 0
+        # travel seconds of the back trip of joined return trip (see join())
+        self.back_secs: int = 0
+        self._flights: Optional[List[int]] = None  # materialized flights
 
     def __str__(self) -> str:
+        flight_nos = [
+            self.dataset.flight_nos[self.dataset.flight_no[f]] for f in self.flights
+        ]
         return (
             f"Trip from {self.origin} to {self.destination}:\n"
-            f"  stops       : {self.stops}\n"
-            f"  flights     : {[f[FlightDataset.COL_FLIGHT] for f in self.flights]}\n"
+            f"  stops       : {[self.dataset.airports[s] for s in self.stops]}\n"
+            f"  flights     : {flight_nos}\n"
             f"  bags count  : {self.bags_count}\n"
             f"  bags allowed: {self.bags_allowed}\n"
             f"  total price : {self.total_price}\n"
@@ -226,60 +1437,154 @@ class Trip:
             f"  travel secs : {self.travel_secs}\n"
         )
 
-    def add_stop(self, flight: Dict):
-        self.stops.append(flight[FlightDataset.COL_DESTINATION])
-        self.total_price += flight[FlightDataset.COL_BASE_PRICE]
-        self.total_price += float(self.bags_count) * flight[FlightDataset.COL_BAG_PRICE]
+    @property
+    def flights(self) -> List[int]:
+        """Get flight indices (walks parent trips unless finalized)."""
+        if self._flights is not None:
+            return self._flights
+        flights: List[int] = []
+        t: Trip = self
+        while t.length:
+            if t._flights is not None:
+                flights.extend(reversed(t._flights))
+                break
+            flights.append(t.flight)
+            t = t.parent
+        flights.reverse()
+        return flights
+
+    @property
+    def stops(self) -> List[int]:
+        """Get airport ids of the origin and flight destinations."""
+        return [self.dataset.airport_id(self.origin)] + [
+            self.dataset.destination[f] for f in self.flights
+        ]
+
+    @property
+    def duration_secs(self) -> int:
+        """Get travel seconds of both "there" and back trip of return trip.
+
+        Travel time (``travel_secs``) of return trip is of "there" trip only.
+
+        """
+        return self.travel_secs + self.back_secs
+
+    def visits(self, airport: int) -> bool:
+        """Check whether the trip (origin or any flight) visits the airport."""
+        t: Optional[Trip] = self
+        while t is not None:
+            if t.stop == airport:
+                return True
+            t = t.parent
+        return False
+
+    def visited(self) -> List[int]:
+        """Get airports visited by the trip (the last stop first, origin last)."""
+        airports: List[int] = []
+        t: Optional[Trip] = self
+        while t is not None:
+            airports.append(t.stop)
+            t = t.parent
+        return airports
+
+    def extend(self, flight: int) -> "Trip":
+        """Create trip which continues with the flight (this trip is its parent)."""
+        dataset: FlightDataset = self.dataset
+        t: Trip = Trip.__new__(Trip)
+        t.dataset = dataset
+        t.origin = self.origin
+        t.destination = self.destination
+        t.bags_count = self.bags_count
+        t.parent = self
+        t.flight = flight
+        t.stop = dataset.destination[flight]
+        t.length = self.length + 1
+        t.bags_allowed = min(self.bags_allowed, dataset.bags_allowed[flight])
+        t.total_price = self.total_price + dataset.base_price[flight]
+        t.total_price += float(self.bags_count) * dataset.bag_price[flight]
+        t.travel_time = self.travel_time
         # travel time: flight + wait time
-        self.travel_secs += flight[FlightDataset.COL_FLIGHT_S]
-        if self.flights:
-            self.travel_secs += (
-                flight[FlightDataset.COL_DEPARTURE_O]
-                - self.flights[-1][FlightDataset.COL_ARRIVAL_O]
-            ).total_seconds()
+        t.travel_secs = self.travel_secs + dataset.flight_seconds(flight)
+        if self.length:
+            t.travel_secs += dataset.departure[flight] - dataset.arrival[self.flight]
+        t.back_secs = 0
+        t._flights = None
+        return t
 
-        self.flights.append(flight)
-        self.bags_allowed = min(
-            self.bags_allowed, flight[FlightDataset.COL_BAGS_ALLOWED]
-        )
+    def with_bags(self, bags_count: int) -> "Trip":
+        """Get finalized copy of the trip with the number of bags.
+
+        Total price is summed flight by flight (base price plus bags price) in
+        the same order as ``extend()`` does - it is the same as the price of the
+        trip searched with the bags.
+
+        """
+        dataset: FlightDataset = self.dataset
+        t: Trip = self.copy()
+        t.bags_count = bags_count
+        t.total_price = 0.0
+        for flight in t.flights:
+            t.total_price += dataset.base_price[flight]
+            t.total_price += float(bags_count) * dataset.bag_price[flight]
+        t.finalize()
+        return t
+
+    def add_stop(self, flight: int):
+        """Add the flight to this trip (in place) - see ``extend()``."""
+        t: Trip = self.copy().extend(flight)
+        for name in Trip.__slots__:
+            setattr(self, name, getattr(t, name))
 
     def copy(self) -> "Trip":
-        t: Trip = Trip(
-            origin=self.origin, destination=self.destination, bags_count=self.bags_count
-        )
-        t.flights = self.flights.copy()
-        t.bags_allowed = self.bags_allowed
-        t.total_price = self.total_price
-        t.travel_time = self.travel_time
-        t.stops = self.stops.copy()
-        t.travel_secs = self.travel_secs
+        t: Trip = Trip.__new__(Trip)
+        for name in Trip.__slots__:
+            setattr(t, name, getattr(self, name))
+        if t._flights is not None:
+            t._flights = t._flights.copy()
+        return t
+
+    def departure(self) -> int:
+        """Get departure of the first flight (epoch seconds)."""
+        return self.dataset.departure[self.flights[0]]
+
+    def arrival(self) -> int:
+        """Get arrival of the last flight (epoch seconds)."""
+        return self.dataset.arrival[self.flight]
+
+    def join(self, back: "Trip") -> "Trip":
+        """Create return trip from this ("there") trip and the back trip."""
+        t: Trip = self.copy()
+        t._flights = self.flights + back.flights
+        t.flight = back.flight
+        t.stop = back.stop
+        t.length = len(t._flights)
+        t.bags_allowed = min(self.bags_allowed, back.bags_allowed)
+        t.total_price += back.total_price
+        t.back_secs = back.duration_secs
+        t.finalize()
+        t.parent = None
         return t
 
+    def release(self):
+        """Finalize the trip and drop its parent (the trip must not be extended).
+
+        Found trips otherwise hold their parents - partial trips of the search -
+        alive as long as the result.
+
+        """
+        self.finalize()
+        self.parent = None
+
     def finalize(self):
+        self._flights = self.flights
         # WITH padding: "travel_time": "06:55:00"
         # self.travel_time = time.strftime("%H:%M:%S", time.gmtime(self.travel_secs))
         # WITHOUT padding: "travel_time": "6:55:00"
         self.travel_time = f"{datetime.timedelta(seconds=self.travel_secs)}"
 
-    @staticmethod
-    def flight_to_dict(flight: Dict):
-        result = {}
-        for c in [
-            FlightDataset.COL_FLIGHT,
-            FlightDataset.COL_ORIGIN,
-            FlightDataset.COL_DESTINATION,
-            FlightDataset.COL_DEPARTURE,
-            FlightDataset.COL_ARRIVAL,
-            FlightDataset.COL_BASE_PRICE,
-            FlightDataset.COL_BAG_PRICE,
-            FlightDataset.COL_BAGS_ALLOWED,
-        ]:
-            result[c] = flight[c]
-        return result
-
     def to_dict(self):
         return {
-            "flights": [Trip.flight_to_dict(f) for f in self.flights],
+            "flights": [self.dataset.flight_to_dict(f) for f in self.flights],
             "bags_allowed": self.bags_allowed,
             "bags_count": self.bags_count,
             "destination": self.destination,
@@ -289,156 +1594,2880 @@ class Trip:
         }
 
 
-class FlightSearchResult:
-    def __init__(self):
-        self.trips: List[Trip] = []
+class TripPath:
+    """Mutable path of flights from the origin - depth first search state.
 
-    def __str__(self) -> str:
-        result: List[str] = [f"Search result ({len(self.trips)}):"]
-        for t in self.trips:
-            result.append(f"  {str(t)}")
-        return "\n".join(result)
+    Flights are pushed and popped (backtracking) in place: the accumulated
+    price, travel seconds and minimum of bags allowed of shorter paths are kept
+    on stacks (restored, not recomputed, on pop) and visited airports in a set.
+    The path has the fields of ``Trip`` used by the admissibility check, found
+    trips are materialized by ``to_trip()``.
 
-    def add_trip(self, trip: Trip) -> None:
+    """
+
+    __slots__ = (
+        "dataset",
+        "origin",
+        "destination",
+        "bags_count",
+        "flight",
+        "stop",
+        "length",
+        "bags_allowed",
+        "total_price",
+        "travel_secs",
+        "flights",
+        "_origin",
+        "_visited",
+        "_prices",
+        "_secs",
+        "_bags",
+    )
+
+    def __init__(
+        self, dataset: FlightDataset, origin: str, destination: str, bags_count: int
+    ):
+        self.dataset: FlightDataset = dataset
+        self.origin: str = origin
+        self.destination: str = destination
+        self.bags_count: int = bags_count
+        self.flight: int = -1  # last flight index
+        self.stop: int = dataset.airport_id(origin)  # last stop airport id
+        self.length: int = 0  # number of flights
+        self.bags_allowed: int = 42  # min of bags allowed @ all flights
+        self.total_price: float = 0.0
+        self.travel_secs: int = 0
+        self.flights: List[int] = []
+        self._origin: int = self.stop
+        self._visited: Set[int] = {self.stop}
+        # price, travel seconds and bags allowed of the path without last flight
+        self._prices: List[float] = []
+        self._secs: List[int] = []
+        self._bags: List[int] = []
+
+    def visits(self, airport: int) -> bool:
+        """Check whether the path (origin or any flight) visits the airport."""
+        return airport in self._visited
+
+    def push(self, flight: int) -> None:
+        """Continue the path with the flight - accumulated as ``Trip.extend()``."""
+        dataset: FlightDataset = self.dataset
+        self._prices.append(self.total_price)
+        self._secs.append(self.travel_secs)
+        self._bags.append(self.bags_allowed)
+        self.bags_allowed = min(self.bags_allowed, dataset.bags_allowed[flight])
+        self.total_price += dataset.base_price[flight]
+        self.total_price += float(self.bags_count) * dataset.bag_price[flight]
+        self.travel_secs += dataset.flight_seconds(flight)
+        if self.length:
+            self.travel_secs += dataset.departure[flight] - dataset.arrival[self.flight]
+        self.flights.append(flight)
+        self.flight = flight
+        self.stop = dataset.destination[flight]
+        self.length += 1
+        self._visited.add(self.stop)
+
+    def pop(self) -> None:
+        """Remove the last flight of the path (backtrack)."""
+        self._visited.discard(self.stop)
+        self.flights.pop()
+        self.length -= 1
+        if self.length:
+            self.flight = self.flights[-1]
+            self.stop = self.dataset.destination[self.flight]
+        else:
+            self.flight = -1
+            self.stop = self._origin
+        self.total_price = self._prices.pop()
+        self.travel_secs = self._secs.pop()
+        self.bags_allowed = self._bags.pop()
+
+    def to_trip(self) -> Trip:
+        """Create finalized trip of the path flights."""
+        t: Trip = Trip(self.dataset, self.origin, self.destination, self.bags_count)
+        t._flights = self.flights.copy()
+        t.flight = self.flight
+        t.stop = self.stop
+        t.length = self.length
+        t.bags_allowed = self.bags_allowed
+        t.total_price = self.total_price
+        t.travel_secs = self.travel_secs
+        t.finalize()
+        return t
+
+
+class FlightSearchStats:
+    """Search instrumentation of a query - counters and timings.
+
+    Stats are opt-in: searches record them only if the stats instance is
+    passed to them (``find_flights()``, ``iter_flights()``), otherwise the only
+    cost is ``None`` check.
+
+    """
+
+    PRUNED_HOPS = "hops"
+    PRUNED_TIME = "time"
+    PRUNED_PRICE = "price"
+    PRUNED_DOMINATED = "dominated"
+
+    REJECTED_CYCLE = "cycle"
+    REJECTED_BAGS = "bags"
+    REJECTED_LAYOVER = "layover"
+    REJECTED_PRICE = "price"
+    REJECTED_STOPS = "stops"
+
+    TIME_LOAD = "load"
+    TIME_SEARCH = "search"
+    TIME_PAIRING = "pairing"
+
+    def __init__(self):
+        # partial trips expanded (their next flights checked)
+        self.expanded: int = 0
+        # flights rejected by admissibility check (by reason)
+        self.rejected: Dict[str, int] = {
+            FlightSearchStats.REJECTED_CYCLE: 0,
+            FlightSearchStats.REJECTED_BAGS: 0,
+            FlightSearchStats.REJECTED_LAYOVER: 0,
+            FlightSearchStats.REJECTED_PRICE: 0,
+            FlightSearchStats.REJECTED_STOPS: 0,
+        }
+        # admissible flights which can't reach the destination (by bound)
+        self.pruned: Dict[str, int] = {
+            FlightSearchStats.PRUNED_HOPS: 0,
+            FlightSearchStats.PRUNED_TIME: 0,
+            FlightSearchStats.PRUNED_PRICE: 0,
+            FlightSearchStats.PRUNED_DOMINATED: 0,
+        }
+        # maximum number of queued partial trips (search frontier)
+        self.peak_queue: int = 0
+        # maximum approximate memory of queued partial trips and found trips
+        self.peak_bytes: int = 0
+        # trips found
+        self.found: int = 0
+        # searches stopped by limits (frontier, memory or result trips)
+        self.truncated: int = 0
+        # seconds spent by dataset loading, search and return trips pairing
+        self.times: Dict[str, float] = {
+            FlightSearchStats.TIME_LOAD: 0.0,
+            FlightSearchStats.TIME_SEARCH: 0.0,
+            FlightSearchStats.TIME_PAIRING: 0.0,
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"Search stats: expanded {self.expanded}, rejected "
+            f"{sum(self.rejected.values())} {self.rejected}, pruned "
+            f"{sum(self.pruned.values())} {self.pruned}, peak queue "
+            f"{self.peak_queue}, peak bytes {self.peak_bytes}, found {self.found}, "
+            f"truncated {self.truncated}, times {self.times}"
+        )
+
+    def update_peak(self, queue_size: int, expanded: int = 0) -> None:
+        """Update peak queue size and memory estimate (partial and found trips)."""
+        if self.peak_queue < queue_size:
+            self.peak_queue = queue_size
+        estimate: int = FlightSearchLimits.estimate_bytes(
+            queue_size + expanded, self.found
+        )
+        if self.peak_bytes < estimate:
+            self.peak_bytes = estimate
+
+    @staticmethod
+    @contextlib.contextmanager
+    def timer(stats: Optional["FlightSearchStats"], name: str) -> Iterator[None]:
+        """Add time spent in the context to the stats (if any) time."""
+        if stats is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats.times[name] += time.perf_counter() - start
+
+    def to_dict(self) -> Dict:
+        return {
+            "expanded": self.expanded,
+            "rejected": dict(self.rejected),
+            "pruned": dict(self.pruned),
+            "peak_queue": self.peak_queue,
+            "peak_bytes": self.peak_bytes,
+            "found": self.found,
+            "truncated": self.truncated,
+            "times": dict(self.times),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps({"stats": self.to_dict()}, indent=4)
+
+
+class FlightSearchLimits:
+    """Hard search space limits of a query and their state.
+
+    Memory is estimated from the number of partial trips - queued and expanded
+    ones (parents of queued and found trips) - and found trips held by the
+    result. It's approximate (expanded trips are upper bound of parents), but
+    it doesn't cost a measurement.
+
+    """
+
+    # approximate bytes of partial trip (trip, its price, seconds and queue entry)
+    # and of found trip (finalized trip with flights list and travel time string)
+    PARTIAL_TRIP_BYTES = sys.getsizeof(Trip.__new__(Trip)) + 64
+    TRIP_BYTES = PARTIAL_TRIP_BYTES + 160
+
+    def __init__(self, query: FlightQuery):
+        self.max_frontier: int = query.max_frontier
+        self.max_bytes: int = query.max_memory_mb * 2**20
+        self.iddfs: bool = query.on_limit == FlightQuery.ON_LIMIT_IDDFS
+        # trips found (and held) so far by searches using the limits
+        self.found: int = 0
+        # a limit was hit and the search stopped
+        self.truncated: bool = False
+
+    @staticmethod
+    def estimate_bytes(partial_trips: int, found: int) -> int:
+        return (
+            partial_trips * FlightSearchLimits.PARTIAL_TRIP_BYTES
+            + found * FlightSearchLimits.TRIP_BYTES
+        )
+
+    def is_exceeded(self, frontier: int, expanded: int = 0) -> bool:
+        """Check whether the frontier size or the memory estimate is over limit."""
+        if self.max_frontier and frontier > self.max_frontier:
+            return True
+        return bool(
+            self.max_bytes
+            and FlightSearchLimits.estimate_bytes(frontier + expanded, self.found)
+            > self.max_bytes
+        )
+
+
+class TripJsonEncoder:
+    """Streaming JSON encoder of trips.
+
+    Trips are encoded field by field (no ``to_dict()`` copies) and flights are
+    serialized once - their JSON is cached by (flight, nesting level) and
+    reused by all trips sharing them. Output equals ``json.dumps()`` of trip
+    dicts with ``indent`` (pretty), ``(",", ":")`` separators (compact) or
+    default separators (JSON lines). With ``flight_refs`` trips reference
+    flights by their dataset index.
+
+    """
+
+    def __init__(
+        self,
+        indent: Optional[int] = None,
+        compact: bool = False,
+        flight_refs: bool = False,
+    ):
+        self.indent: Optional[int] = indent
+        if compact:
+            self.item_separator, self.key_separator = ",", ":"
+        elif indent is not None:
+            self.item_separator, self.key_separator = ",", ": "
+        else:
+            self.item_separator, self.key_separator = ", ", ": "
+        self.flight_refs: bool = flight_refs
+        self.dataset: Optional[FlightDataset] = None
+        self._flights: Dict[Tuple[int, int], str] = {}
+
+    def newline(self, level: int) -> str:
+        if self.indent is None:
+            return ""
+        return "\n" + " " * (self.indent * level)
+
+    def encode_flight(self, flight: int, level: int) -> str:
+        key = (flight, level)
+        text: Optional[str] = self._flights.get(key)
+        if text is None:
+            text = json.dumps(
+                self.dataset.flight_to_dict(flight),
+                indent=self.indent,
+                separators=(self.item_separator, self.key_separator),
+            )
+            if level and self.indent is not None:
+                text = text.replace("\n", self.newline(level))
+            self._flights[key] = text
+        return text
+
+    def encode(self, trip: Trip, level: int = 0) -> str:
+        """Encode the trip nested at the level (of indentation)."""
+        if trip.dataset is not self.dataset:
+            self.dataset = trip.dataset
+            self._flights.clear()
+        if self.flight_refs:
+            flights = [str(f) for f in trip.flights]
+        else:
+            flights = [self.encode_flight(f, level + 2) for f in trip.flights]
+        fields = [
+            ("flights", self.encode_items("[", flights, "]", level + 1)),
+            ("bags_allowed", str(trip.bags_allowed)),
+            ("bags_count", str(trip.bags_count)),
+            ("destination", json.dumps(trip.destination)),
+            ("origin", json.dumps(trip.origin)),
+            ("total_price", json.dumps(trip.total_price)),
+            ("travel_time", json.dumps(trip.travel_time)),
+        ]
+        return self.encode_fields(fields, level)
+
+    def encode_fields(self, fields: List[Tuple[str, str]], level: int) -> str:
+        """Encode an object of (key, encoded value) fields."""
+        items = [f'"{k}"{self.key_separator}{v}' for k, v in fields]
+        return self.encode_items("{", items, "}", level)
+
+    def encode_items(self, start: str, items: List[str], end: str, level: int) -> str:
+        """Encode an array or object of encoded items nested at the level."""
+        if not items:
+            return start + end
+        separator = self.item_separator + self.newline(level + 1)
+        return (
+            f"{start}{self.newline(level + 1)}{separator.join(items)}"
+            f"{self.newline(level)}{end}"
+        )
+
+
+class FlightSearchResult:
+    def __init__(self):
+        self.trips: List[Trip] = []
+        self.stats: Optional[FlightSearchStats] = None
+        # search stopped early (deadline or budget) - trips found so far
+        self.truncated: bool = False
+
+    def __str__(self) -> str:
+        result: List[str] = [f"Search result ({len(self.trips)}):"]
+        for t in self.trips:
+            result.append(f"  {str(t)}")
+        return "\n".join(result)
+
+    def add_trip(self, trip: Trip) -> None:
         trip.finalize()
         self.trips.append(trip)
 
-    def add_back_result(self, back: "FlightSearchResult"):
-        if self.trips:
-            if not back.trips:
-                # no valid back trips
-                self.trips.clear()
-                return
+    def extend_trips(self, trips: Iterable[Trip], max_results: int = 0) -> None:
+        """Add trips - the result is truncated once it has ``max_results`` trips.
+
+        Trips are consumed lazily, therefore no more than ``max_results`` (plus
+        one which detects truncation) trips are held.
+
+        """
+        if max_results:
+            trips = itertools.islice(trips, max(max_results - len(self.trips), 0) + 1)
+        self.trips.extend(trips)
+        if max_results and len(self.trips) > max_results:
+            del self.trips[max_results:]
+            self.truncated = True
+
+    def add_back_result(
+        self, back: "FlightSearchResult", top_k: int = 0, max_results: int = 0
+    ):
+        """Compose return trips from these ("there") trips and back trips.
+
+        Parameters
+        ----------
+        back : FlightSearchResult
+          Back trips search result.
+        top_k : int
+          Optional number of the cheapest return trips to compose - ordered by
+          total price (all return trips are composed otherwise).
+        max_results : int
+          Optional maximum number of return trips (result is truncated).
+
+        """
+        if self.trips:
+            if not back.trips:
+                # no valid back trips
+                self.trips.clear()
+                return
+
+            there_trips: List[Trip] = self.trips
+            self.trips = []
+            if top_k:
+                there_trips.sort(key=lambda t: t.total_price)
+                self.extend_trips(
+                    itertools.islice(
+                        FlightSearchResult.pair_return_trips(
+                            there_trips, back.trips, cheapest_first=True
+                        ),
+                        top_k,
+                    ),
+                    max_results,
+                )
+            else:
+                self.extend_trips(
+                    FlightSearchResult.pair_return_trips(there_trips, back.trips),
+                    max_results,
+                )
+
+    @staticmethod
+    def pair_return_trips(
+        there_trips: Iterable[Trip],
+        back_trips: List[Trip],
+        cheapest_first: bool = False,
+    ) -> Iterator[Trip]:
+        """Lazily yield return trips composed of "there" and back trips.
+
+        Only pairs which are yielded are joined (copied) to return trips. If
+        ``OPT_TIME_ORDERED_RETURN_TRIP`` is set, back trips are sorted by
+        departure and back trips departing after the "there" trip arrival are
+        found using binary search.
+
+        Parameters
+        ----------
+        there_trips : Iterable[Trip]
+          "There" trips - they must be ordered by total price if
+          ``cheapest_first`` is set, they can be a (lazy) iterator.
+        back_trips : List[Trip]
+          Back trips.
+        cheapest_first : bool
+          Yield return trips ordered by total price - pairs are merged using a
+          heap which holds at most one pair per "there" trip.
+
+        """
+        if not back_trips:
+            return
+
+        if cheapest_first:
+            yield from FlightSearchResult._pair_cheapest_return_trips(
+                iter(there_trips), sorted(back_trips, key=lambda t: t.total_price)
+            )
+            return
+
+        if OPT_TIME_ORDERED_RETURN_TRIP:
+            back_trips = sorted(back_trips, key=Trip.departure)
+            departures = [t.departure() for t in back_trips]
+            for there in there_trips:
+                lo = bisect.bisect_right(departures, there.arrival())
+                for back in itertools.islice(back_trips, lo, None):
+                    yield there.join(back)
+        else:
+            # cartesian product 8-/
+            for there in there_trips:
+                for back in back_trips:
+                    yield there.join(back)
+
+    @staticmethod
+    def _pair_cheapest_return_trips(
+        there_trips: Iterator[Trip], back_trips: List[Trip]
+    ) -> Iterator[Trip]:
+        """Yield return trips ordered by price (heap merge of sorted pairs).
+
+        Each "there" trip has a stream of (valid) back trips ordered by price.
+        The heap holds the next pair of each activated "there" trip. The next
+        "there" trip is activated only once its price plus the cheapest back trip
+        price is not more than the price of the cheapest pair in the heap.
+
+        """
+
+        def back_trips_of(there: Trip) -> Iterator[Trip]:
+            if OPT_TIME_ORDERED_RETURN_TRIP:
+                arrival = there.arrival()
+                return (t for t in back_trips if t.departure() > arrival)
+            return iter(back_trips)
+
+        sequence = itertools.count()
+        pairs: list = []
+
+        def push(there: Trip, backs: Iterator[Trip]) -> None:
+            back = next(backs, None)
+            if back is not None:
+                heapq.heappush(
+                    pairs,
+                    (
+                        there.total_price + back.total_price,
+                        next(sequence),
+                        there,
+                        back,
+                        backs,
+                    ),
+                )
+
+        cheapest_back_price = back_trips[0].total_price
+        next_there: Optional[Trip] = next(there_trips, None)
+        while pairs or next_there is not None:
+            while next_there is not None and (
+                not pairs or next_there.total_price + cheapest_back_price <= pairs[0][0]
+            ):
+                push(next_there, back_trips_of(next_there))
+                next_there = next(there_trips, None)
+            if not pairs:
+                continue
+            _, _, there, back, backs = heapq.heappop(pairs)
+            yield there.join(back)
+            push(there, backs)
+
+    def sort(self):
+        self.trips.sort(key=lambda t: t.total_price)
+
+    @staticmethod
+    def pareto_front(trips: Iterable[Trip]) -> List[Trip]:
+        """Get trips not dominated in total price and travel time (by price).
+
+        Trip is dominated by another trip which is neither more expensive nor
+        longer and is cheaper or shorter - travel time of return trip is of
+        both "there" and back trip (``Trip.duration_secs``). Trips of the same
+        price and travel time are represented by the first one.
+
+        """
+        front: List[Trip] = []
+        for trip in sorted(trips, key=lambda t: (t.total_price, t.duration_secs)):
+            if not front or trip.duration_secs < front[-1].duration_secs:
+                front.append(trip)
+        return front
+
+    def to_dict(self) -> List:
+        return [t.to_dict() for t in self.trips]
+
+    def to_json(self, compact: bool = False, flight_refs: bool = False) -> str:
+        out = io.StringIO()
+        FlightSearchResult.write_json(self.trips, out, compact, flight_refs)
+        return out.getvalue()
+
+    @staticmethod
+    def write_json(
+        trips: Iterable[Trip],
+        out: TextIO = sys.stdout,
+        compact: bool = False,
+        flight_refs: bool = False,
+    ) -> int:
+        """Write trips as JSON array - one trip at a time.
+
+        Parameters
+        ----------
+        trips : Iterable[Trip]
+          Finalized trips.
+        out : TextIO
+          Output file object.
+        compact : bool
+          Non-indented JSON without whitespace (pretty printed by default).
+        flight_refs : bool
+          Write ``{"trips": [...], "flights": {...}}`` object instead of the
+          array - trips reference flights by id, every flight is written once.
+
+        Returns
+        -------
+        int
+          Number of written trips.
+
+        """
+        encoder = TripJsonEncoder(
+            indent=None if compact else 4, compact=compact, flight_refs=flight_refs
+        )
+        # trips are written to the "trips" array of the object with flight refs
+        level: int = 0
+        if flight_refs:
+            level = 1
+            out.write(f'{{{encoder.newline(1)}"trips"{encoder.key_separator}')
+        flights: Set[int] = set()
+        count: int = 0
+        out.write("[")
+        for trip in trips:
+            if count:
+                out.write(encoder.item_separator)
+            out.write(encoder.newline(level + 1))
+            out.write(encoder.encode(trip, level + 1))
+            if flight_refs:
+                flights.update(trip.flights)
+            count += 1
+        out.write(f"{encoder.newline(level)}]" if count else "]")
+        if flight_refs:
+            out.write(
+                f"{encoder.item_separator}{encoder.newline(1)}"
+                f'"flights"{encoder.key_separator}'
+            )
+            out.write(
+                encoder.encode_fields(
+                    [(str(f), encoder.encode_flight(f, 2)) for f in sorted(flights)],
+                    1,
+                )
+            )
+            out.write(f"{encoder.newline(0)}}}")
+        return count
+
+    @staticmethod
+    def write_ndjson(trips: Iterable[Trip], out: TextIO = sys.stdout) -> int:
+        """Write trips as newline delimited JSON (one trip per line).
+
+        Trips are written (and flushed) as they come, therefore consumers can
+        process first trips while the search is still running.
+
+        Returns
+        -------
+        int
+          Number of written trips.
+
+        """
+        encoder = TripJsonEncoder()
+        count: int = 0
+        for trip in trips:
+            out.write(encoder.encode(trip))
+            out.write("\n")
+            out.flush()
+            count += 1
+        return count
+
+
+class SubRouteCache:
+    """LRU cache of sub-routes reaching a destination from a search state.
+
+    Search state is (dataset version, destination, stop, arrival time bucket,
+    bags count, remaining flights, layover window) - entry holds all simple
+    sub-routes from the stop to the destination departing within the layover
+    window of any arrival in the bucket. Sub-routes are ``(departure, flights,
+    price, stops)`` tuples ordered by departure, so that sub-routes of an exact
+    arrival are found using binary search. Memory is bound by the approximate
+    size of entries - least recently used entries are evicted.
+
+    """
+
+    # approximate memory (bytes) of an entry, sub-route and sub-route flight
+    ENTRY_BYTES = 256
+    SUB_ROUTE_BYTES = 320
+    FLIGHT_BYTES = 72
+
+    def __init__(self, max_bytes: int = 256 * 2**20, bucket_secs: int = 900):
+        """Create sub-route cache instance.
+
+        Parameters
+        ----------
+        max_bytes : int
+          Approximate memory bound of cached sub-routes.
+        bucket_secs : int
+          Arrival time bucket size - bigger buckets increase hit ratio, but
+          also the number of sub-routes found (and filtered) per entry.
+
+        """
+        if max_bytes <= 0 or bucket_secs <= 0:
+            raise ValueError(
+                f"Cache size ({max_bytes}) and bucket ({bucket_secs}) must be "
+                f"positive numbers"
+            )
+        self.max_bytes: int = max_bytes
+        self.bucket_secs: int = bucket_secs
+        self.entries: collections.OrderedDict = collections.OrderedDict()
+        self.bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        # cache is shared by threads searching the oracle (server)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: tuple) -> Optional[List[tuple]]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: tuple, sub_routes: List[tuple]) -> None:
+        size = SubRouteCache.ENTRY_BYTES + sum(
+            SubRouteCache.SUB_ROUTE_BYTES + SubRouteCache.FLIGHT_BYTES * len(r[1])
+            for r in sub_routes
+        )
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                # put by another thread which missed the entry concurrently
+                self.bytes -= previous[1]
+            self.entries[key] = (sub_routes, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ReachabilityIndex:
+    """Lower bounds of reaching the destination from airports (pruning).
+
+    For every airport (id) the index holds the minimum number of flights to
+    the destination, the latest departure of a flight from the airport which
+    still reaches the destination and the minimum price to the destination -
+    using flights which allow the bags count. Bounds ignore the maximum
+    layover and airports visited by a trip, therefore a partial trip which
+    reaches the destination is never pruned.
+
+    """
+
+    UNREACHABLE_HOPS = 2**31 - 1
+    UNREACHABLE_DEPARTURE = -(2**63)
+    # tolerance of (differently ordered) price sums
+    PRICE_TOLERANCE = 1e-6
+
+    def __init__(
+        self,
+        dataset: FlightDataset,
+        destination: Union[int, FrozenSet[int]],
+        bags_count: int,
+        min_layover_secs: int,
+    ):
+        """Build reachability index of the destination.
+
+        Parameters
+        ----------
+        dataset : FlightDataset
+          Loaded flight dataset.
+        destination : Union[int, FrozenSet[int]]
+          Destination airport id or ids (bounds of reaching any of them).
+        bags_count : int
+          Number of bags - flights which don't allow them are not used.
+        min_layover_secs : int
+          Minimum layover (seconds) between flights.
+
+        """
+        self.dataset: FlightDataset = dataset
+        self.destinations: FrozenSet[int] = (
+            frozenset((destination,))
+            if isinstance(destination, int)
+            else frozenset(destination)
+        )
+        self.bags_count: int = bags_count
+        self.min_layover_secs: int = max(min_layover_secs, 1)
+        airports_count = len(dataset.airports)
+        self.hops: array.array = (
+            array.array("i", [ReachabilityIndex.UNREACHABLE_HOPS]) * airports_count
+        )
+        self.latest_departure: array.array = (
+            array.array("q", [ReachabilityIndex.UNREACHABLE_DEPARTURE]) * airports_count
+        )
+        self.min_price: array.array = array.array("d", [math.inf]) * airports_count
+        self._vectorized: Optional[tuple] = None
+        self._init_hops()
+        self._init_min_price()
+        self._init_latest_departure()
+
+    def _flights_to(self, airport: int, latest: Optional[int] = None) -> Iterator[int]:
+        """Get flights to the airport which allow bags (except from destinations)."""
+        dataset: FlightDataset = self.dataset
+        for flight in dataset.flights_to(airport, latest=latest):
+            if (
+                dataset.bags_allowed[flight] >= self.bags_count
+                and dataset.origin[flight] not in self.destinations
+            ):
+                yield flight
+
+    def _init_hops(self) -> None:
+        """Breadth first search from the destination over reverse edges."""
+        hops = self.hops
+        for destination in self.destinations:
+            hops[destination] = 0
+        airports = collections.deque(self.destinations)
+        while airports:
+            airport = airports.popleft()
+            for flight in self._flights_to(airport):
+                stop = self.dataset.origin[flight]
+                if hops[stop] == ReachabilityIndex.UNREACHABLE_HOPS:
+                    hops[stop] = hops[airport] + 1
+                    airports.append(stop)
+
+    def _init_min_price(self) -> None:
+        """Dijkstra's shortest (cheapest) paths to the destination."""
+        dataset: FlightDataset = self.dataset
+        min_price = self.min_price
+        for destination in self.destinations:
+            min_price[destination] = 0.0
+        heap: List[tuple] = [(0.0, destination) for destination in self.destinations]
+        heapq.heapify(heap)
+        while heap:
+            price, airport = heapq.heappop(heap)
+            if price > min_price[airport]:
+                continue
+            for flight in self._flights_to(airport):
+                stop = dataset.origin[flight]
+                stop_price = (
+                    price
+                    + dataset.base_price[flight]
+                    + float(self.bags_count) * dataset.bag_price[flight]
+                )
+                if stop_price < min_price[stop]:
+                    min_price[stop] = stop_price
+                    heapq.heappush(heap, (stop_price, stop))
+
+    def _init_latest_departure(self) -> None:
+        """Dijkstra's latest departures - airports settled latest first.
+
+        Flight to an airport reaches the destination if it is the destination
+        or flight arrives at least minimum layover before the airport's latest
+        departure. Flights to an airport are sorted by arrival, therefore only
+        the prefix of flights arriving early enough is scanned.
+
+        """
+        dataset: FlightDataset = self.dataset
+        latest_departure = self.latest_departure
+        heap: List[tuple] = []
+        for destination in self.destinations:
+            for flight in self._flights_to(destination):
+                stop = dataset.origin[flight]
+                if dataset.departure[flight] > latest_departure[stop]:
+                    latest_departure[stop] = dataset.departure[flight]
+        for stop, departure in enumerate(latest_departure):
+            if departure != ReachabilityIndex.UNREACHABLE_DEPARTURE:
+                heap.append((-departure, stop))
+        heapq.heapify(heap)
+        settled: set = set()
+        while heap:
+            departure, airport = heapq.heappop(heap)
+            if airport in settled:
+                continue
+            settled.add(airport)
+            for flight in self._flights_to(
+                airport, latest=-departure - self.min_layover_secs
+            ):
+                stop = dataset.origin[flight]
+                if dataset.departure[flight] > latest_departure[stop]:
+                    latest_departure[stop] = dataset.departure[flight]
+                    heapq.heappush(heap, (-dataset.departure[flight], stop))
+
+    def prune(
+        self, flight: int, flights_count: int, price: float, max_flights: int, max_price
+    ) -> Optional[str]:
+        """Get reason why trip with the flight can't reach the destination.
+
+        Parameters
+        ----------
+        flight : int
+          Last flight of the (partial) trip.
+        flights_count : int
+          Number of trip flights (including the last flight).
+        price : float
+          Total price of the trip (including the last flight).
+        max_flights : int
+          Maximum number of trip flights (0 stands for unlimited).
+        max_price : float
+          Maximum price of the trip (0 stands for unlimited).
+
+        Returns
+        -------
+        One of ``FlightSearchStats.PRUNED_*`` reasons or ``None`` if the trip
+        may reach the destination.
+
+        """
+        dataset: FlightDataset = self.dataset
+        stop = dataset.destination[flight]
+        if stop in self.destinations:
+            return None
+        if max_flights and flights_count + self.hops[stop] > max_flights:
+            return FlightSearchStats.PRUNED_HOPS
+        if (
+            self.latest_departure[stop]
+            < dataset.arrival[flight] + self.min_layover_secs
+        ):
+            return FlightSearchStats.PRUNED_TIME
+        if (
+            max_price
+            and price + self.min_price[stop]
+            > max_price + ReachabilityIndex.PRICE_TOLERANCE
+        ):
+            return FlightSearchStats.PRUNED_PRICE
+        return None
+
+    def prune_vectorized(
+        self,
+        stops,
+        arrivals,
+        flights_count: int,
+        prices,
+        max_flights: int,
+        max_price,
+        stats: Optional[FlightSearchStats] = None,
+    ):
+        """Get mask of flights (NumPy arrays) which may reach the destination.
+
+        Vectorized ``prune()`` of flights arriving to ``stops`` at ``arrivals``
+        with trip ``prices``, pruned flights are counted by optional ``stats``.
+
+        """
+        if self._vectorized is None:
+            self._vectorized = (
+                numpy.frombuffer(self.hops, dtype=numpy.int32),
+                numpy.frombuffer(self.latest_departure, dtype=numpy.int64),
+                numpy.frombuffer(self.min_price, dtype=numpy.float64),
+            )
+        hops, latest_departure, min_price = self._vectorized
+        keep = numpy.zeros(len(stops), dtype=bool)
+        for destination in self.destinations:
+            keep |= stops == destination
+        reasons = [
+            (
+                FlightSearchStats.PRUNED_HOPS,
+                # hops compared without int32 overflow of unreachable airports
+                hops[stops] <= max_flights - flights_count if max_flights else None,
+            ),
+            (
+                FlightSearchStats.PRUNED_TIME,
+                latest_departure[stops] >= arrivals + self.min_layover_secs,
+            ),
+            (
+                FlightSearchStats.PRUNED_PRICE,
+                (
+                    prices + min_price[stops]
+                    <= max_price + ReachabilityIndex.PRICE_TOLERANCE
+                    if max_price
+                    else None
+                ),
+            ),
+        ]
+        reachable = ~keep
+        for reason, bound in reasons:
+            if bound is None:
+                continue
+            if stats is not None:
+                stats.pruned[reason] += int(numpy.count_nonzero(reachable & ~bound))
+            reachable &= bound
+        return keep | reachable
+
+
+class FlightOracle:
+    """Flight search engine."""
+
+    # maximum number of cached reachability indices (destination, bags, layover)
+    REACHABILITY_CACHE_SIZE = 64
+    # minimum number of candidate flights checked by NumPy (vectorized engine),
+    # fewer flights are checked one by one - NumPy call overhead dominates
+    VECTORIZED_MIN_FLIGHTS = 32
+    # expanded partial trips (or paired return trips) between yields to the event
+    # loop by asynchronous search
+    ASYNC_YIELD_EVERY = 200
+
+    def __init__(self, dataset: FlightDataset, cache: Optional[SubRouteCache] = None):
+        """Create flight oracle instance.
+
+        Parameters
+        ----------
+        dataset : FlightDataset
+          Loaded flight dataset.
+        cache : SubRouteCache
+          Optional cache of sub-routes shared by (breadth first) searches.
+
+        """
+        self.dataset: FlightDataset = dataset
+        self.cache: Optional[SubRouteCache] = cache
+        self._reachability: collections.OrderedDict = collections.OrderedDict()
+        # LRU caches are shared by threads searching the oracle (server)
+        self._reachability_lock = threading.Lock()
+        self._snapshot_oracle: Optional[FlightOracle] = None
+        # NumPy columns of flights by origin airport (vectorized engine)
+        self._vectorized_columns: Dict[int, tuple] = {}
+        self._vectorized_version: int = dataset.version
+
+    @staticmethod
+    def _is_flight_admissible(
+        dataset: FlightDataset,
+        flight: int,
+        trip: Trip,
+        min_layover_hours: int,
+        max_layover_hours: int,
+        max_price: float,
+        max_stops: int,
+        reachability: Optional[ReachabilityIndex] = None,
+        stats: Optional[FlightSearchStats] = None,
+    ):
+        if trip.visits(dataset.destination[flight]):
+            if stats is not None:
+                stats.rejected[FlightSearchStats.REJECTED_CYCLE] += 1
+            return False
+        if trip.bags_count > dataset.bags_allowed[flight]:
+            if stats is not None:
+                stats.rejected[FlightSearchStats.REJECTED_BAGS] += 1
+            return False
+        # layover
+        if trip.length:
+            layover = dataset.departure[flight] - dataset.arrival[trip.flight]
+            if layover <= 0 or not (
+                min_layover_hours * 3600 <= layover <= max_layover_hours * 3600
+            ):
+                if stats is not None:
+                    stats.rejected[FlightSearchStats.REJECTED_LAYOVER] += 1
+                return False
+        # extra
+        if max_price and max_price < (
+            trip.total_price
+            + dataset.base_price[flight]
+            + float(trip.bags_count) * dataset.bag_price[flight]
+        ):
+            if stats is not None:
+                stats.rejected[FlightSearchStats.REJECTED_PRICE] += 1
+            return False
+        # max stops
+        if max_stops and max_stops < trip.length:
+            if stats is not None:
+                stats.rejected[FlightSearchStats.REJECTED_STOPS] += 1
+            return False
+        # destination reachability (bounds of the rest of the trip)
+        if reachability is not None:
+            reason = reachability.prune(
+                flight,
+                trip.length + 1,
+                trip.total_price
+                + dataset.base_price[flight]
+                + float(trip.bags_count) * dataset.bag_price[flight],
+                max_stops + 1 if max_stops else 0,
+                max_price,
+            )
+            if reason is not None:
+                if stats is not None:
+                    stats.pruned[reason] += 1
+                return False
+
+        return True
+
+    def _vectorized_flights_from(self, airport: int) -> tuple:
+        """Get (cached) NumPy columns of flights departing from the airport.
+
+        Columns are ordered by departure: flights, departures, arrivals,
+        destinations, bags allowed, base prices and bag prices.
+
+        """
+        dataset: FlightDataset = self.dataset
+        if self._vectorized_version != dataset.version:
+            self._vectorized_columns.clear()
+            self._vectorized_version = dataset.version
+        columns: Optional[tuple] = self._vectorized_columns.get(airport)
+        if columns is None:
+            flights = dataset.flights_from(airport)
+            count = len(flights)
+            columns = (
+                numpy.array(flights, dtype=numpy.int64),
+                numpy.fromiter(
+                    (dataset.departure[f] for f in flights), numpy.int64, count
+                ),
+                numpy.fromiter(
+                    (dataset.arrival[f] for f in flights), numpy.int64, count
+                ),
+                numpy.fromiter(
+                    (dataset.destination[f] for f in flights), numpy.int64, count
+                ),
+                numpy.fromiter(
+                    (dataset.bags_allowed[f] for f in flights), numpy.int64, count
+                ),
+                numpy.fromiter(
+                    (dataset.base_price[f] for f in flights), numpy.float64, count
+                ),
+                numpy.fromiter(
+                    (dataset.bag_price[f] for f in flights), numpy.float64, count
+                ),
+            )
+            self._vectorized_columns[airport] = columns
+        return columns
+
+    def _admissible_flights_vectorized(
+        self,
+        query: FlightQuery,
+        trip: Trip,
+        earliest: Optional[int],
+        latest: Optional[int],
+        reachability: Optional[ReachabilityIndex] = None,
+        stats: Optional[FlightSearchStats] = None,
+    ) -> List[int]:
+        """Get admissible flights continuing the trip within the departure window.
+
+        Vectorized ``_is_flight_admissible()`` of all flights from the trip stop
+        - visited airports, bags, price and destination reachability are checked
+        by NumPy array operations over the flights columns (layover by the
+        departure window).
+
+        """
+        (
+            flights,
+            departures,
+            arrivals,
+            destinations,
+            bags_allowed,
+            base_prices,
+            bag_prices,
+        ) = self._vectorized_flights_from(trip.stop)
+        lo = 0 if earliest is None else int(numpy.searchsorted(departures, earliest))
+        hi = (
+            len(departures)
+            if latest is None
+            else int(numpy.searchsorted(departures, latest, side="right"))
+        )
+        if lo >= hi:
+            return []
+
+        # checks in the order of _is_flight_admissible() (rejection stats)
+        stops = destinations[lo:hi]
+        admissible = numpy.ones(hi - lo, dtype=bool)
+        for airport in trip.visited():
+            admissible &= stops != airport
+        if stats is not None:
+            stats.rejected[FlightSearchStats.REJECTED_CYCLE] += int(
+                hi - lo - numpy.count_nonzero(admissible)
+            )
+        bags = bags_allowed[lo:hi] >= trip.bags_count
+        if stats is not None:
+            stats.rejected[FlightSearchStats.REJECTED_BAGS] += int(
+                numpy.count_nonzero(admissible & ~bags)
+            )
+        admissible &= bags
+        prices = (
+            trip.total_price
+            + base_prices[lo:hi]
+            + float(trip.bags_count) * bag_prices[lo:hi]
+        )
+        if query.max_price:
+            price = prices <= query.max_price
+            if stats is not None:
+                stats.rejected[FlightSearchStats.REJECTED_PRICE] += int(
+                    numpy.count_nonzero(admissible & ~price)
+                )
+            admissible &= price
+        if query.max_stops and query.max_stops < trip.length:
+            if stats is not None:
+                stats.rejected[FlightSearchStats.REJECTED_STOPS] += int(
+                    numpy.count_nonzero(admissible)
+                )
+            return []
+
+        # destination reachability (bounds of the rest of the trip)
+        if reachability is not None:
+            indices = numpy.flatnonzero(admissible)
+            reachable = reachability.prune_vectorized(
+                stops[indices],
+                arrivals[lo:hi][indices],
+                trip.length + 1,
+                prices[indices],
+                query.max_stops + 1 if query.max_stops else 0,
+                query.max_price,
+                stats=stats,
+            )
+            return flights[lo:hi][indices[reachable]].tolist()
+        return flights[lo:hi][admissible].tolist()
+
+    def _reachability_index(
+        self, destination: int, bags_count: int, min_layover_secs: int
+    ) -> ReachabilityIndex:
+        """Get (cached) reachability index of the destination.
+
+        Index is built outside the lock - threads which miss the same index
+        concurrently may build it twice, the first one is cached.
+
+        """
+        key = (destination, bags_count, min_layover_secs)
+        with self._reachability_lock:
+            reachability = self._reachability.get(key)
+            if reachability is not None:
+                self._reachability.move_to_end(key)
+                return reachability
+        reachability = ReachabilityIndex(
+            self.dataset, destination, bags_count, min_layover_secs
+        )
+        with self._reachability_lock:
+            cached = self._reachability.setdefault(key, reachability)
+            if len(self._reachability) > FlightOracle.REACHABILITY_CACHE_SIZE:
+                self._reachability.popitem(last=False)
+        return cached
+
+    def _cheapest_fare_to(self, destination: int, bags_count: int) -> float:
+        """Get the cheapest fare of a flight to the destination (inf if none).
+
+        Any partial trip which didn't reach the destination yet must take one
+        of these flights, therefore the fare is a lower bound of the price
+        remaining to the destination (admissible A* heuristic).
+
+        """
+        dataset: FlightDataset = self.dataset
+        fares = [
+            dataset.base_price[f] + float(bags_count) * dataset.bag_price[f]
+            for f in dataset.dg_edges_by_dst.get(destination, ())
+            if dataset.bags_allowed[f] >= bags_count
+        ]
+        return min(fares, default=math.inf)
+
+    def _iter_one_way_flights(
+        self,
+        query: FlightQuery,
+        cheapest_first: bool = False,
+        stats: Optional[FlightSearchStats] = None,
+        yield_every: int = 0,
+        limits: Optional[FlightSearchLimits] = None,
+    ) -> Iterator[Optional[Trip]]:
+        """Yield finalized one way trips as they are found.
+
+        Partial trips are expanded in breadth first (FIFO) order by default. If
+        ``cheapest_first`` is set, then partial trips are expanded best first
+        (priority queue) by total price plus the lower bound of the remaining
+        price - as prices are non-negative, trips are yielded ordered by total
+        price and the first K trips are the K cheapest ones. Partial trips which
+        can't reach the destination are pruned (``OPT_REACHABILITY_PRUNING``)
+        and counted by optional ``stats``.
+
+        If ``yield_every`` is set, then ``None`` is yielded every ``yield_every``
+        expanded partial trips - cooperative search checks its budget. Sub-route
+        cache isn't used then (memoized search has no yield points), bidirectional
+        engine yields trips only.
+
+        Once optional ``limits`` (frontier size or memory) are exceeded, the queue
+        is dropped and the search either stops (``limits.truncated`` is set) or
+        continues by iterative deepening depth first search from the length of
+        the expanded partial trip - trips of the length which were already
+        yielded are skipped. Best first search is always truncated - iterative
+        deepening doesn't find trips ordered by price.
+
+        """
+        if query.pareto:
+            yield from self._iter_one_way_flights_pareto(query, stats, yield_every)
+            return
+        if not cheapest_first:
+            engine_trips: Optional[Iterator[Trip]] = None
+            if query.engine == FlightQuery.ENGINE_DFS:
+                yield from self._iter_one_way_flights_dfs(
+                    query, stats=stats, yield_every=yield_every, limits=limits
+                )
+                return
+            if query.engine == FlightQuery.ENGINE_BIDIRECTIONAL:
+                engine_trips = self._iter_one_way_flights_bidirectional(query)
+            elif (
+                query.engine == FlightQuery.ENGINE_BFS
+                and self.cache is not None
+                and not yield_every
+            ):
+                engine_trips = self._iter_one_way_flights_memoized(query)
+            if engine_trips is not None:
+                # alternative engines count found trips only
+                for trip in engine_trips:
+                    if stats is not None:
+                        stats.found += 1
+                    yield trip
+                return
+
+        dataset: FlightDataset = self.dataset
+        destination: int = dataset.airport_id(query.destination)
+        min_layover_secs: int = query.min_layover_hours * 3600
+        max_layover_secs: int = query.max_layover_hours * 3600
+        departure_window = query.departure_window()
+        # pure Python admissibility checks if NumPy is not installed
+        vectorized: bool = (
+            query.engine == FlightQuery.ENGINE_VECTORIZED and numpy is not None
+        )
+        reachability: Optional[ReachabilityIndex] = (
+            self._reachability_index(destination, query.bags_count, min_layover_secs)
+            if OPT_REACHABILITY_PRUNING
+            else None
+        )
+        origin_trip = Trip(
+            dataset=dataset,
+            origin=query.origin,
+            destination=query.destination,
+            bags_count=query.bags_count,
+        )
+        if cheapest_first:
+            remaining_price = self._cheapest_fare_to(destination, query.bags_count)
+            if math.isinf(remaining_price):
+                return
+            sequence = itertools.count()
+            trips: list = [(remaining_price, next(sequence), origin_trip)]
+
+            def pop() -> Trip:
+                return heapq.heappop(trips)[2]
+
+            def push(t: Trip) -> None:
+                priority = t.total_price
+                if t.stop != destination:
+                    priority += remaining_price
+                    if query.max_price and priority > query.max_price:
+                        return
+                heapq.heappush(trips, (priority, next(sequence), t))
+
+        else:
+            trips = collections.deque([origin_trip])
+            pop = trips.popleft
+            push = trips.append
+
+        expanded: int = 0
+        deepen: bool = limits is not None and limits.iddfs and not cheapest_first
+        # flights of found trips of the (last) found length - skipped once deepened
+        found_length: int = 0
+        found_flights: Set[tuple] = set()
+        while trips:
+            trip: Trip = pop()
+            current_stop = trip.stop
+            if destination == current_stop:
+                trip.release()
+                if stats is not None:
+                    stats.found += 1
+                if limits is not None:
+                    limits.found += 1
+                    if deepen:
+                        if found_length != trip.length:
+                            found_length = trip.length
+                            found_flights = set()
+                        found_flights.add(tuple(trip.flights))
+                yield trip
+                # destination can't be visited again - no need to expand it
+                continue
+            if stats is not None:
+                stats.expanded += 1
+
+            # schedule next stops from the current stop: only flights departing
+            # within the layover window after the arrival are candidates
+            if trip.length:
+                arrival = dataset.arrival[trip.flight]
+                window = (
+                    arrival + max(min_layover_secs, 1),
+                    arrival + max_layover_secs,
+                )
+            else:
+                window = departure_window
+            flights = self._flights_within(trip, window, stats)
+            if vectorized and len(flights) >= FlightOracle.VECTORIZED_MIN_FLIGHTS:
+                for flight in self._admissible_flights_vectorized(
+                    query, trip, *window, reachability=reachability, stats=stats
+                ):
+                    push(trip.extend(flight))
+            else:
+                for flight in flights:
+                    if FlightOracle._is_flight_admissible(
+                        dataset=dataset,
+                        flight=flight,
+                        trip=trip,
+                        min_layover_hours=query.min_layover_hours,
+                        max_layover_hours=query.max_layover_hours,
+                        max_price=query.max_price,
+                        max_stops=query.max_stops,
+                        reachability=reachability,
+                        stats=stats,
+                    ):
+                        push(trip.extend(flight))
+            if stats is not None:
+                stats.update_peak(len(trips), expanded)
+            if limits is not None and limits.is_exceeded(len(trips), expanded):
+                trips.clear()
+                if deepen:
+                    yield from self._iter_one_way_flights_iddfs(
+                        query,
+                        max(trip.length, 1),
+                        found_flights if found_length == trip.length else set(),
+                        stats,
+                        yield_every,
+                        limits,
+                    )
+                else:
+                    limits.truncated = True
+                    if stats is not None:
+                        stats.truncated += 1
+                return
+            expanded += 1
+            if yield_every and not expanded % yield_every:
+                yield None
+
+    def _flights_within(
+        self,
+        trip: Union[Trip, TripPath],
+        window: Tuple[Optional[int], Optional[int]],
+        stats: Optional[FlightSearchStats],
+    ) -> Sequence[int]:
+        """Get flights from the trip stop departing within the window.
+
+        Flights outside the layover window are skipped by binary search instead
+        of being checked - stats count them as layover rejections (the window of
+        the origin is departure window, not layover).
+
+        """
+        dataset: FlightDataset = self.dataset
+        flights = dataset.flights_from(trip.stop, *window)
+        if stats is not None and trip.length:
+            stats.rejected[FlightSearchStats.REJECTED_LAYOVER] += len(
+                dataset.flights_from(trip.stop)
+            ) - len(flights)
+        return flights
+
+    def _next_flights(
+        self,
+        query: FlightQuery,
+        trip: Union[Trip, TripPath],
+        reachability: Optional[ReachabilityIndex],
+        stats: Optional[FlightSearchStats],
+    ) -> Iterator[int]:
+        """Lazily yield admissible flights continuing the (partial) trip or path."""
+        dataset: FlightDataset = self.dataset
+        if trip.length:
+            arrival = dataset.arrival[trip.flight]
+            window = (
+                arrival + max(query.min_layover_hours * 3600, 1),
+                arrival + query.max_layover_hours * 3600,
+            )
+        else:
+            window = query.departure_window()
+        for flight in self._flights_within(trip, window, stats):
+            if FlightOracle._is_flight_admissible(
+                dataset=dataset,
+                flight=flight,
+                trip=trip,
+                min_layover_hours=query.min_layover_hours,
+                max_layover_hours=query.max_layover_hours,
+                max_price=query.max_price,
+                max_stops=query.max_stops,
+                reachability=reachability,
+                stats=stats,
+            ):
+                yield flight
+
+    def _iter_one_way_flights_dfs(
+        self,
+        query: FlightQuery,
+        length: int = 0,
+        skip: Optional[Set[tuple]] = None,
+        stats: Optional[FlightSearchStats] = None,
+        yield_every: int = 0,
+        limits: Optional[FlightSearchLimits] = None,
+    ) -> Generator[Optional[Trip], None, bool]:
+        """Yield one way trips by depth first search with backtracking.
+
+        A single mutable path (``TripPath``) is extended and shortened in place
+        and only the lazy iterators of admissible flights of its prefixes are
+        held, therefore memory is O(depth) instead of O(frontier) - trip is
+        created only when the destination is reached. Trips are the same as
+        found by breadth first search, but in depth first order.
+
+        Parameters
+        ----------
+        query : FlightQuery
+          Flight search query.
+        length : int
+          Optional depth limit: yield only trips with exactly ``length`` flights
+          and don't extend partial trips of the length.
+        skip : Set[tuple]
+          Optional flights of trips not to yield.
+        stats : FlightSearchStats
+          Optional search counters.
+        yield_every : int
+          Yield ``None`` every ``yield_every`` expanded partial trips.
+        limits : FlightSearchLimits
+          Optional limits - search is truncated if found trips exceed memory.
+
+        Returns
+        -------
+        bool
+          Whether the search was cut by the depth limit - there is a partial
+          trip with ``length`` flights which could continue.
+
+        """
+        dataset: FlightDataset = self.dataset
+        destination: int = dataset.airport_id(query.destination)
+        reachability: Optional[ReachabilityIndex] = (
+            self._reachability_index(
+                destination, query.bags_count, query.min_layover_hours * 3600
+            )
+            if OPT_REACHABILITY_PRUNING
+            else None
+        )
+        path = TripPath(
+            dataset=dataset,
+            origin=query.origin,
+            destination=query.destination,
+            bags_count=query.bags_count,
+        )
+        # admissible flights of the path prefixes: stack[i] continues i flights
+        stack: List[Iterator[int]] = [
+            self._next_flights(query, path, reachability, stats)
+        ]
+        deeper: bool = False
+        expanded: int = 0
+        while stack:
+            flight: Optional[int] = next(stack[-1], None)
+            if flight is None:
+                stack.pop()
+                if path.length:
+                    path.pop()
+                continue
+            if dataset.destination[flight] == destination:
+                if not length or path.length + 1 == length:
+                    path.push(flight)
+                    if skip is None or tuple(path.flights) not in skip:
+                        trip: Trip = path.to_trip()
+                        if stats is not None:
+                            stats.found += 1
+                        if limits is not None:
+                            limits.found += 1
+                            # found trips are held, the path is negligible
+                            if limits.is_exceeded(0):
+                                limits.truncated = True
+                                if stats is not None:
+                                    stats.truncated += 1
+                                return False
+                        yield trip
+                    path.pop()
+                continue
+            if path.length + 1 == length:
+                deeper = True
+                continue
+            path.push(flight)
+            if stats is not None:
+                stats.expanded += 1
+                stats.update_peak(len(stack))
+            stack.append(self._next_flights(query, path, reachability, stats))
+            expanded += 1
+            if yield_every and not expanded % yield_every:
+                yield None
+        return deeper
+
+    def _iter_one_way_flights_iddfs(
+        self,
+        query: FlightQuery,
+        min_length: int = 1,
+        skip: Optional[Set[tuple]] = None,
+        stats: Optional[FlightSearchStats] = None,
+        yield_every: int = 0,
+        limits: Optional[FlightSearchLimits] = None,
+    ) -> Iterator[Optional[Trip]]:
+        """Yield one way trips by iterative deepening depth first search.
+
+        Depth limited search (``_iter_one_way_flights_dfs()``) of trips with
+        exactly ``length`` flights is repeated for lengths from ``min_length`` up
+        to the maximum number of flights - or until there is no partial trip of
+        the length. Trips are yielded by length like breadth first search does
+        - shorter trips are searched again instead of held.
+
+        Parameters
+        ----------
+        query : FlightQuery
+          Flight search query.
+        min_length : int
+          Number of flights of the shortest trips to yield.
+        skip : Set[tuple]
+          Optional flights of trips with ``min_length`` flights not to yield.
+        stats : FlightSearchStats
+          Optional search counters.
+        yield_every : int
+          Yield ``None`` every ``yield_every`` expanded partial trips.
+        limits : FlightSearchLimits
+          Optional limits - search is truncated if found trips exceed memory.
+
+        """
+        max_flights: int = query.max_stops + 1 if query.max_stops else 0
+        length: int = min_length
+        while not max_flights or length <= max_flights:
+            deeper: bool = yield from self._iter_one_way_flights_dfs(
+                query,
+                length,
+                skip if length == min_length else None,
+                stats,
+                yield_every,
+                limits,
+            )
+            if not deeper:
+                return
+            length += 1
+
+    def _iter_one_way_flights_pareto(
+        self,
+        query: FlightQuery,
+        stats: Optional[FlightSearchStats] = None,
+        yield_every: int = 0,
+    ) -> Iterator[Optional[Trip]]:
+        """Yield Pareto optimal one way trips (total price vs. travel time).
+
+        Label-setting search: partial trips are expanded in (total price, travel
+        seconds) order, therefore a found trip is Pareto optimal iff it is
+        shorter than the previously found ones - trips are yielded by price.
+        Partial trips are dominated (pruned) if they aren't shorter than the
+        last found trip or if a cheaper partial trip of the same state (stop,
+        arrival) isn't longer, has no more flights and visited a subset of its
+        airports - it can continue with all flights the dominated trip can.
+        ``None`` is yielded every ``yield_every`` expanded partial trips.
+
+        """
+        dataset: FlightDataset = self.dataset
+        destination: int = dataset.airport_id(query.destination)
+        min_layover_secs: int = query.min_layover_hours * 3600
+        max_layover_secs: int = query.max_layover_hours * 3600
+        reachability: Optional[ReachabilityIndex] = (
+            self._reachability_index(destination, query.bags_count, min_layover_secs)
+            if OPT_REACHABILITY_PRUNING
+            else None
+        )
+        origin_trip = Trip(
+            dataset=dataset,
+            origin=query.origin,
+            destination=query.destination,
+            bags_count=query.bags_count,
+        )
+        sequence = itertools.count()
+        # (price, travel secs, sequence, visited airports bitmask, trip)
+        trips: list = [(0.0, 0, next(sequence), 1 << origin_trip.stop, origin_trip)]
+        # non-dominated (travel secs, flights, visited bitmask) by (stop, arrival)
+        labels: Dict[Tuple[int, int], List[Tuple[int, int, int]]] = {}
+        # travel seconds of the last found (cheapest so far) trip
+        best_secs: float = math.inf
+        expanded: int = 0
+
+        while trips:
+            _, _, _, visited, trip = heapq.heappop(trips)
+            if trip.travel_secs >= best_secs:
+                if stats is not None:
+                    stats.pruned[FlightSearchStats.PRUNED_DOMINATED] += 1
+                continue
+            if destination == trip.stop:
+                best_secs = trip.travel_secs
+                trip.release()
+                if stats is not None:
+                    stats.found += 1
+                yield trip
+                continue
+            if trip.length:
+                arrival = dataset.arrival[trip.flight]
+                state_labels = labels.setdefault((trip.stop, arrival), [])
+                if any(
+                    secs <= trip.travel_secs
+                    and length <= trip.length
+                    and not seen & ~visited
+                    for secs, length, seen in state_labels
+                ):
+                    if stats is not None:
+                        stats.pruned[FlightSearchStats.PRUNED_DOMINATED] += 1
+                    continue
+                state_labels.append((trip.travel_secs, trip.length, visited))
+                window = (
+                    arrival + max(min_layover_secs, 1),
+                    arrival + max_layover_secs,
+                )
+            else:
+                window = query.departure_window()
+            if stats is not None:
+                stats.expanded += 1
+
+            for flight in self._flights_within(trip, window, stats):
+                if FlightOracle._is_flight_admissible(
+                    dataset=dataset,
+                    flight=flight,
+                    trip=trip,
+                    min_layover_hours=query.min_layover_hours,
+                    max_layover_hours=query.max_layover_hours,
+                    max_price=query.max_price,
+                    max_stops=query.max_stops,
+                    reachability=reachability,
+                    stats=stats,
+                ):
+                    t: Trip = trip.extend(flight)
+                    if t.travel_secs < best_secs:
+                        heapq.heappush(
+                            trips,
+                            (
+                                t.total_price,
+                                t.travel_secs,
+                                next(sequence),
+                                visited | 1 << t.stop,
+                                t,
+                            ),
+                        )
+            if stats is not None:
+                stats.update_peak(len(trips), expanded)
+            expanded += 1
+            if yield_every and not expanded % yield_every:
+                yield None
+
+    def _iter_one_way_flights_multi(
+        self,
+        query: FlightQuery,
+        top_k: int = 0,
+        cheapest_first: bool = False,
+        stats: Optional[FlightSearchStats] = None,
+    ) -> Iterator[Trip]:
+        """Yield one way trips from any origin to any destination of the query.
+
+        Single traversal from all origins: partial trips reaching a destination
+        are yielded and expanded further - towards other destinations (pruned
+        by reachability of any destination). Trips are the same as trips of
+        separate (origin, destination) queries.
+
+        With ``top_k`` the K cheapest trips of every (origin, destination) are
+        yielded - partial trips are expanded by price and a partial trip is
+        dominated (pruned) if K cheaper partial trips from the same origin with
+        the same (stop, arrival) have no more flights and visited a subset of
+        its airports.
+
+        """
+        dataset: FlightDataset = self.dataset
+        origins: List[int] = [dataset.airport_id(a) for a in query.origins()]
+        anywhere: bool = query.is_anywhere()
+        destinations: FrozenSet[int] = frozenset(
+            dataset.airport_id(a) for a in query.destinations()
+        )
+        min_layover_secs: int = query.min_layover_hours * 3600
+        max_layover_secs: int = query.max_layover_hours * 3600
+        departure_window = query.departure_window()
+        reachability: Optional[ReachabilityIndex] = (
+            self._reachability_index(destinations, query.bags_count, min_layover_secs)
+            if OPT_REACHABILITY_PRUNING and not anywhere
+            else None
+        )
+        # trips found by (origin, destination) and pairs with K trips
+        found: Dict[Tuple[int, int], int] = collections.Counter()
+        pairs: int = sum(1 for o in origins for d in destinations if o != d)
+        completed: int = 0
+        # (flights, visited bitmask) of partial trips by (origin, stop, arrival)
+        labels: Dict[Tuple[int, int, int], List[Tuple[int, int]]] = {}
+
+        # (price, sequence, origin, visited airports bitmask, trip)
+        sequence = itertools.count()
+        entries = [
+            (
+                0.0,
+                next(sequence),
+                origin,
+                1 << origin,
+                Trip(
+                    dataset=dataset,
+                    origin=dataset.airports[origin],
+                    destination="",
+                    bags_count=query.bags_count,
+                ),
+            )
+            for origin in origins
+        ]
+        if top_k or cheapest_first:
+            trips: Any = entries
+            heapq.heapify(trips)
+
+            def pop() -> tuple:
+                return heapq.heappop(trips)
+
+            def push(entry: tuple) -> None:
+                heapq.heappush(trips, entry)
+
+        else:
+            trips = collections.deque(entries)
+            pop = trips.popleft
+            push = trips.append
+
+        while trips:
+            _, _, origin, visited, trip = pop()
+            stop = trip.stop
+            if trip.length and (anywhere or stop in destinations):
+                key = (origin, stop)
+                if not top_k or found[key] < top_k:
+                    found[key] += 1
+                    trip.destination = dataset.airports[stop]
+                    trip.finalize()
+                    if stats is not None:
+                        stats.found += 1
+                    yield trip
+                    if top_k and found[key] == top_k and not anywhere:
+                        completed += 1
+                        if completed == pairs:
+                            return
+            if top_k and trip.length:
+                arrival = dataset.arrival[trip.flight]
+                state_labels = labels.setdefault((origin, stop, arrival), [])
+                dominating = sum(
+                    1
+                    for length, seen in state_labels
+                    if length <= trip.length and not seen & ~visited
+                )
+                if dominating >= top_k:
+                    if stats is not None:
+                        stats.pruned[FlightSearchStats.PRUNED_DOMINATED] += 1
+                    continue
+                state_labels.append((trip.length, visited))
+            if stats is not None:
+                stats.expanded += 1
+
+            if trip.length:
+                arrival = dataset.arrival[trip.flight]
+                window = (
+                    arrival + max(min_layover_secs, 1),
+                    arrival + max_layover_secs,
+                )
+            else:
+                window = departure_window
+            for flight in self._flights_within(trip, window, stats):
+                if FlightOracle._is_flight_admissible(
+                    dataset=dataset,
+                    flight=flight,
+                    trip=trip,
+                    min_layover_hours=query.min_layover_hours,
+                    max_layover_hours=query.max_layover_hours,
+                    max_price=query.max_price,
+                    max_stops=query.max_stops,
+                    reachability=reachability,
+                    stats=stats,
+                ):
+                    t: Trip = trip.extend(flight)
+                    push(
+                        (
+                            t.total_price,
+                            next(sequence),
+                            origin,
+                            visited | 1 << t.stop,
+                            t,
+                        )
+                    )
+            if stats is not None:
+                stats.update_peak(len(trips))
+
+    def _routes_via(
+        self,
+        query: FlightQuery,
+        destination: int,
+        flight: int,
+        remaining: int,
+    ) -> Iterator[tuple]:
+        """Yield routes to the destination starting with the flight.
+
+        Routes are ``(departure, flights, price, stops)`` tuples - simple paths
+        (with at most ``remaining`` flights) admissible for query bags. Stops
+        are airports visited after the flight origin.
+
+        """
+        dataset: FlightDataset = self.dataset
+        if query.bags_count > dataset.bags_allowed[flight]:
+            return
+        departure = dataset.departure[flight]
+        price = (
+            dataset.base_price[flight]
+            + float(query.bags_count) * dataset.bag_price[flight]
+        )
+        stop = dataset.origin[flight]
+        next_stop = dataset.destination[flight]
+        if next_stop == destination:
+            yield departure, (flight,), price, frozenset((next_stop,))
+        elif remaining > 1:
+            for _, flights, sub_price, stops in self._find_sub_routes(
+                query, destination, next_stop, dataset.arrival[flight], remaining - 1
+            ):
+                if stop not in stops:
+                    yield (
+                        departure,
+                        (flight,) + flights,
+                        price + sub_price,
+                        stops | {next_stop},
+                    )
+
+    def _find_sub_routes(
+        self,
+        query: FlightQuery,
+        destination: int,
+        stop: int,
+        arrival: int,
+        remaining: int,
+    ) -> List[tuple]:
+        """Get routes from the stop departing within layover after the arrival.
+
+        Routes (see ``_routes_via()``) are cached for arrival time bucket - they
+        may visit airports of the trip prefix and exceed its maximum price,
+        therefore caller must filter them.
+
+        """
+        cache: SubRouteCache = self.cache
+        min_layover_secs: int = max(query.min_layover_hours * 3600, 1)
+        max_layover_secs: int = query.max_layover_hours * 3600
+        bucket: int = arrival // cache.bucket_secs
+        key = (
+            self.dataset.version,
+            destination,
+            stop,
+            bucket,
+            query.bags_count,
+            remaining,
+            min_layover_secs,
+            max_layover_secs,
+        )
+        sub_routes = cache.get(key)
+        if sub_routes is None:
+            sub_routes = []
+            bucket_start = bucket * cache.bucket_secs
+            for flight in self.dataset.flights_from(
+                stop,
+                bucket_start + min_layover_secs,
+                bucket_start + cache.bucket_secs - 1 + max_layover_secs,
+            ):
+                sub_routes.extend(
+                    self._routes_via(query, destination, flight, remaining)
+                )
+            cache.put(key, sub_routes)
+
+        lo = bisect.bisect_left(sub_routes, (arrival + min_layover_secs,))
+        hi = bisect.bisect_left(sub_routes, (arrival + max_layover_secs + 1,))
+        return sub_routes[lo:hi]
+
+    def _iter_one_way_flights_memoized(self, query: FlightQuery) -> Iterator[Trip]:
+        """Yield finalized one way trips composed of (cached) sub-routes."""
+        dataset: FlightDataset = self.dataset
+        origin: int = dataset.airport_id(query.origin)
+        destination: int = dataset.airport_id(query.destination)
+        # maximum number of flights (simple path if the number of stops is unlimited)
+        remaining: int = (
+            query.max_stops + 1 if query.max_stops else len(dataset.airports)
+        )
+        for flight in dataset.flights_from(origin, *query.departure_window()):
+            for _, flights, price, stops in self._routes_via(
+                query, destination, flight, remaining
+            ):
+                if origin in stops or (query.max_price and price > query.max_price):
+                    continue
+                trip = Trip(
+                    dataset=dataset,
+                    origin=query.origin,
+                    destination=query.destination,
+                    bags_count=query.bags_count,
+                )
+                for f in flights:
+                    trip = trip.extend(f)
+                trip.finalize()
+                yield trip
+
+    def _find_half_routes_to(
+        self, query: FlightQuery, origin: int, destination: int, max_flights: int
+    ) -> Dict[int, List[tuple]]:
+        """Get routes to the destination found by backward search (reverse edges).
+
+        Routes are ``(departure, flights, price, visited)`` tuples - simple paths
+        with at most ``max_flights`` flights admissible for query bags (and
+        price) which don't visit the origin. Visited airports (including the
+        first one) are bit mask of airport ids. Routes are grouped by their
+        first airport and sorted by departure.
+
+        """
+        dataset: FlightDataset = self.dataset
+        bags_count: int = query.bags_count
+        min_layover_secs: int = max(query.min_layover_hours * 3600, 1)
+        max_layover_secs: int = query.max_layover_hours * 3600
+        routes: Dict[int, List[tuple]] = collections.defaultdict(list)
+        level: List[tuple] = [(None, (), 0.0, 1 << destination)]
+        for _ in range(max_flights):
+            next_level: List[tuple] = []
+            for departure, flights, price, visited in level:
+                if flights:
+                    stop = dataset.origin[flights[0]]
+                    candidates = dataset.flights_to(
+                        stop, departure - max_layover_secs, departure - min_layover_secs
+                    )
+                else:
+                    candidates = dataset.flights_to(destination)
+                for flight in candidates:
+                    stop = dataset.origin[flight]
+                    if stop == origin or visited >> stop & 1:
+                        continue
+                    if bags_count > dataset.bags_allowed[flight]:
+                        continue
+                    route_price = (
+                        price
+                        + dataset.base_price[flight]
+                        + float(bags_count) * dataset.bag_price[flight]
+                    )
+                    if query.max_price and route_price > query.max_price:
+                        continue
+                    route = (
+                        dataset.departure[flight],
+                        (flight,) + flights,
+                        route_price,
+                        visited | 1 << stop,
+                    )
+                    routes[stop].append(route)
+                    next_level.append(route)
+            level = next_level
+        for stop_routes in routes.values():
+            stop_routes.sort()
+        return routes
+
+    def _iter_one_way_flights_bidirectional(self, query: FlightQuery) -> Iterator[Trip]:
+        """Yield finalized one way trips found by meet-in-the-middle search.
+
+        Routes of (at most) half of the maximum number of flights are searched
+        forward from the origin and the other half backward from the
+        destination. Trip with more flights than the forward half is split
+        after the forward half - forward route ending at the (intermediate)
+        airport is joined with backward routes from it departing within the
+        layover, visiting no airport twice. Trips are found exactly once as by
+        breadth first search (in different order).
+
+        """
+        dataset: FlightDataset = self.dataset
+        origin: int = dataset.airport_id(query.origin)
+        destination: int = dataset.airport_id(query.destination)
+        bags_count: int = query.bags_count
+        min_layover_secs: int = max(query.min_layover_hours * 3600, 1)
+        max_layover_secs: int = query.max_layover_hours * 3600
+        # maximum number of flights (simple path if the number of stops is unlimited)
+        max_flights: int = (
+            query.max_stops + 1 if query.max_stops else len(dataset.airports) - 1
+        )
+        forward_flights: int = (max_flights + 1) // 2
+        backward_routes = self._find_half_routes_to(
+            query, origin, destination, max_flights - forward_flights
+        )
+
+        def new_trip(flights: tuple) -> Optional[Trip]:
+            trip = Trip(
+                dataset=dataset,
+                origin=query.origin,
+                destination=query.destination,
+                bags_count=bags_count,
+            )
+            for f in flights:
+                trip = trip.extend(f)
+            if query.max_price and trip.total_price > query.max_price:
+                return None
+            trip.finalize()
+            return trip
+
+        # forward routes: (flights, price, visited)
+        level: List[tuple] = [((), 0.0, 1 << origin)]
+        for length in range(1, forward_flights + 1):
+            next_level: List[tuple] = []
+            for flights, price, visited in level:
+                if flights:
+                    arrival = dataset.arrival[flights[-1]]
+                    candidates = dataset.flights_from(
+                        dataset.destination[flights[-1]],
+                        arrival + min_layover_secs,
+                        arrival + max_layover_secs,
+                    )
+                else:
+                    candidates = dataset.flights_from(origin, *query.departure_window())
+                for flight in candidates:
+                    stop = dataset.destination[flight]
+                    if visited >> stop & 1:
+                        continue
+                    if bags_count > dataset.bags_allowed[flight]:
+                        continue
+                    route_price = (
+                        price
+                        + dataset.base_price[flight]
+                        + float(bags_count) * dataset.bag_price[flight]
+                    )
+                    if query.max_price and route_price > query.max_price:
+                        continue
+                    route = (flights + (flight,), route_price, visited | 1 << stop)
+                    if stop == destination:
+                        trip = new_trip(route[0])
+                        if trip is not None:
+                            yield trip
+                    elif length < forward_flights:
+                        next_level.append(route)
+                    else:
+                        yield from self._join_half_routes(
+                            query, route, backward_routes.get(stop, ()), new_trip
+                        )
+            level = next_level
+
+    def _join_half_routes(
+        self,
+        query: FlightQuery,
+        route: tuple,
+        backward_routes: Sequence[tuple],
+        new_trip,
+    ) -> Iterator[Trip]:
+        """Yield trips of forward route joined with backward routes."""
+        dataset: FlightDataset = self.dataset
+        flights, price, visited = route
+        stop = dataset.destination[flights[-1]]
+        arrival = dataset.arrival[flights[-1]]
+        lo = bisect.bisect_left(
+            backward_routes, (arrival + max(query.min_layover_hours * 3600, 1),)
+        )
+        hi = bisect.bisect_left(
+            backward_routes, (arrival + query.max_layover_hours * 3600 + 1,)
+        )
+        joint = 1 << stop
+        for i in range(lo, hi):
+            _, back_flights, back_price, back_visited = backward_routes[i]
+            if visited & back_visited != joint:
+                continue
+            if query.max_price and price + back_price > query.max_price:
+                continue
+            trip = new_trip(flights + back_flights)
+            if trip is not None:
+                yield trip
+
+    def _find_one_way_flights(
+        self,
+        query: FlightQuery,
+        top_k: int = 0,
+        stats: Optional[FlightSearchStats] = None,
+    ) -> FlightSearchResult:
+        result = FlightSearchResult()
+        if stats is not None:
+            result.stats = stats
+        limits: Optional[FlightSearchLimits] = (
+            FlightSearchLimits(query) if query.has_limits() else None
+        )
+        if top_k:
+            result.extend_trips(
+                itertools.islice(
+                    self._iter_one_way_flights(
+                        query, cheapest_first=True, stats=result.stats, limits=limits
+                    ),
+                    top_k,
+                ),
+                query.max_results,
+            )
+        else:
+            result.extend_trips(
+                self._iter_one_way_flights(query, stats=result.stats, limits=limits),
+                query.max_results,
+            )
+        if limits is not None and limits.truncated:
+            result.truncated = True
+        return result
+
+    def snapshot(self) -> "FlightOracle":
+        """Get oracle searching the current snapshot of the (updated) dataset.
+
+        Searches started by ``find_flights()`` and ``iter_flights()`` use it, so
+        that they are consistent while the dataset is updated.
+
+        """
+        dataset: FlightDataset = self.dataset.snapshot()
+        if dataset is self.dataset:
+            return self
+        oracle: Optional[FlightOracle] = self._snapshot_oracle
+        if oracle is None or oracle.dataset is not dataset:
+            oracle = FlightOracle(dataset, cache=self.cache)
+            self._snapshot_oracle = oracle
+        return oracle
+
+    def find_flights(
+        self, query: FlightQuery, stats: Optional[FlightSearchStats] = None
+    ) -> FlightSearchResult:
+        """Find trips of the query.
+
+        Parameters
+        ----------
+        query : FlightQuery
+          Flight search query.
+        stats : FlightSearchStats
+          Optional search instrumentation (set as the result ``stats``).
+
+        """
+        flight_oracle: FlightOracle = self.snapshot()
+        if flight_oracle is not self:
+            return flight_oracle.find_flights(query, stats)
+        if query.all_bags:
+            result = FlightSearchResult()
+            result.stats = stats
+            for bags_result in self.find_flights_by_bags(query, stats):
+                result.extend_trips(bags_result.trips, query.max_results)
+                result.truncated = result.truncated or bags_result.truncated
+            return result
+        if query.is_multi():
+            return self._find_multi_flights(query, stats)
+        if query.pareto:
+            return self._find_pareto_flights(query, stats)
+
+        # K cheapest return trips are composed of K cheapest one way trips
+        # unless "there" and "back" trips must be time ordered
+        top_k: int = query.top_k
+        if query.return_ticket and OPT_TIME_ORDERED_RETURN_TRIP:
+            top_k = 0
+
+        with FlightSearchStats.timer(stats, FlightSearchStats.TIME_SEARCH):
+            there: FlightSearchResult = self._find_one_way_flights(
+                query, top_k, stats=stats
+            )
+        if query.return_ticket and there.trips:
+            # IMPORTANT: no layover + "there" arrival might be AFTER "back" departure
+            with FlightSearchStats.timer(stats, FlightSearchStats.TIME_SEARCH):
+                back: FlightSearchResult = self._find_one_way_flights(
+                    query.reversed(), top_k, stats=stats
+                )
+            with FlightSearchStats.timer(stats, FlightSearchStats.TIME_PAIRING):
+                there.add_back_result(
+                    back, top_k=query.top_k, max_results=query.max_results
+                )
+            there.truncated = there.truncated or back.truncated
+
+        there.sort()
+        return there
+
+    async def find_flights_async(
+        self,
+        query: FlightQuery,
+        deadline: Optional[float] = None,
+        max_expanded: int = 0,
+        stats: Optional[FlightSearchStats] = None,
+        yield_every: int = ASYNC_YIELD_EVERY,
+    ) -> FlightSearchResult:
+        """Find trips of the query cooperatively within the running event loop.
+
+        Search yields to the event loop every ``yield_every`` expanded partial
+        trips, therefore other tasks aren't blocked and the search task can be
+        cancelled. Once the deadline passes or the expansion budget is spent,
+        the search stops - result holds trips found so far and ``truncated`` is
+        set (return trips are paired only if both one way searches complete).
+        Result which isn't truncated is the same as of ``find_flights()``. Query
+        limits (frontier, memory and result trips) apply as they do to
+        ``find_flights()``. Searches which can't yield while they expand partial
+        trips aren't cooperative: sub-route cache of the oracle isn't used
+        (breadth first search finds the same trips) and bidirectional engine is
+        rejected.
+
+        Parameters
+        ----------
+        query : FlightQuery
+          Flight search query - multiple origins/destinations, all bags, Pareto
+          optimal return trips and bidirectional engine are not supported.
+        deadline : float
+          Optional ``time.monotonic()`` time when the search stops.
+        max_expanded : int
+          Optional maximum number of expanded partial trips (0 stands for
+          unlimited).
+        stats : FlightSearchStats
+          Optional search instrumentation (set as the result ``stats``).
+        yield_every : int
+          Number of expanded partial trips between yields to the event loop.
+
+        """
+        if (
+            query.is_multi()
+            or query.all_bags
+            or (query.pareto and query.return_ticket)
+            or query.engine == FlightQuery.ENGINE_BIDIRECTIONAL
+        ):
+            raise ValueError(
+                "Multiple origins/destinations, all bags, Pareto optimal return "
+                "trips and bidirectional engine can't be searched asynchronously"
+            )
+        flight_oracle: FlightOracle = self.snapshot()
+        result = FlightSearchResult()
+        result.stats = stats
+        # expansions are counted even if stats aren't requested (budget)
+        counters: FlightSearchStats = (
+            stats if stats is not None else FlightSearchStats()
+        )
+        max_expanded_total: int = counters.expanded + max_expanded
+        # deadline passed or budget spent (query limits truncate searches only)
+        stopped: bool = False
+
+        def iter_one_way(one_way: FlightQuery) -> Iterator[Optional[Trip]]:
+            limits: Optional[FlightSearchLimits] = (
+                FlightSearchLimits(query) if query.has_limits() else None
+            )
+            yield from flight_oracle._iter_one_way_flights(
+                one_way,
+                bool(top_k),
+                stats=counters,
+                yield_every=yield_every,
+                limits=limits,
+            )
+            if limits is not None and limits.truncated:
+                result.truncated = True
+
+        async def gather(trips: Iterator[Optional[Trip]], limit: int) -> List[Trip]:
+            nonlocal stopped
+            found: List[Trip] = []
+            try:
+                for trip in trips:
+                    if trip is not None:
+                        found.append(trip)
+                        if len(found) == limit:
+                            break
+                        if query.max_results and len(found) > query.max_results:
+                            found.pop()
+                            result.truncated = True
+                            break
+                    if (deadline is not None and time.monotonic() >= deadline) or (
+                        max_expanded and counters.expanded >= max_expanded_total
+                    ):
+                        result.truncated = stopped = True
+                        break
+                    if trip is None or not len(found) % yield_every:
+                        await asyncio.sleep(0)
+            finally:
+                # cancelled or stopped search releases its queue
+                close = getattr(trips, "close", None)
+                if close is not None:
+                    close()
+            return found
+
+        # K cheapest return trips are composed of K cheapest one way trips
+        # unless "there" and "back" trips must be time ordered
+        top_k: int = query.top_k
+        if query.return_ticket and OPT_TIME_ORDERED_RETURN_TRIP:
+            top_k = 0
+
+        with FlightSearchStats.timer(stats, FlightSearchStats.TIME_SEARCH):
+            there: List[Trip] = await gather(iter_one_way(query), top_k)
+        if not query.return_ticket:
+            result.trips = there
+        elif there and not stopped:
+            with FlightSearchStats.timer(stats, FlightSearchStats.TIME_SEARCH):
+                back: List[Trip] = await gather(iter_one_way(query.reversed()), top_k)
+            if back and not stopped:
+                if query.top_k:
+                    there.sort(key=lambda t: t.total_price)
+                with FlightSearchStats.timer(stats, FlightSearchStats.TIME_PAIRING):
+                    result.trips = await gather(
+                        FlightSearchResult.pair_return_trips(
+                            there, back, cheapest_first=bool(query.top_k)
+                        ),
+                        query.top_k,
+                    )
+
+        result.sort()
+        return result
+
+    def find_flights_by_bags(
+        self, query: FlightQuery, stats: Optional[FlightSearchStats] = None
+    ) -> List[FlightSearchResult]:
+        """Find trips of the query for every number of bags up to its bags count.
+
+        Trips are searched once - without bags, which is the least restrictive
+        search: flights of trips with bags are a subset and their prices aren't
+        lower. Trip allows bags up to the minimum of bags allowed by its flights,
+        price with bags is base price plus bags times the sum of bag prices.
+        Trips with bags are the same as trips of separate searches with bags.
+
+        K cheapest, Pareto optimal and multiple origins/destinations trips
+        depend on bags prices - they are searched for each number of bags.
+
+        Parameters
+        ----------
+        query : FlightQuery
+          Flight search query - trips with 0 to ``bags_count`` bags are found.
+        stats : FlightSearchStats
+          Optional search instrumentation (set as results ``stats``).
+
+        Returns
+        -------
+        List[FlightSearchResult]
+          Search results by the number of bags.
+
+        """
+        flight_oracle: FlightOracle = self.snapshot()
+        if flight_oracle is not self:
+            return flight_oracle.find_flights_by_bags(query, stats)
+        queries: List[FlightQuery] = []
+        for bags_count in range(query.bags_count + 1):
+            bags_query = copy.copy(query)
+            bags_query.bags_count = bags_count
+            bags_query.all_bags = False
+            queries.append(bags_query)
+        if query.top_k or query.pareto or query.is_multi():
+            return [self.find_flights(q, stats) for q in queries]
+
+        with FlightSearchStats.timer(stats, FlightSearchStats.TIME_SEARCH):
+            there: FlightSearchResult = self._find_one_way_flights(
+                queries[0], stats=stats
+            )
+            back: FlightSearchResult = FlightSearchResult()
+            if query.return_ticket and there.trips:
+                back = self._find_one_way_flights(queries[0].reversed(), stats=stats)
+
+        results: List[FlightSearchResult] = []
+        for bags_query in queries:
+            result = FlightSearchResult()
+            result.stats = stats
+            result.trips = FlightOracle._trips_with_bags(there.trips, bags_query)
+            result.truncated = there.truncated or back.truncated
+            if query.return_ticket:
+                bags_back = FlightSearchResult()
+                bags_back.trips = FlightOracle._trips_with_bags(back.trips, bags_query)
+                with FlightSearchStats.timer(stats, FlightSearchStats.TIME_PAIRING):
+                    result.add_back_result(bags_back, max_results=query.max_results)
+            result.sort()
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _trips_with_bags(trips: List[Trip], query: FlightQuery) -> List[Trip]:
+        """Get trips (searched without bags) which allow query bags - with bags."""
+        bags_trips: List[Trip] = []
+        for trip in trips:
+            if trip.bags_allowed >= query.bags_count:
+                t: Trip = trip.with_bags(query.bags_count)
+                if not query.max_price or t.total_price <= query.max_price:
+                    bags_trips.append(t)
+        return bags_trips
+
+    def _find_multi_flights(
+        self, query: FlightQuery, stats: Optional[FlightSearchStats] = None
+    ) -> FlightSearchResult:
+        """Find trips of multiple origins/destinations in a single traversal.
+
+        Result holds trips of all (origin, destination) pairs - the same trips
+        as separate queries of the pairs (``top_k`` trips of every pair). Trips
+        to anywhere are the cheapest (``top_k``, 1 by default) trips to every
+        reachable airport. Return trips pair trips of (origin, destination)
+        with back trips of (destination, origin).
+
+        """
+        top_k: int = query.top_k or (1 if query.is_anywhere() else 0)
+        # K cheapest return trips are composed of K cheapest one way trips
+        # unless "there" and "back" trips must be time ordered
+        one_way_k: int = top_k
+        if query.return_ticket and OPT_TIME_ORDERED_RETURN_TRIP:
+            one_way_k = 0
+
+        result = FlightSearchResult()
+        result.stats = stats
+        with FlightSearchStats.timer(stats, FlightSearchStats.TIME_SEARCH):
+            result.extend_trips(
+                self._iter_one_way_flights_multi(query, one_way_k, stats=stats),
+                query.max_results,
+            )
+        if query.return_ticket and result.trips:
+            with FlightSearchStats.timer(stats, FlightSearchStats.TIME_SEARCH):
+                back_trips = self._iter_one_way_flights_multi(
+                    query.reversed(), one_way_k, stats=stats
+                )
+                backs: Dict[Tuple[str, str], FlightSearchResult] = (
+                    collections.defaultdict(FlightSearchResult)
+                )
+                for trip in back_trips:
+                    backs[(trip.origin, trip.destination)].trips.append(trip)
+            with FlightSearchStats.timer(stats, FlightSearchStats.TIME_PAIRING):
+                theres: Dict[Tuple[str, str], FlightSearchResult] = (
+                    collections.defaultdict(FlightSearchResult)
+                )
+                for trip in result.trips:
+                    theres[(trip.origin, trip.destination)].trips.append(trip)
+                result.trips = []
+                for (origin, destination), there in theres.items():
+                    there.add_back_result(
+                        backs[(destination, origin)],
+                        top_k=query.top_k,
+                        max_results=query.max_results,
+                    )
+                    result.extend_trips(there.trips, query.max_results)
+
+        result.sort()
+        return result
+
+    def _find_pareto_flights(
+        self, query: FlightQuery, stats: Optional[FlightSearchStats] = None
+    ) -> FlightSearchResult:
+        """Find Pareto optimal trips (total price vs. travel time) by price.
+
+        Return trips are composed of Pareto optimal "there" and back trips -
+        a dominated one way trip can't make a return trip optimal - unless they
+        must be time ordered (``OPT_TIME_ORDERED_RETURN_TRIP``), then all one way
+        trips are searched and the front is filtered.
+
+        """
+        one_way: FlightQuery = query
+        if query.return_ticket and OPT_TIME_ORDERED_RETURN_TRIP:
+            one_way = copy.copy(query)
+            one_way.pareto = False
+        with FlightSearchStats.timer(stats, FlightSearchStats.TIME_SEARCH):
+            there: FlightSearchResult = self._find_one_way_flights(one_way, stats=stats)
+        if query.return_ticket and there.trips:
+            with FlightSearchStats.timer(stats, FlightSearchStats.TIME_SEARCH):
+                back: FlightSearchResult = self._find_one_way_flights(
+                    one_way.reversed(), stats=stats
+                )
+            with FlightSearchStats.timer(stats, FlightSearchStats.TIME_PAIRING):
+                there.add_back_result(back)
+        front: List[Trip] = FlightSearchResult.pareto_front(there.trips)
+        if query.top_k:
+            front = front[: query.top_k]
+        there.trips = []
+        there.extend_trips(front, query.max_results)
+        return there
 
-            # cartesian product 8-/
-            new_trips: List[Trip] = []
-            for there_trip in self.trips:
-                for back_trip in back.trips:
-                    if (
-                        OPT_TIME_ORDERED_RETURN_TRIP
-                        and there_trip.flights[-1][FlightDataset.COL_ARRIVAL_O]
-                        >= back_trip.flights[-1][FlightDataset.COL_DEPARTURE_O]
-                    ):
-                        continue
+    def iter_flights(
+        self,
+        query: FlightQuery,
+        limit: int = 0,
+        cheapest_first: bool = False,
+        stats: Optional[FlightSearchStats] = None,
+    ) -> Iterator[Trip]:
+        """Lazily yield finalized trips as they are discovered.
 
-                    new_trip = there_trip.copy()
+        Parameters
+        ----------
+        query : FlightQuery
+          Flight search query.
+        limit : int
+          Optional maximum number of yielded trips (0 stands for unlimited).
+        cheapest_first : bool
+          Search cheaper partial trips first - (one way) trips are yielded ordered
+          by total price. Breadth first search order is used otherwise. It is
+          implied by ``query.top_k`` - the K cheapest trips are yielded.
+        stats : FlightSearchStats
+          Optional search counters updated as trips are searched.
 
-                    new_trip.flights.extend(back_trip.flights)
-                    new_trip.bags_allowed = min(
-                        there_trip.bags_allowed, back_trip.bags_allowed
-                    )
-                    new_trip.total_price += back_trip.total_price
+        """
+        flight_oracle: FlightOracle = self.snapshot()
+        if flight_oracle is not self:
+            yield from flight_oracle.iter_flights(query, limit, cheapest_first, stats)
+            return
+        if query.max_results and (not limit or query.max_results < limit):
+            limit = query.max_results
+        if query.all_bags:
+            # trips with bags are known once trips without bags are found
+            yield from itertools.islice(
+                self.find_flights(query, stats).trips, limit or None
+            )
+            return
+        if query.is_multi() and not query.return_ticket:
+            yield from itertools.islice(
+                self._iter_one_way_flights_multi(
+                    query,
+                    query.top_k or (1 if query.is_anywhere() else 0),
+                    cheapest_first,
+                    stats,
+                ),
+                limit or None,
+            )
+            return
+        if query.is_multi() or (query.pareto and query.return_ticket):
+            # return trips of multiple origins/destinations and Pareto optimal
+            # return trips are known once all of them are paired
+            yield from itertools.islice(
+                self.find_flights(query, stats).trips, limit or None
+            )
+            return
 
-                    new_trip.travel_time = (
-                        there_trip.travel_secs + back_trip.travel_secs
-                    )
-                    new_trip.finalize()
+        if query.top_k:
+            # K cheapest (return) trips are the first K trips by price
+            cheapest_first = True
+            if not limit or query.top_k < limit:
+                limit = query.top_k
+        trips: Iterator[Trip] = self._iter_one_way_flights(
+            query,
+            cheapest_first,
+            stats=stats,
+            limits=FlightSearchLimits(query) if query.has_limits() else None,
+        )
+        if query.return_ticket:
+            back: FlightSearchResult = self._find_one_way_flights(
+                query.reversed(), stats=stats
+            )
+            trips = FlightSearchResult.pair_return_trips(
+                trips, back.trips, cheapest_first=cheapest_first
+            )
+        yield from itertools.islice(trips, limit or None)
 
-                    new_trips.append(new_trip)
 
-            self.trips = new_trips
+OUTPUT_JSON = "json"
+OUTPUT_NDJSON = "ndjson"
+OUTPUT_JSON_REFS = "json_refs"
 
-    def sort(self):
-        self.trips.sort(key=lambda t: t.total_price)
+# functions listed by --profile
+PROFILE_ENTRIES = 20
 
-    def to_dict(self) -> List:
-        return [t.to_dict() for t in self.trips]
 
-    def to_json(self) -> str:
-        return json.dumps(self.to_dict(), indent=4)
+CMD_COMPILE = "compile"
+CMD_SERVE = "serve"
+CMD_BATCH = "batch"
+CMD_PARTITION = "partition"
 
+# flight oracle of search worker (process or thread) - set before the worker pool
+# is created, therefore forked processes share the dataset copy-on-write
+_worker_oracle: Optional[FlightOracle] = None
 
-class FlightOracle:
-    """Flight search engine."""
 
-    def __init__(self, dataset: FlightDataset):
-        self.dataset: FlightDataset = dataset
+def _init_worker(dataset_path: str) -> None:
+    global _worker_oracle
+    if _worker_oracle is None:
+        # spawned (not forked) worker process
+        _worker_oracle = FlightOracle(FlightDataset(dataset_path).load())
 
-    @staticmethod
-    def _is_flight_admissible(
-        flight,
-        trip: Trip,
-        min_layover_hours: int,
-        max_layover_hours: int,
-        max_price: float,
-        max_stops: int,
-    ):
-        if flight[FlightDataset.COL_DESTINATION] in trip.stops:
-            return False
-        if trip.bags_count > flight[FlightDataset.COL_BAGS_ALLOWED]:
-            return False
-        # layover
-        if trip.flights:
-            if not (
-                trip.flights[-1][FlightDataset.COL_ARRIVAL_O]
-                < flight[FlightDataset.COL_DEPARTURE_O]
-            ):
-                return False
-            layover = (
-                flight[FlightDataset.COL_DEPARTURE_O]
-                - trip.flights[-1][FlightDataset.COL_ARRIVAL_O]
-            ).total_seconds()
-            if not (min_layover_hours * 3600 <= layover <= max_layover_hours * 3600):
-                return False
-        # extra
-        if max_price and max_price < (
-            trip.total_price
-            + flight[FlightDataset.COL_BASE_PRICE]
-            + float(trip.bags_count) * flight[FlightDataset.COL_BAG_PRICE]
+
+def _create_worker_pool(
+    dataset_path: str, workers: int = 0, processes: bool = True, cache_mb: int = 0
+) -> concurrent.futures.Executor:
+    """Load dataset and create pool of search workers sharing it.
+
+    Parameters
+    ----------
+    dataset_path : str
+      Path to CSV file with flights or its snapshot.
+    workers : int
+      Number of search workers (number of CPUs by default).
+    processes : bool
+      Search in worker processes (forked ones share the dataset), threads
+      are used otherwise.
+    cache_mb : int
+      Optional size of sub-route cache (MB) of each worker.
+
+    """
+    global _worker_oracle
+    _worker_oracle = FlightOracle(
+        FlightDataset(dataset_path).load(),
+        cache=SubRouteCache(max_bytes=cache_mb * 2**20) if cache_mb else None,
+    )
+    workers = workers or os.cpu_count() or 1
+    if not processes:
+        return concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(dataset_path,),
+    )
+    # start all workers now - before any other thread (event loop) is running
+    list(executor.map(_init_worker, [dataset_path] * workers))
+    return executor
+
+
+def _search_worker(request: Dict) -> FlightSearchResult:
+    query = FlightQuery().init_from_dict(request)
+    query.validate()
+    _worker_oracle.dataset.validate(query)
+    return _worker_oracle.find_flights(query)
+
+
+def _batch_worker(line: str) -> str:
+    """Search JSON line query and return JSON line result tagged by query id.
+
+    Used by both batch search and server, so that queries are parsed and results
+    serialized in parallel by workers. Any failure of a query is its error result
+    - it must not stop the other queries of the batch (connection).
+
+    """
+    request_id = None
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("Query must be JSON object")
+        request_id = request.pop("id", None)
+        result = _search_worker(request)
+        encoder = TripJsonEncoder()
+        trips = [encoder.encode(t) for t in result.trips]
+        fields: List[Tuple[str, str]] = [
+            ("trips", encoder.encode_items("[", trips, "]", 0)),
+            ("id", json.dumps(request_id)),
+        ]
+        if result.truncated:
+            fields.append(("truncated", "true"))
+        return encoder.encode_fields(fields, 0)
+    except Exception as e:
+        return _error_response(e, request_id)
+
+
+def _error_response(error: Exception, request_id: Any = None) -> str:
+    """Get JSON line error result of a query (with id parsed from the query)."""
+    return json.dumps({"error": str(error) or type(error).__name__, "id": request_id})
+
+
+def search_batch(
+    dataset_path: str,
+    queries: Iterable[str],
+    out: TextIO,
+    workers: int = 0,
+    processes: bool = True,
+    cache_mb: int = 0,
+) -> int:
+    """Search batch of JSON line queries using pool of workers.
+
+    Dataset is loaded once and shared by (forked) worker processes, queries are
+    searched and results serialized in parallel and written as JSON lines in
+    the order of queries - each result has query ``id`` and either ``trips``
+    or ``error``.
+
+    Returns
+    -------
+    int
+      Number of searched queries.
+
+    """
+    executor = _create_worker_pool(dataset_path, workers, processes, cache_mb)
+    count: int = 0
+    try:
+        for result in executor.map(
+            _batch_worker, (q for q in queries if q.strip()), chunksize=8
         ):
-            return False
-        # max stops
-        if max_stops and max_stops < len(trip.stops) - 1:
-            return False
+            out.write(result)
+            out.write("\n")
+            count += 1
+    finally:
+        executor.shutdown()
+    return count
 
-        return True
 
-    def _find_one_way_flights(self, query: FlightQuery) -> FlightSearchResult:
-        result = FlightSearchResult()
-        trips = collections.deque()
-        trips.append(
-            Trip(
-                origin=query.origin,
-                destination=query.destination,
-                bags_count=query.bags_count,
-            )
+class FlightServer:
+    """Long-running flight search server with warm in-memory dataset.
+
+    Protocol is line delimited JSON over TCP: each request line is an object
+    with ``FlightQuery.FIELDS`` (and optional ``id``), each response line is an
+    object with the request ``id`` and either ``trips`` (and ``truncated`` if a
+    query limit was hit) or ``error``. Requests are searched in a worker pool,
+    therefore a slow query doesn't block other requests - responses of
+    pipelined requests may come out of order.
+
+    """
+
+    def __init__(
+        self,
+        dataset_path: str,
+        workers: int = 0,
+        processes: bool = True,
+        cache_mb: int = 0,
+    ):
+        """Create flight server instance.
+
+        Parameters
+        ----------
+        dataset_path : str
+          Path to CSV file with flights or its snapshot.
+        workers : int
+          Number of search workers (number of CPUs by default).
+        processes : bool
+          Search in worker processes (forked ones share the dataset), threads
+          are used otherwise.
+        cache_mb : int
+          Optional size of sub-route cache (MB) of each worker.
+
+        """
+        self.executor: concurrent.futures.Executor = _create_worker_pool(
+            dataset_path, workers, processes, cache_mb
         )
-        while trips:
-            trip: Trip = trips.popleft()
-            current_stop = trip.stops[-1]
-            if query.destination == current_stop:
-                result.add_trip(trip)
 
-            # schedule next stops from the current stop
-            for flight in self.dataset.dg_edges_by_src.get(current_stop, []):
-                if FlightOracle._is_flight_admissible(
-                    flight=flight,
-                    trip=trip,
-                    min_layover_hours=query.min_layover_hours,
-                    max_layover_hours=query.max_layover_hours,
-                    max_price=query.max_price,
-                    max_stops=query.max_stops,
-                ):
-                    new_trip: Trip = trip.copy()
-                    new_trip.add_stop(flight)
-                    trips.append(new_trip)
+    async def _handle_request(
+        self, line: bytes, writer: asyncio.StreamWriter, lock: asyncio.Lock
+    ) -> None:
+        # query is parsed, searched and result serialized by the worker
+        try:
+            response: str = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _batch_worker, line.decode("utf-8")
+            )
+        except Exception as e:
+            # not UTF-8 request or broken worker pool - the client gets a reply
+            response = _error_response(e)
+        async with lock:
+            writer.write(response.encode("utf-8") + b"\n")
+            await writer.drain()
 
-        return result
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        lock = asyncio.Lock()
+        requests: set = set()
+        try:
+            async for line in reader:
+                if line.strip():
+                    request = asyncio.create_task(
+                        self._handle_request(line, writer, lock)
+                    )
+                    requests.add(request)
+                    request.add_done_callback(requests.discard)
+            if requests:
+                await asyncio.wait(requests)
+        finally:
+            writer.close()
 
-    def find_flights(self, query: FlightQuery) -> FlightSearchResult:
-        there: FlightSearchResult = self._find_one_way_flights(query)
-        if query.return_ticket and there.trips:
-            # IMPORTANT: no layover + "there" arrival might be AFTER "back" departure
-            back: FlightSearchResult = self._find_one_way_flights(query)
-            there.add_back_result(back)
+    async def start(self, host: str, port: int) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._handle_connection, host, port)
 
-        there.sort()
-        return there
+    async def serve(self, host: str, port: int) -> None:
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+
+
+def main_serve(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog=f"solution.py {CMD_SERVE}",
+        description=(
+            "Flight search server with warm in-memory dataset - line delimited "
+            "JSON queries over TCP."
+        ),
+    )
+    parser.add_argument(
+        "dataset_path",
+        metavar="dataset_path",
+        type=str,
+        help="path to CSV file with flights or its compiled snapshot",
+    )
+    parser.add_argument(
+        "--host", type=str, default="127.0.0.1", help="optional host to bind"
+    )
+    parser.add_argument("--port", type=int, default=8642, help="optional port")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="optional number of search workers (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--threads",
+        action="store_true",
+        default=False,
+        help="optional search in threads instead of processes",
+    )
+    parser.add_argument(
+        "--cache_mb",
+        type=int,
+        default=0,
+        help="optional size of sub-route cache of each worker in MB (default: off)",
+    )
+    args = parser.parse_args(argv)
+
+    server = FlightServer(
+        args.dataset_path,
+        workers=args.workers,
+        processes=not args.threads,
+        cache_mb=args.cache_mb,
+    )
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+def main_compile(argv: List[str]) -> str:
+    parser = argparse.ArgumentParser(
+        prog=f"solution.py {CMD_COMPILE}",
+        description=(
+            "Compile CSV dataset to binary snapshot which is memory-mapped "
+            "(fast startup) when used instead of the CSV dataset."
+        ),
+    )
+    parser.add_argument(
+        "dataset_path",
+        metavar="dataset_path",
+        type=str,
+        help="path to CSV file with flights",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="",
+        help="optional snapshot path (default: dataset path with .kiwi extension)",
+    )
+    args = parser.parse_args(argv)
 
+    snapshot_path = args.output or f"{os.path.splitext(args.dataset_path)[0]}.kiwi"
+    FlightDataset(args.dataset_path).load().save_snapshot(snapshot_path)
+    print(snapshot_path)
+    return snapshot_path
 
-def main() -> FlightSearchResult:
+
+def main_partition(argv: List[str]) -> str:
     parser = argparse.ArgumentParser(
-        description="Flights finder (Kiwi.com Python weekend entry task)."
+        prog=f"solution.py {CMD_PARTITION}",
+        description=(
+            "Partition CSV dataset by departure day - queries with departure dates "
+            "(--from, --to) load only partitions they can use."
+        ),
     )
     parser.add_argument(
         "dataset_path",
@@ -446,9 +4475,130 @@ def main() -> FlightSearchResult:
         type=str,
         help="path to CSV file with flights",
     )
-    parser.add_argument("origin", metavar="origin", type=str, help="flight trip origin")
     parser.add_argument(
-        "destination", metavar="destination", type=str, help="flight trip destination"
+        "-o",
+        "--output",
+        type=str,
+        default="",
+        help="optional partitions directory (default: dataset path without extension)",
+    )
+    args = parser.parse_args(argv)
+
+    partition_dir = args.output or os.path.splitext(args.dataset_path)[0]
+    FlightDataset(args.dataset_path).load().save_partitions(partition_dir)
+    print(partition_dir)
+    return partition_dir
+
+
+def main_batch(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(
+        prog=f"solution.py {CMD_BATCH}",
+        description=(
+            "Search JSON line queries (FlightQuery fields and optional id) "
+            "in parallel - dataset is loaded once and shared by workers."
+        ),
+    )
+    parser.add_argument(
+        "dataset_path",
+        metavar="dataset_path",
+        type=str,
+        help="path to CSV file with flights or its compiled snapshot",
+    )
+    parser.add_argument(
+        "queries_path",
+        metavar="queries_path",
+        type=str,
+        help="path to JSON lines file with queries",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default="",
+        help="optional path to JSON lines results file (default: stdout)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="optional number of search workers (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--cache_mb",
+        type=int,
+        default=0,
+        help="optional size of sub-route cache of each worker in MB (default: off)",
+    )
+    args = parser.parse_args(argv)
+
+    # undecodable bytes are replaced - error result of their query only
+    with open(args.queries_path, mode="r", errors="replace") as queries:
+        if args.output:
+            with open(args.output, mode="w") as out:
+                return search_batch(
+                    args.dataset_path,
+                    queries,
+                    out,
+                    workers=args.workers,
+                    cache_mb=args.cache_mb,
+                )
+        return search_batch(
+            args.dataset_path,
+            queries,
+            sys.stdout,
+            workers=args.workers,
+            cache_mb=args.cache_mb,
+        )
+
+
+COMMANDS = {
+    CMD_COMPILE: main_compile,
+    CMD_SERVE: main_serve,
+    CMD_BATCH: main_batch,
+    CMD_PARTITION: main_partition,
+}
+
+
+def main(argv: Optional[List[str]] = None) -> Optional[FlightSearchResult]:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        COMMANDS[argv[0]](argv[1:])
+        return None
+
+    parser = argparse.ArgumentParser(
+        description="Flights finder (Kiwi.com Python weekend entry task).",
+        epilog=(
+            f"Commands: '{CMD_COMPILE}' CSV dataset to binary snapshot "
+            f"(solution.py {CMD_COMPILE} -h), '{CMD_SERVE}' queries using "
+            f"long-running server (solution.py {CMD_SERVE} -h), '{CMD_BATCH}' "
+            f"of queries in parallel (solution.py {CMD_BATCH} -h), "
+            f"'{CMD_PARTITION}' CSV dataset by departure day (solution.py "
+            f"{CMD_PARTITION} -h)."
+        ),
+    )
+    parser.add_argument(
+        "dataset_path",
+        metavar="dataset_path",
+        type=str,
+        help=(
+            "path to CSV file with flights, its compiled snapshot or partitions "
+            "directory"
+        ),
+    )
+    parser.add_argument(
+        "origin",
+        metavar="origin",
+        type=str,
+        help="flight trip origin (comma separated origins)",
+    )
+    parser.add_argument(
+        "destination",
+        metavar="destination",
+        type=str,
+        help=(
+            f"flight trip destination (comma separated destinations or "
+            f"'{FlightQuery.ANYWHERE}' for the cheapest trips to every airport)"
+        ),
     )
     parser.add_argument(
         "--bags",
@@ -474,19 +4624,201 @@ def main() -> FlightSearchResult:
         default=0,
         help="optional maximum flight trip price",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--top_k",
+        type=int,
+        default=0,
+        help="optional number of the cheapest trips to find (default: all)",
+    )
+    parser.add_argument(
+        "--pareto",
+        action="store_true",
+        default=False,
+        help=(
+            "optional Pareto optimal trips only - no other trip is both cheaper "
+            "(or as cheap) and shorter (or as short)"
+        ),
+    )
+    parser.add_argument(
+        "--all_bags",
+        action="store_true",
+        default=False,
+        help=(
+            "optional trips for every number of bags from 0 to --bags found by "
+            "single search"
+        ),
+    )
+    parser.add_argument(
+        "--from",
+        dest="departure_from",
+        metavar="DATE",
+        type=str,
+        default="",
+        help="optional first departure date of trips (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--to",
+        dest="departure_to",
+        metavar="DATE",
+        type=str,
+        default="",
+        help="optional last departure date of trips (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--max_frontier",
+        type=int,
+        default=0,
+        help="optional maximum number of queued partial trips (search frontier)",
+    )
+    parser.add_argument(
+        "--max_results",
+        type=int,
+        default=0,
+        help="optional maximum number of trips (the rest is truncated)",
+    )
+    parser.add_argument(
+        "--max_memory",
+        metavar="MB",
+        type=int,
+        default=0,
+        help=(
+            "optional maximum approximate memory of queued partial trips and "
+            "found trips (MB)"
+        ),
+    )
+    parser.add_argument(
+        "--on_limit",
+        choices=FlightQuery.ON_LIMITS,
+        default=FlightQuery.ON_LIMIT_TRUNCATE,
+        help=(
+            f"optional action once frontier or memory limit is hit: truncate trips "
+            f"or continue by low memory iterative deepening depth first search "
+            f"(default: {FlightQuery.ON_LIMIT_TRUNCATE})"
+        ),
+    )
+    parser.add_argument(
+        "--output",
+        choices=[OUTPUT_JSON, OUTPUT_NDJSON, OUTPUT_JSON_REFS],
+        default=OUTPUT_JSON,
+        help=(
+            f"optional output format: JSON array of trips, '{OUTPUT_NDJSON}' "
+            f"which streams trips as they are found or '{OUTPUT_JSON_REFS}' "
+            f"object of trips referencing flights by id and flights (default: "
+            f"{OUTPUT_JSON})"
+        ),
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        default=False,
+        help="optional non-indented JSON output without whitespace",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=0,
+        help=f"optional maximum number of '{OUTPUT_NDJSON}' streamed trips",
+    )
+    parser.add_argument(
+        "--cheapest_first",
+        action="store_true",
+        default=False,
+        help=f"optional '{OUTPUT_NDJSON}' streaming of cheaper trips first",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=FlightQuery.ENGINES,
+        default=FlightQuery.ENGINE_BFS,
+        help=(
+            f"optional search engine of all trips: breadth first search, "
+            f"'{FlightQuery.ENGINE_BIDIRECTIONAL}' meet-in-the-middle search, "
+            f"faster for dense networks and more stops, "
+            f"'{FlightQuery.ENGINE_VECTORIZED}' breadth first search checking "
+            f"flights from a stop at once using NumPy (if installed), faster for "
+            f"hub airports, or '{FlightQuery.ENGINE_DFS}' depth first search "
+            f"with memory bound by the number of stops "
+            f"(default: {FlightQuery.ENGINE_BFS})"
+        ),
+    )
+    parser.add_argument(
+        "--verify_snapshot",
+        action="store_true",
+        default=False,
+        help="optional snapshot staleness check using source checksum",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        default=False,
+        help=(
+            "optional search stats (load and search times, expanded, rejected "
+            "and pruned trips, peak queue size and memory) printed as JSON to stderr"
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=False,
+        help=(
+            f"optional cProfile of the search, top {PROFILE_ENTRIES} functions "
+            f"(by cumulative time) printed to stderr, implies --stats"
+        ),
+    )
+    args = parser.parse_args(argv)
 
     query = FlightQuery().init(args)
     query.validate()
 
-    dataset = FlightDataset(args.dataset_path).load()
+    stats: Optional[FlightSearchStats] = None
+    if args.stats or args.profile:
+        stats = FlightSearchStats()
+
+    with FlightSearchStats.timer(stats, FlightSearchStats.TIME_LOAD):
+        dataset = FlightDataset(args.dataset_path).load(
+            verify_snapshot=args.verify_snapshot, query=query
+        )
     dataset.validate(query)
 
     flight_oracle = FlightOracle(dataset)
-    result: FlightSearchResult = flight_oracle.find_flights(query)
-    print(result.to_json())
+    profile: Optional[cProfile.Profile] = cProfile.Profile() if args.profile else None
+    if profile is not None:
+        profile.enable()
+    result: Optional[FlightSearchResult] = None
+    if args.output == OUTPUT_NDJSON:
+        with FlightSearchStats.timer(stats, FlightSearchStats.TIME_SEARCH):
+            FlightSearchResult.write_ndjson(
+                flight_oracle.iter_flights(
+                    query,
+                    limit=args.limit,
+                    cheapest_first=args.cheapest_first,
+                    stats=stats,
+                )
+            )
+    else:
+        result = flight_oracle.find_flights(query, stats)
+    if profile is not None:
+        profile.disable()
+
+    if result is not None:
+        FlightSearchResult.write_json(
+            result.trips,
+            sys.stdout,
+            compact=args.compact,
+            flight_refs=args.output == OUTPUT_JSON_REFS,
+        )
+        sys.stdout.write("\n")
+        if result.truncated:
+            print(
+                "WARNING: search limit was hit - trips are truncated", file=sys.stderr
+            )
+    if stats is not None:
+        print(stats.to_json(), file=sys.stderr)
+    if profile is not None:
+        pstats.Stats(profile, stream=sys.stderr).sort_stats(
+            pstats.SortKey.CUMULATIVE
+        ).print_stats(PROFILE_ENTRIES)
     return result
 
 
 if __name__ == "__main__":
-    print(main().to_json())
+    main()
@@ -5,6 +5,11 @@
 #   pytest tests/test_kiwi.py
 #   pytest -s -vvv tests/test_kiwi.py::test_query
 #
+import asyncio
+import concurrent.futures
+import io
+import json
+
 import pytest
 
 import solution
@@ -25,6 +30,62 @@ def test_negative_invalid_src_dst():
         dataset.validate(solution.FlightQuery(origin="WIW", destination="INVALID"))
 
 
+def test_columnar_dataset():
+    # GIVEN
+    dataset = solution.FlightDataset("datasets/exampleSerialization.csv")
+
+    # WHEN
+    dataset.load()
+
+    # THEN
+    assert len(dataset) == 3
+    assert dataset.airports == ["BTW", "WTF", "REJ"]
+    assert list(dataset.origin) == [0, 1, 0]
+    assert list(dataset.destination) == [1, 2, 2]
+    # flights by origin are sorted by departure
+    assert list(dataset.dg_edges_by_src[0]) == [2, 0]
+    # flights by destination are sorted by arrival
+    assert list(dataset.dg_edges_by_dst[2]) == [2, 1]
+    assert list(dataset.flights_to(2, latest=1630530300)) == [2]
+    assert dataset.flight_seconds(0) == 2 * 3600 + 30 * 60
+    # not padded datetime is serialized as it was loaded
+    assert dataset.flight_to_dict(0)["arrival"] == "2021-09-02T8:20:00"
+    assert dataset.flight_to_dict(1) == {
+        "flight_no": "VJ832",
+        "origin": "WTF",
+        "destination": "REJ",
+        "departure": "2021-09-02T11:05:00",
+        "arrival": "2021-09-02T12:45:00",
+        "base_price": 31.0,
+        "bag_price": 5.0,
+        "bags_allowed": 1,
+    }
+
+
+def test_flights_from_departure_window():
+    # GIVEN
+    dataset = solution.FlightDataset("datasets/example3.csv").load()
+    airport = dataset.airport_id("WUE")
+    earliest = solution.FlightDataset.to_epoch("2021-09-02T10:00:00")
+    latest = solution.FlightDataset.to_epoch("2021-09-02T16:00:00")
+
+    # WHEN
+    flights = dataset.flights_from(airport, earliest, latest)
+
+    # THEN
+    expected = [
+        f
+        for f in dataset.dg_edges_by_src[airport]
+        if earliest <= dataset.departure[f] <= latest
+    ]
+    assert expected
+    assert list(flights) == expected
+    departures = [dataset.departure[f] for f in dataset.dg_edges_by_src[airport]]
+    assert departures == sorted(departures)
+    assert list(dataset.flights_from(airport)) == list(dataset.dg_edges_by_src[airport])
+    assert not dataset.flights_from(dataset.airport_id("UNKNOWN"))
+
+
 TASK_SERIALIZATION_EXAMPLE = """[
     {
         "flights": [
@@ -341,3 +402,1289 @@ def test_max_price(
     # max price
     for t in result.trips:
         assert t.total_price <= max_price
+
+
+@pytest.mark.parametrize(
+    "dataset_path,origin,destination,bags,return_ticket",
+    [
+        ("datasets/example3.csv", "WUE", "NNB", 1, False),
+        ("datasets/example0.csv", "WIW", "RFZ", 1, True),
+    ],
+)
+def test_iter_flights(dataset_path, origin, destination, bags, return_ticket):
+    #
+    # GIVEN
+    #
+    query = solution.FlightQuery(
+        origin=origin,
+        destination=destination,
+        bags_count=bags,
+        return_ticket=return_ticket,
+    )
+    query.validate()
+    flight_oracle = solution.FlightOracle(solution.FlightDataset(dataset_path).load())
+    expected = flight_oracle.find_flights(query)
+
+    #
+    # WHEN
+    #
+    trips = list(flight_oracle.iter_flights(query))
+    cheapest_trips = list(flight_oracle.iter_flights(query, cheapest_first=True))
+    limited_trips = list(flight_oracle.iter_flights(query, limit=2))
+
+    #
+    # THEN
+    #
+    expected_flights = sorted(t.flights for t in expected.trips)
+    assert sorted(t.flights for t in trips) == expected_flights
+    assert sorted(t.flights for t in cheapest_trips) == expected_flights
+    assert all(t.travel_time for t in trips)
+    prices = [t.total_price for t in cheapest_trips]
+    assert prices == sorted(prices)
+    assert len(limited_trips) == 2
+
+
+def test_write_ndjson():
+    # GIVEN
+    query = solution.FlightQuery(origin="BTW", destination="REJ", bags_count=1)
+    flight_oracle = solution.FlightOracle(
+        solution.FlightDataset("datasets/exampleSerialization.csv").load()
+    )
+    out = io.StringIO()
+
+    # WHEN
+    count = solution.FlightSearchResult.write_ndjson(
+        flight_oracle.iter_flights(query, cheapest_first=True), out
+    )
+
+    # THEN
+    lines = out.getvalue().splitlines()
+    assert count == len(lines) == 2
+    assert [json.loads(line) for line in lines] == json.loads(
+        TASK_SERIALIZATION_EXAMPLE
+    )
+
+
+@pytest.mark.parametrize(
+    "origin,destination,top_k,return_ticket",
+    [
+        ("WUE", "NNB", 3, False),
+        ("VVH", "ZRW", 1, False),
+        ("WUE", "NNB", 3, True),
+        ("EZO", "NNB", 7, True),
+    ],
+)
+def test_iter_flights_top_k(origin, destination, top_k, return_ticket):
+    # GIVEN
+    query = solution.FlightQuery(
+        origin=origin,
+        destination=destination,
+        max_stops=2,
+        top_k=top_k,
+        return_ticket=return_ticket,
+    )
+    flight_oracle = solution.FlightOracle(
+        solution.FlightDataset("datasets/example3.csv").load()
+    )
+    expected = [t.total_price for t in flight_oracle.find_flights(query).trips]
+    out = io.StringIO()
+
+    # WHEN
+    trips = list(flight_oracle.iter_flights(query))
+    count = solution.FlightSearchResult.write_ndjson(
+        flight_oracle.iter_flights(query, limit=top_k + 1), out
+    )
+
+    # THEN
+    assert 0 < len(expected) <= top_k
+    assert [t.total_price for t in trips] == expected
+    assert count == len(expected)
+    assert [
+        json.loads(line)["total_price"] for line in out.getvalue().splitlines()
+    ] == expected
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_write_json(compact):
+    # GIVEN
+    query = solution.FlightQuery(
+        origin="WUE", destination="NNB", max_stops=1, return_ticket=True
+    )
+    result = solution.FlightOracle(
+        solution.FlightDataset("datasets/example3.csv").load()
+    ).find_flights(query)
+    out, refs_out = io.StringIO(), io.StringIO()
+
+    # WHEN
+    count = solution.FlightSearchResult.write_json(result.trips, out, compact)
+    solution.FlightSearchResult.write_json(
+        iter(result.trips), refs_out, compact, flight_refs=True
+    )
+
+    # THEN
+    assert count == len(result.trips) > 0
+    assert out.getvalue() == (
+        json.dumps(result.to_dict(), separators=(",", ":"))
+        if compact
+        else json.dumps(result.to_dict(), indent=4)
+    )
+    refs = json.loads(refs_out.getvalue())
+    assert len(refs["flights"]) < sum(len(t["flights"]) for t in refs["trips"])
+    assert [
+        dict(t, flights=[refs["flights"][str(f)] for f in t["flights"]])
+        for t in refs["trips"]
+    ] == result.to_dict()
+    assert solution.FlightSearchResult().to_json(compact, flight_refs=True) == (
+        '{"trips":[],"flights":{}}'
+        if compact
+        else '{\n    "trips": [],\n    "flights": {}\n}'
+    )
+
+
+@pytest.mark.parametrize(
+    "dataset_path,bags,return_ticket,max_price,top_k",
+    [
+        ("datasets/example2.csv", 0, False, 0.0, 3),
+        ("datasets/example3.csv", 1, False, 0.0, 5),
+        ("datasets/example3.csv", 2, False, 300.0, 1),
+        ("datasets/example0.csv", 1, True, 0.0, 4),
+    ],
+)
+def test_top_k(dataset_path, bags, return_ticket, max_price, top_k):
+    #
+    # GIVEN
+    #
+    dataset = solution.FlightDataset(dataset_path).load()
+    flight_oracle = solution.FlightOracle(dataset)
+    airports = sorted(dataset.srcs & dataset.dsts)[:6]
+
+    for origin in airports:
+        for destination in airports:
+            if origin == destination:
+                continue
+            query = solution.FlightQuery(
+                origin=origin,
+                destination=destination,
+                bags_count=bags,
+                return_ticket=return_ticket,
+                max_price=max_price,
+            )
+            # full enumeration is the oracle
+            expected = flight_oracle.find_flights(query)
+
+            #
+            # WHEN
+            #
+            query.top_k = top_k
+            query.validate()
+            result = flight_oracle.find_flights(query)
+
+            #
+            # THEN
+            #
+            assert [t.total_price for t in result.trips] == [
+                t.total_price for t in expected.trips[:top_k]
+            ]
+
+
+@pytest.mark.parametrize("time_ordered", [False, True])
+@pytest.mark.parametrize(
+    "dataset_path,origin,destination,bags",
+    [
+        ("datasets/example0.csv", "WIW", "RFZ", 1),
+        ("datasets/example3.csv", "WUE", "JBN", 1),
+    ],
+)
+def test_return_trips(
+    monkeypatch, dataset_path, origin, destination, bags, time_ordered
+):
+    #
+    # GIVEN
+    #
+    monkeypatch.setattr(solution, "OPT_TIME_ORDERED_RETURN_TRIP", time_ordered)
+    dataset = solution.FlightDataset(dataset_path).load()
+    flight_oracle = solution.FlightOracle(dataset)
+    query = solution.FlightQuery(
+        origin=origin, destination=destination, bags_count=bags, return_ticket=True
+    )
+    query.validate()
+    there = flight_oracle.find_flights(
+        solution.FlightQuery(origin=origin, destination=destination, bags_count=bags)
+    ).trips
+    back = flight_oracle.find_flights(query.reversed()).trips
+    # cartesian product is the oracle
+    expected = sorted(
+        (t.total_price + b.total_price, t.flights + b.flights)
+        for t in there
+        for b in back
+        if not time_ordered or t.arrival() < b.departure()
+    )
+
+    #
+    # WHEN
+    #
+    result = flight_oracle.find_flights(query)
+    query.top_k = 5
+    top_k_result = flight_oracle.find_flights(query)
+
+    #
+    # THEN
+    #
+    assert expected
+    assert sorted((t.total_price, t.flights) for t in result.trips) == expected
+    for t in result.trips:
+        stops = [dataset.airports[dataset.origin[f]] for f in t.flights]
+        assert stops[0] == origin
+        assert destination in stops
+        assert dataset.airports[dataset.destination[t.flights[-1]]] == origin
+    assert [t.total_price for t in top_k_result.trips] == [
+        price for price, _ in expected[:5]
+    ]
+
+
+def test_snapshot(tmp_path):
+    #
+    # GIVEN
+    #
+    dataset_path = tmp_path / "example3.csv"
+    dataset_path.write_text(open("datasets/example3.csv").read())
+    snapshot_path = str(tmp_path / "example3.kiwi")
+    csv_dataset = solution.FlightDataset(str(dataset_path)).load()
+
+    #
+    # WHEN
+    #
+    solution.main([solution.CMD_COMPILE, str(dataset_path), "-o", snapshot_path])
+    dataset = solution.FlightDataset(snapshot_path).load(verify_snapshot=True)
+
+    #
+    # THEN
+    #
+    assert solution.FlightDataset.is_snapshot(snapshot_path)
+    assert not solution.FlightDataset.is_snapshot(str(dataset_path))
+    assert len(dataset) == len(csv_dataset)
+    assert dataset.srcs == csv_dataset.srcs
+    assert dataset.dsts == csv_dataset.dsts
+    assert [dataset.flight_to_dict(f) for f in range(len(dataset))] == [
+        csv_dataset.flight_to_dict(f) for f in range(len(csv_dataset))
+    ]
+    query = solution.FlightQuery(origin="WUE", destination="NNB", bags_count=1)
+    assert (
+        solution.FlightOracle(dataset).find_flights(query).to_json()
+        == solution.FlightOracle(csv_dataset).find_flights(query).to_json()
+    )
+
+    # stale snapshot
+    dataset_path.write_text(open("datasets/example0.csv").read())
+    with pytest.raises(ValueError):
+        solution.FlightDataset(snapshot_path).load()
+
+
+def test_snapshot_serialization(tmp_path):
+    # GIVEN
+    snapshot_path = str(tmp_path / "serialization.kiwi")
+    query = solution.FlightQuery(origin="BTW", destination="REJ", bags_count=1)
+    solution.FlightDataset("datasets/exampleSerialization.csv").load().save_snapshot(
+        snapshot_path
+    )
+
+    # WHEN
+    flight_oracle = solution.FlightOracle(solution.FlightDataset(snapshot_path).load())
+
+    # THEN
+    assert flight_oracle.find_flights(query).to_json() == TASK_SERIALIZATION_EXAMPLE
+
+
+def test_query_from_dict():
+    # GIVEN
+    data = {
+        "origin": "RFZ",
+        "destination": "WIW",
+        "return_ticket": True,
+        "max_stops": 1,
+        "max_price": 300,
+    }
+
+    # WHEN
+    query = solution.FlightQuery().init_from_dict(data)
+
+    # THEN
+    assert query.return_ticket is True
+    assert query.max_stops == 1
+    assert query.max_price == 300.0 and isinstance(query.max_price, float)
+    # values are not coerced
+    for name, value in (
+        ("return_ticket", "false"),
+        ("max_stops", 1.9),
+        ("max_stops", True),
+        ("bags_count", "1"),
+        ("origin", 42),
+        ("max_price", "100"),
+        ("max_price", 1e400),
+    ):
+        with pytest.raises(ValueError, match=name):
+            solution.FlightQuery().init_from_dict(dict(data, **{name: value}))
+
+
+def test_server():
+    #
+    # GIVEN
+    #
+    server = solution.FlightServer("datasets/example3.csv", workers=2, processes=False)
+    query = {"origin": "WUE", "destination": "NNB", "bags_count": 1, "top_k": 3}
+    expected = (
+        solution.FlightOracle(solution.FlightDataset("datasets/example3.csv").load())
+        .find_flights(solution.FlightQuery().init_from_dict(query))
+        .to_dict()
+    )
+
+    async def request(lines):
+        tcp_server = await server.start("127.0.0.1", 0)
+        port = tcp_server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for line in lines:
+            if not isinstance(line, bytes):
+                line = json.dumps(line).encode("utf-8")
+            writer.write(line + b"\n")
+        writer.write_eof()
+        responses = [json.loads(line) async for line in reader]
+        writer.close()
+        tcp_server.close()
+        await tcp_server.wait_closed()
+        return {r["id"]: r for r in responses}
+
+    #
+    # WHEN
+    #
+    try:
+        responses = asyncio.run(
+            request(
+                [
+                    dict(query, id=1),
+                    {"id": 2, "origin": "INVALID", "destination": "NNB"},
+                    {"id": 3, "unknown": 42},
+                    b'{"id": 4, "origin": "WUE", "destination": "NNB", '
+                    b'"max_stops": 1e400}',
+                    b'{"id": 5, "origin": "\xff"}',
+                    dict(query, id=6),
+                ]
+            )
+        )
+    finally:
+        server.shutdown()
+
+    #
+    # THEN every request gets a reply
+    #
+    assert responses[1]["trips"] == expected
+    assert "error" in responses[2]
+    assert "error" in responses[3]
+    assert "max_stops" in responses[4]["error"]
+    # not UTF-8 request has no id
+    assert "error" in responses[None]
+    assert responses[6]["trips"] == expected
+
+
+@pytest.mark.parametrize(
+    "dataset_path",
+    [
+        "datasets/example0.csv",
+        "datasets/example3.csv",
+        "datasets/exampleSerialization.csv",
+    ],
+)
+def test_fast_csv_loader(dataset_path):
+    # GIVEN
+    expected = solution.FlightDataset(dataset_path).load(fast=False)
+
+    # WHEN
+    dataset = solution.FlightDataset(dataset_path).load()
+
+    # THEN
+    for column in solution.FlightDataset.SNAPSHOT_COLUMNS:
+        assert getattr(dataset, column) == getattr(expected, column)
+    assert dataset.airports == expected.airports
+    assert dataset.flight_nos == expected.flight_nos
+    assert dataset.raw_departure == expected.raw_departure
+    assert dataset.raw_arrival == expected.raw_arrival
+    assert dataset.srcs == expected.srcs
+    assert dataset.dsts == expected.dsts
+    assert dataset.dg_edges_by_src == expected.dg_edges_by_src
+    assert dataset.dg_edges_by_dst == expected.dg_edges_by_dst
+    assert dataset.dg_departures_by_src == expected.dg_departures_by_src
+
+
+def test_fast_csv_loader_quotes_and_columns(tmp_path):
+    # GIVEN
+    dataset_path = tmp_path / "quoted.csv"
+    dataset_path.write_text(
+        "origin,destination,flight_no,departure,arrival,base_price,bag_price,"
+        "bags_allowed\n"
+        'WIW,ECV,"ZH151",2021-09-01T07:25:00,2021-09-01T12:35:00,245.0,12,2\n'
+        "\n"
+    )
+    invalid_path = tmp_path / "invalid.csv"
+    invalid_path.write_text("flight_no,origin\nZH151,WIW\n")
+
+    # WHEN
+    dataset = solution.FlightDataset(str(dataset_path)).load()
+
+    # THEN
+    assert len(dataset) == 1
+    assert dataset.flight_to_dict(0)["flight_no"] == "ZH151"
+    assert dataset.flight_to_dict(0)["origin"] == "WIW"
+    assert dataset.flight_seconds(0) == 5 * 3600 + 10 * 60
+    with pytest.raises(ValueError):
+        solution.FlightDataset(str(invalid_path)).load()
+
+
+def test_batch(tmp_path, monkeypatch):
+    #
+    # GIVEN
+    #
+    queries = [
+        {"id": "a", "origin": "WUE", "destination": "NNB", "bags_count": 1},
+        {"id": "b", "origin": "RFZ", "destination": "WIW", "return_ticket": True},
+        {"id": "c", "origin": "WUE", "destination": "INVALID"},
+        {"id": "d", "origin": "VVH", "destination": "ZRW", "max_stops": 2},
+        {"id": "e", "origin": "WUE", "destination": "NNB", "max_stops": 1e400},
+        {"id": "f", "origin": "WUE", "destination": "NNB", "max_price": 10**400},
+        {"id": "g", "origin": "VVH", "destination": "ZRW", "max_stops": 1},
+    ]
+    queries_path = tmp_path / "queries.jsonl"
+    queries_path.write_text("\n".join(json.dumps(q) for q in queries) + "\n\n")
+    results_path = tmp_path / "results.jsonl"
+    flight_oracle = solution.FlightOracle(
+        solution.FlightDataset("datasets/example3.csv").load()
+    )
+
+    #
+    # WHEN
+    #
+    count = solution.main_batch(
+        [
+            "datasets/example3.csv",
+            str(queries_path),
+            "-o",
+            str(results_path),
+            "--workers",
+            "2",
+        ]
+    )
+
+    #
+    # THEN
+    #
+    results = [json.loads(line) for line in results_path.read_text().splitlines()]
+    assert count == len(queries)
+    assert [r["id"] for r in results] == [q["id"] for q in queries]
+    assert [i for i, r in enumerate(results) if "error" in r] == [1, 2, 4, 5]
+    for query, result in zip(queries, results):
+        if "error" not in result:
+            query = dict(query)
+            del query["id"]
+            expected = flight_oracle.find_flights(
+                solution.FlightQuery().init_from_dict(query)
+            )
+            assert result["trips"] == expected.to_dict()
+
+    # unexpected failure of a search is error result of the query
+    def overflow(request):
+        raise OverflowError("cannot convert float infinity to integer")
+
+    monkeypatch.setattr(solution, "_search_worker", overflow)
+    assert json.loads(solution._batch_worker(json.dumps(queries[0]))) == {
+        "error": "cannot convert float infinity to integer",
+        "id": "a",
+    }
+
+
+@pytest.mark.parametrize("max_bytes", [256 * 2**20, 64 * 2**10])
+def test_sub_route_cache(max_bytes):
+    #
+    # GIVEN
+    #
+    dataset = solution.FlightDataset("datasets/example3.csv").load()
+    flight_oracle = solution.FlightOracle(dataset)
+    cache = solution.SubRouteCache(max_bytes=max_bytes)
+    cached_flight_oracle = solution.FlightOracle(dataset, cache=cache)
+    queries = [
+        solution.FlightQuery(origin="WUE", destination="NNB", bags_count=1),
+        solution.FlightQuery(origin="VVH", destination="NNB", bags_count=1),
+        solution.FlightQuery(origin="VVH", destination="ZRW", max_stops=2),
+        solution.FlightQuery(origin="EZO", destination="NNB", max_price=150.0),
+        solution.FlightQuery(origin="WUE", destination="NNB", return_ticket=True),
+    ]
+
+    for query in queries + queries:
+        #
+        # WHEN
+        #
+        result = cached_flight_oracle.find_flights(query)
+
+        #
+        # THEN
+        #
+        expected = flight_oracle.find_flights(query)
+        assert sorted(
+            (t.total_price, t.flights, t.travel_time) for t in result.trips
+        ) == sorted((t.total_price, t.flights, t.travel_time) for t in expected.trips)
+
+    stats = cache.stats()
+    assert stats["hits"] > 0
+    assert stats["bytes"] <= max_bytes
+    if max_bytes < 2**20:
+        assert stats["evictions"] > 0
+
+
+def test_shared_caches_threads():
+    # GIVEN oracle (sub-route cache and reachability indices) shared by threads
+    dataset = solution.FlightDataset("datasets/example3.csv").load()
+    cache = solution.SubRouteCache(max_bytes=256 * 2**10)
+    flight_oracle = solution.FlightOracle(dataset, cache=cache)
+    airports = sorted(dataset.srcs)
+    queries = [
+        solution.FlightQuery(origin=origin, destination=destination, max_stops=2)
+        for origin, destination in zip(airports, airports[1:] + airports[:1])
+    ] * 4
+
+    def search(oracle, query):
+        return sorted(
+            (t.total_price, t.flights, t.travel_time)
+            for t in oracle.find_flights(query).trips
+        )
+
+    expected = [search(solution.FlightOracle(dataset), q) for q in queries]
+
+    # WHEN
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda q: search(flight_oracle, q), queries))
+
+    # THEN
+    assert results == expected
+    assert cache.bytes == sum(size for _, size in cache.entries.values())
+    assert cache.bytes <= cache.max_bytes
+
+
+@pytest.mark.parametrize("max_stops", [1, 2, 3, 0])
+def test_bidirectional_search(max_stops):
+    # GIVEN
+    dataset = solution.FlightDataset("datasets/example3.csv").load()
+    flight_oracle = solution.FlightOracle(dataset)
+    airports = sorted(dataset.srcs)
+
+    for origin, destination in zip(airports, airports[1:] + airports[:1]):
+        for bags_count, max_price in ((0, 0.0), (1, 0.0), (2, 300.0)):
+            query = solution.FlightQuery(
+                origin=origin,
+                destination=destination,
+                bags_count=bags_count,
+                max_stops=max_stops,
+                max_price=max_price,
+                engine=solution.FlightQuery.ENGINE_BIDIRECTIONAL,
+            )
+
+            # WHEN
+            result = flight_oracle.find_flights(query)
+
+            # THEN
+            query.engine = solution.FlightQuery.ENGINE_BFS
+            expected = flight_oracle.find_flights(query)
+            assert sorted(
+                (t.total_price, t.flights, t.travel_time) for t in result.trips
+            ) == sorted(
+                (t.total_price, t.flights, t.travel_time) for t in expected.trips
+            )
+
+
+@pytest.mark.parametrize("pruning", [True, False])
+def test_vectorized_engine(monkeypatch, pruning):
+    # GIVEN (pure Python fallback if NumPy is not installed)
+    monkeypatch.setattr(solution, "OPT_REACHABILITY_PRUNING", pruning)
+    monkeypatch.setattr(solution.FlightOracle, "VECTORIZED_MIN_FLIGHTS", 1)
+    flight_oracle = solution.FlightOracle(
+        solution.FlightDataset("datasets/example3.csv").load()
+    )
+    queries = [
+        solution.FlightQuery(origin="WUE", destination="NNB", max_stops=2),
+        solution.FlightQuery(origin="VVH", destination="ZRW", bags_count=1),
+        solution.FlightQuery(origin="EZO", destination="NNB", max_price=150.0),
+        solution.FlightQuery(origin="WUE", destination="NNB", return_ticket=True),
+        solution.FlightQuery(origin="VVH", destination="ZRW", bags_count=2, top_k=3),
+    ]
+
+    for query in queries:
+        # WHEN
+        query.engine = solution.FlightQuery.ENGINE_VECTORIZED
+        stats = solution.FlightSearchStats()
+        result = flight_oracle.find_flights(query, stats)
+
+        # THEN
+        query.engine = solution.FlightQuery.ENGINE_BFS
+        expected_stats = solution.FlightSearchStats()
+        expected = flight_oracle.find_flights(query, expected_stats)
+        assert result.to_json() == expected.to_json()
+        assert stats.rejected == expected_stats.rejected
+        assert stats.pruned == expected_stats.pruned
+
+
+@pytest.mark.parametrize("max_stops", [0, 1, 3])
+def test_dfs_engine(max_stops):
+    # GIVEN
+    flight_oracle = solution.FlightOracle(
+        solution.FlightDataset("datasets/example3.csv").load()
+    )
+    queries = [
+        solution.FlightQuery(origin="WUE", destination="NNB", max_stops=max_stops),
+        solution.FlightQuery(
+            origin="VVH", destination="ZRW", bags_count=1, max_stops=max_stops
+        ),
+        solution.FlightQuery(
+            origin="EZO", destination="NNB", max_price=150.0, max_stops=max_stops
+        ),
+        solution.FlightQuery(
+            origin="WUE", destination="NNB", return_ticket=True, max_stops=max_stops
+        ),
+    ]
+
+    for query in queries:
+        # WHEN
+        query.engine = solution.FlightQuery.ENGINE_DFS
+        stats = solution.FlightSearchStats()
+        result = flight_oracle.find_flights(query, stats)
+
+        # THEN same trips (and prices) as breadth first search finds - trips of
+        # the same price are in depth first order
+        query.engine = solution.FlightQuery.ENGINE_BFS
+        expected_stats = solution.FlightSearchStats()
+        expected = flight_oracle.find_flights(query, expected_stats)
+        assert sorted(
+            (t.total_price, t.flights, t.bags_allowed, t.travel_time)
+            for t in result.trips
+        ) == sorted(
+            (t.total_price, t.flights, t.bags_allowed, t.travel_time)
+            for t in expected.trips
+        )
+        assert stats.found == expected_stats.found
+        # only the path (flight iterator per stop) is held
+        assert stats.peak_queue <= (max_stops + 1 if max_stops else 42)
+
+    # path is restored by backtracking
+    dataset = flight_oracle.dataset
+    path = solution.TripPath(dataset, "WUE", "NNB", 1)
+    flights = dataset.flights_from(dataset.airport_id("WUE"))
+    path.push(flights[0])
+    state = (path.total_price, path.travel_secs, path.bags_allowed, path.stop)
+    path.push(dataset.flights_from(path.stop)[-1])
+    path.pop()
+    assert (path.total_price, path.travel_secs, path.bags_allowed, path.stop) == state
+    trip = solution.Trip(dataset, "WUE", "NNB", 1).extend(flights[0])
+    trip.release()
+    assert path.to_trip().to_dict() == trip.to_dict()
+    path.pop()
+    assert path.length == 0 and not path.visits(dataset.destination[flights[0]])
+
+
+@pytest.mark.parametrize(
+    "dataset_path,origin,destination,max_stops,return_ticket",
+    [
+        ("datasets/example3.csv", "WUE", "NNB", 0, False),
+        ("datasets/example3.csv", "VVH", "ZRW", 2, False),
+        ("datasets/example3.csv", "EZO", "NNB", 3, True),
+        ("datasets/example1.csv", "DHE", "NIZ", 0, True),
+    ],
+)
+def test_pareto_search(dataset_path, origin, destination, max_stops, return_ticket):
+    # GIVEN
+    dataset = solution.FlightDataset(dataset_path).load()
+    flight_oracle = solution.FlightOracle(dataset)
+    query = solution.FlightQuery(
+        origin=origin,
+        destination=destination,
+        max_stops=max_stops,
+        return_ticket=return_ticket,
+    )
+
+    def duration(flights):
+        # flights and layovers of "there" and back trip (not the stay between)
+        secs = 0
+        for previous, flight in zip([None] + flights, flights):
+            secs += dataset.arrival[flight] - dataset.departure[flight]
+            if previous is not None and dataset.origin[flight] != dataset.airport_id(
+                destination
+            ):
+                secs += dataset.departure[flight] - dataset.arrival[previous]
+        return secs
+
+    # brute force front of all trips
+    expected = []
+    for price, secs in sorted(
+        (t.total_price, duration(t.flights))
+        for t in flight_oracle.find_flights(query).trips
+    ):
+        if not expected or secs < expected[-1][1]:
+            expected.append((price, secs))
+    stats = solution.FlightSearchStats()
+
+    # WHEN
+    query.pareto = True
+    result = flight_oracle.find_flights(query, stats)
+
+    # THEN
+    assert 0 < len(result.trips) == len(expected)
+    assert [(t.total_price, duration(t.flights)) for t in result.trips] == expected
+    assert [t.duration_secs for t in result.trips] == [s for _, s in expected]
+    assert stats.pruned[solution.FlightSearchStats.PRUNED_DOMINATED] > 0
+    assert [t.flights for t in flight_oracle.iter_flights(query)] == [
+        t.flights for t in result.trips
+    ]
+
+
+@pytest.mark.parametrize(
+    "origin,destination,top_k,return_ticket",
+    [
+        ("WUE,VVH", "NNB,ZRW", 0, False),
+        ("WUE,VVH,EZO", "NNB,ZRW", 2, False),
+        ("WUE", "NNB,ZRW", 0, True),
+        ("WUE,VVH", "*", 0, False),
+        ("EZO", "*", 3, False),
+    ],
+)
+def test_multi_airports(origin, destination, top_k, return_ticket):
+    # GIVEN
+    dataset = solution.FlightDataset("datasets/example3.csv").load()
+    flight_oracle = solution.FlightOracle(dataset)
+    query = solution.FlightQuery(
+        origin=origin,
+        destination=destination,
+        max_stops=2,
+        top_k=top_k,
+        return_ticket=return_ticket,
+    )
+    query.validate()
+    dataset.validate(query)
+    expected = []
+    for o in query.origins():
+        for d in query.destinations() or sorted(dataset.dsts):
+            if o != d:
+                expected.extend(
+                    flight_oracle.find_flights(
+                        solution.FlightQuery(
+                            origin=o,
+                            destination=d,
+                            max_stops=2,
+                            top_k=top_k or (1 if query.is_anywhere() else 0),
+                            return_ticket=return_ticket,
+                        )
+                    ).trips
+                )
+    stats = solution.FlightSearchStats()
+
+    # WHEN
+    result = flight_oracle.find_flights(query, stats)
+
+    # THEN
+    assert query.is_multi()
+    assert len(result.trips) == len(expected) > 0
+    assert sorted((t.origin, t.destination, t.total_price) for t in result.trips) == (
+        sorted((t.origin, t.destination, t.total_price) for t in expected)
+    )
+    if not top_k and not query.is_anywhere():
+        assert sorted(t.flights for t in result.trips) == sorted(
+            t.flights for t in expected
+        )
+    assert stats.found > 0
+
+
+def test_multi_airports_validation():
+    for origin, destination, return_ticket in (
+        ("*", "NNB", False),
+        ("WUE", "*", True),
+        (",", "NNB", False),
+    ):
+        with pytest.raises(ValueError):
+            solution.FlightQuery(
+                origin=origin, destination=destination, return_ticket=return_ticket
+            ).validate()
+    with pytest.raises(ValueError):
+        dataset = solution.FlightDataset("datasets/example3.csv").load()
+        dataset.validate(solution.FlightQuery(origin="WUE,INVALID", destination="NNB"))
+
+
+@pytest.mark.parametrize(
+    "return_ticket,max_price,top_k",
+    [(False, 0, 0), (False, 150, 0), (True, 0, 0), (False, 0, 3)],
+)
+def test_all_bags(return_ticket, max_price, top_k):
+    # GIVEN
+    flight_oracle = solution.FlightOracle(
+        solution.FlightDataset("datasets/example2.csv").load()
+    )
+    query = solution.FlightQuery(
+        origin="GXV",
+        destination="YOT",
+        bags_count=2,
+        return_ticket=return_ticket,
+        max_price=max_price,
+        top_k=top_k,
+    )
+    expected = [
+        flight_oracle.find_flights(
+            solution.FlightQuery(
+                origin="GXV",
+                destination="YOT",
+                bags_count=bags_count,
+                return_ticket=return_ticket,
+                max_price=max_price,
+                top_k=top_k,
+            )
+        ).trips
+        for bags_count in range(3)
+    ]
+    stats = solution.FlightSearchStats()
+
+    # WHEN
+    results = flight_oracle.find_flights_by_bags(query, stats)
+
+    # THEN
+    assert len(results) == 3
+    for bags_count, result in enumerate(results):
+        assert [t.to_dict() for t in result.trips] == [
+            t.to_dict() for t in expected[bags_count]
+        ]
+    assert len(expected[0]) >= len(expected[2]) > 0
+    query.all_bags = True
+    assert [t.to_dict() for t in flight_oracle.find_flights(query).trips] == [
+        t.to_dict() for trips in expected for t in trips
+    ]
+    assert stats.found > 0
+
+
+@pytest.mark.parametrize("return_ticket,top_k", [(False, 0), (True, 0), (True, 3)])
+def test_find_flights_async(return_ticket, top_k):
+    # GIVEN
+    flight_oracle = solution.FlightOracle(
+        solution.FlightDataset("datasets/example3.csv").load()
+    )
+    query = solution.FlightQuery(
+        origin="WUE", destination="NNB", return_ticket=return_ticket, top_k=top_k
+    )
+    expected = flight_oracle.find_flights(query)
+    stats = solution.FlightSearchStats()
+    ticks = 0
+
+    async def search(**kwargs):
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticker_task = asyncio.create_task(ticker())
+        try:
+            return await flight_oracle.find_flights_async(query, **kwargs)
+        finally:
+            ticker_task.cancel()
+
+    # WHEN
+    result = asyncio.run(search(stats=stats, yield_every=10))
+
+    # THEN
+    assert not result.truncated
+    assert [t.to_dict() for t in result.trips] == expected.to_dict()
+    assert result.stats is stats and stats.expanded > 0
+    # other tasks run while searching
+    assert ticks > stats.expanded // 10 // 2
+    # expansion budget and deadline
+    truncated = asyncio.run(search(max_expanded=20, yield_every=10))
+    assert truncated.truncated
+    assert len(truncated.trips) < len(expected.trips)
+    assert asyncio.run(search(deadline=solution.time.monotonic())).truncated
+
+
+def test_find_flights_async_cancel():
+    # GIVEN
+    flight_oracle = solution.FlightOracle(
+        solution.FlightDataset("datasets/example3.csv").load()
+    )
+    # sub-route cache (memoized search has no yield points) isn't used
+    cached_flight_oracle = solution.FlightOracle(
+        flight_oracle.dataset, cache=solution.SubRouteCache()
+    )
+    query = solution.FlightQuery(origin="WUE", destination="NNB", return_ticket=True)
+
+    async def search(oracle, stats):
+        task = asyncio.create_task(
+            oracle.find_flights_async(query, stats=stats, yield_every=1)
+        )
+        for _ in range(10):
+            await asyncio.sleep(0)
+        task.cancel()
+        await task
+
+    for oracle in (flight_oracle, cached_flight_oracle):
+        stats = solution.FlightSearchStats()
+
+        # WHEN
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(search(oracle, stats))
+
+        # THEN
+        assert 0 < stats.expanded < 20
+    assert len(cached_flight_oracle.cache) == 0
+    for unsupported in (
+        solution.FlightQuery(origin="WUE", destination="*"),
+        solution.FlightQuery(
+            origin="WUE",
+            destination="NNB",
+            engine=solution.FlightQuery.ENGINE_BIDIRECTIONAL,
+        ),
+    ):
+        with pytest.raises(ValueError):
+            asyncio.run(flight_oracle.find_flights_async(unsupported))
+
+
+def test_reachability_index():
+    # GIVEN
+    dataset = solution.FlightDataset("datasets/exampleSerialization.csv").load()
+    btw, wtf, rej = (dataset.airport_id(a) for a in ("BTW", "WTF", "REJ"))
+
+    # WHEN
+    reachability = solution.ReachabilityIndex(
+        dataset, rej, bags_count=1, min_layover_secs=3600
+    )
+
+    # THEN
+    assert list(reachability.hops) == [1, 1, 0]
+    # BTW -> WTF (arrives 8:20) -> REJ (departs 11:05)
+    assert reachability.latest_departure[btw] == dataset.to_epoch("2021-09-02T05:50:00")
+    assert reachability.latest_departure[wtf] == dataset.to_epoch("2021-09-02T11:05:00")
+    assert reachability.min_price[btw] == 67.0 + 7.0 + 31.0 + 5.0
+    # WHEN layover is too long THEN the connection doesn't reach the destination
+    reachability = solution.ReachabilityIndex(
+        dataset, rej, bags_count=1, min_layover_secs=3 * 3600
+    )
+    assert reachability.prune(0, 1, 74.0, 0, 0.0) == "time"
+    assert reachability.prune(2, 1, 227.0, 0, 0.0) is None
+
+
+def test_reachability_pruning(monkeypatch):
+    # GIVEN
+    dataset = solution.FlightDataset("datasets/example3.csv").load()
+    flight_oracle = solution.FlightOracle(dataset)
+    queries = [
+        solution.FlightQuery(origin="WUE", destination="NNB", bags_count=1),
+        solution.FlightQuery(origin="VVH", destination="ZRW", max_stops=2),
+        solution.FlightQuery(origin="EZO", destination="NNB", max_price=150.0),
+        solution.FlightQuery(origin="WUE", destination="NNB", return_ticket=True),
+        solution.FlightQuery(origin="VVH", destination="ZRW", bags_count=2, top_k=3),
+    ]
+    expanded, expected_expanded = 0, 0
+
+    for query in queries:
+        # WHEN
+        result = flight_oracle.find_flights(query, solution.FlightSearchStats())
+
+        # THEN
+        monkeypatch.setattr(solution, "OPT_REACHABILITY_PRUNING", False)
+        expected = flight_oracle.find_flights(query, solution.FlightSearchStats())
+        monkeypatch.setattr(solution, "OPT_REACHABILITY_PRUNING", True)
+        assert [(t.total_price, t.flights) for t in result.trips] == [
+            (t.total_price, t.flights) for t in expected.trips
+        ]
+        assert sum(result.stats.pruned.values()) > 0
+        assert sum(expected.stats.pruned.values()) == 0
+        assert result.stats.expanded <= expected.stats.expanded
+        expanded += result.stats.expanded
+        expected_expanded += expected.stats.expanded
+
+    assert expanded < expected_expanded
+
+
+def test_trip_parent_pointers():
+    # GIVEN
+    dataset = solution.FlightDataset("datasets/exampleSerialization.csv").load()
+    trip = solution.Trip(dataset, origin="BTW", destination="REJ", bags_count=1)
+
+    # WHEN
+    first = trip.extend(0)
+    second = first.extend(1)
+
+    # THEN partial trips share prefixes (no copies)
+    assert not hasattr(second, "__dict__")
+    assert second.parent is first and first.parent is trip
+    assert (trip.length, first.length, second.length) == (0, 1, 2)
+    assert (first.flights, second.flights) == ([0], [0, 1])
+    assert second.visits(dataset.airport_id("BTW"))
+    assert not first.visits(dataset.airport_id("REJ"))
+    assert second.total_price == 67.0 + 7.0 + 31.0 + 5.0
+    assert second.bags_allowed == 1
+    assert second.travel_secs == 2 * 3600 + 30 * 60 + 2 * 3600 + 45 * 60 + 100 * 60
+    # WHEN trip is finalized THEN flights are materialized
+    second.finalize()
+    assert second.to_dict()["travel_time"] == "6:55:00"
+    assert [f["flight_no"] for f in second.to_dict()["flights"]] == ["XC233", "VJ832"]
+
+
+def test_incremental_updates(tmp_path):
+    #
+    # GIVEN
+    #
+    with open("datasets/example3.csv") as csv_file:
+        header, *rows = csv_file.read().splitlines()
+    dataset = solution.FlightDataset("datasets/example3.csv").load()
+    flight_oracle = solution.FlightOracle(dataset)
+    queries = [
+        solution.FlightQuery(origin="WUE", destination="NNB", bags_count=1),
+        solution.FlightQuery(origin="VVH", destination="ZRW", max_stops=2),
+        solution.FlightQuery(
+            origin="WUE", destination="NNB", max_stops=1, return_ticket=True
+        ),
+    ]
+    before = [flight_oracle.find_flights(q).to_json() for q in queries]
+    snapshot = flight_oracle.snapshot()
+
+    # delta: reprice, cancel and add flights (CSV and JSON lines)
+    repriced = rows[0].split(",")
+    repriced[5] = "1.0"
+    cancelled = rows[1].split(",")
+    added = rows[2].split(",")
+    added[0], added[3], added[4] = "ZZ001", "2021-09-01T00:00:00", "2021-09-01T01:00:00"
+    (tmp_path / "delta.csv").write_text(
+        f"{header},op\n{','.join(repriced)},\n{cancelled[0]},,,{cancelled[3]},,,,,"
+        f"{solution.FlightDataset.OP_REMOVE}\n"
+    )
+    (tmp_path / "delta.jsonl").write_text(
+        json.dumps(dict(zip(header.split(","), added)))
+    )
+    expected_path = tmp_path / "expected.csv"
+    expected_path.write_text(
+        "\n".join([header, ",".join(repriced)] + rows[2:] + [",".join(added)])
+    )
+
+    #
+    # WHEN
+    #
+    assert dataset.apply_delta(str(tmp_path / "delta.csv")) == 2
+    assert dataset.apply_delta(str(tmp_path / "delta.jsonl")) == 1
+    # cancelled again
+    assert not dataset.remove_flight(cancelled[0], cancelled[3])
+
+    #
+    # THEN
+    #
+    assert dataset.version == 2
+    expected_oracle = solution.FlightOracle(
+        solution.FlightDataset(str(expected_path)).load()
+    )
+    for i, query in enumerate(queries):
+        assert (
+            flight_oracle.find_flights(query).to_json()
+            == expected_oracle.find_flights(query).to_json()
+        )
+        # snapshot taken before updates is not affected by them
+        assert snapshot.find_flights(query).to_json() == before[i]
+    assert dataset.srcs == expected_oracle.dataset.srcs
+    with pytest.raises(ValueError):
+        snapshot.dataset.upsert_flight(dict(zip(header.split(","), added)))
+
+    # WHEN delta fails partway THEN none of its rows is applied
+    added[0] = "ZZ002"
+    after = [flight_oracle.find_flights(q).to_json() for q in queries]
+    edges = {a: list(e) for a, e in dataset.dg_edges_by_src.items()}
+    invalid = dict(zip(header.split(","), added), base_price="cheap")
+    for delta in (
+        [dict(zip(header.split(","), added)), {"op": "bogus"}],
+        [dict(zip(header.split(","), added)), invalid],
+    ):
+        (tmp_path / "invalid.jsonl").write_text(
+            "\n".join(json.dumps(row) for row in delta)
+        )
+        with pytest.raises(ValueError):
+            dataset.apply_delta(str(tmp_path / "invalid.jsonl"))
+        assert dataset.version == 2
+        assert {a: list(e) for a, e in dataset.dg_edges_by_src.items()} == edges
+        assert [flight_oracle.find_flights(q).to_json() for q in queries] == after
+
+
+@pytest.mark.parametrize(
+    "departure_from,departure_to,max_stops",
+    [
+        ("2021-09-03", "2021-09-04", 1),
+        ("2021-09-10", "2021-09-10", 2),
+        ("2021-09-12", "", 0),
+    ],
+)
+def test_departure_window(tmp_path, departure_from, departure_to, max_stops):
+    #
+    # GIVEN
+    #
+    dataset = solution.FlightDataset("datasets/example3.csv").load()
+    partition_dir = dataset.save_partitions(str(tmp_path / "example3"))
+    flight_oracle = solution.FlightOracle(dataset)
+    query = solution.FlightQuery(
+        origin="WUE",
+        destination="NNB",
+        max_stops=max_stops,
+        departure_from=departure_from,
+        departure_to=departure_to,
+    )
+    query.validate()
+    earliest, latest = query.departure_window()
+    expected = [
+        t.to_dict()
+        for t in flight_oracle.find_flights(
+            solution.FlightQuery(origin="WUE", destination="NNB", max_stops=max_stops)
+        ).trips
+        if earliest <= t.departure() <= (latest or t.departure())
+    ]
+
+    for dataset_path in (partition_dir, "datasets/example3.csv"):
+        #
+        # WHEN
+        #
+        windowed_dataset = solution.FlightDataset(dataset_path).load(query=query)
+        result = solution.FlightOracle(windowed_dataset).find_flights(query)
+
+        #
+        # THEN
+        #
+        assert expected
+        assert [t.to_dict() for t in result.trips] == expected
+        assert len(windowed_dataset) < len(dataset) or not max_stops
+    # only partitions the query can use are loaded
+    first_day, last_day = query.departure_days(6 * 3600)
+    partitions = solution.FlightDataset(partition_dir).load(query=query).partitions
+    assert partitions[0] == departure_from
+    assert not last_day or partitions[-1] <= last_day
+
+
+def test_departure_window_validation():
+    with pytest.raises(ValueError):
+        solution.FlightQuery(
+            origin="WUE", destination="NNB", departure_from="2021-9-1x"
+        ).validate()
+    with pytest.raises(ValueError):
+        solution.FlightQuery(
+            origin="WUE",
+            destination="NNB",
+            departure_from="2021-09-02",
+            departure_to="2021-09-01",
+        ).validate()
+
+
+def test_search_stats(capsys):
+    # GIVEN
+    flight_oracle = solution.FlightOracle(
+        solution.FlightDataset("datasets/example3.csv").load()
+    )
+    query = solution.FlightQuery(
+        origin="WUE", destination="NNB", max_price=300.0, return_ticket=True
+    )
+    stats = solution.FlightSearchStats()
+
+    # WHEN
+    result = flight_oracle.find_flights(query, stats)
+
+    # THEN
+    assert result.stats is stats
+    assert flight_oracle.find_flights(query).stats is None
+    assert stats.expanded > 0
+    assert stats.peak_queue > 0
+    assert stats.rejected[solution.FlightSearchStats.REJECTED_CYCLE] > 0
+    assert stats.rejected[solution.FlightSearchStats.REJECTED_PRICE] > 0
+    # flights outside the layover window (skipped by binary search)
+    assert stats.rejected[solution.FlightSearchStats.REJECTED_LAYOVER] > 0
+    assert stats.times[solution.FlightSearchStats.TIME_SEARCH] > 0
+    assert stats.times[solution.FlightSearchStats.TIME_PAIRING] > 0
+    assert json.loads(stats.to_json())["stats"] == stats.to_dict()
+
+    # WHEN
+    solution.main(["datasets/example3.csv", "WUE", "NNB", "--return", "--profile"])
+
+    # THEN
+    out, err = capsys.readouterr()
+    assert json.loads(out)
+    stats_json, profile = err.split("\n}\n", 1)
+    stats_dict = json.loads(stats_json + "}")["stats"]
+    assert stats_dict["found"] > 0
+    assert stats_dict["times"][solution.FlightSearchStats.TIME_LOAD] > 0
+    assert "cumulative" in profile
+
+
+@pytest.mark.parametrize("return_ticket", [False, True])
+def test_search_limits(capsys, return_ticket):
+    # GIVEN
+    flight_oracle = solution.FlightOracle(
+        solution.FlightDataset("datasets/example3.csv").load()
+    )
+    query = solution.FlightQuery(
+        origin="WUE", destination="NNB", return_ticket=return_ticket
+    )
+    expected = sorted(t.flights for t in flight_oracle.find_flights(query).trips)
+    stats = solution.FlightSearchStats()
+
+    # WHEN
+    query.max_frontier = 100
+    truncated = flight_oracle.find_flights(query, stats)
+    query.on_limit = solution.FlightQuery.ON_LIMIT_IDDFS
+    deepened = flight_oracle.find_flights(query)
+    query.max_frontier = 0
+    query.max_results = 10
+    limited = flight_oracle.find_flights(query)
+
+    # THEN
+    assert truncated.truncated
+    assert stats.truncated > 0 and stats.peak_bytes > 0
+    assert 0 < len(truncated.trips) < len(expected)
+    assert all(t.flights in expected for t in truncated.trips)
+    assert not deepened.truncated
+    assert sorted(t.flights for t in deepened.trips) == expected
+    assert limited.truncated and len(limited.trips) == 10
+    assert len(list(flight_oracle.iter_flights(query))) == 10
+
+    # WHEN
+    solution.main(["datasets/example3.csv", "WUE", "NNB", "--max_memory", "1"])
+
+    # THEN
+    out, err = capsys.readouterr()
+    assert json.loads(out)
+    assert "truncated" not in err
+    solution.main(["datasets/example3.csv", "WUE", "NNB", "--max_frontier", "100"])
+    out, err = capsys.readouterr()
+    assert 0 < len(json.loads(out)) < len(expected)
+    assert "truncated" in err
+    for name in ("max_frontier", "max_results", "max_memory_mb"):
+        with pytest.raises(ValueError):
+            solution.FlightQuery(
+                origin="WUE", destination="NNB", **{name: -1}
+            ).validate()
+    with pytest.raises(ValueError):
+        solution.FlightQuery(origin="WUE", destination="NNB", on_limit="x").validate()
+
+
+@pytest.mark.parametrize("max_stops", [0, 1, 3])
+def test_iddfs_fallback(max_stops):
+    # GIVEN
+    flight_oracle = solution.FlightOracle(
+        solution.FlightDataset("datasets/example3.csv").load()
+    )
+    query = solution.FlightQuery(
+        origin="WUE", destination="NNB", bags_count=1, max_stops=max_stops
+    )
+    expected = flight_oracle.find_flights(query).to_json()
+    stats = solution.FlightSearchStats()
+
+    # WHEN
+    # the limit is hit by the first expansion - trips are found by iterative
+    # deepening depth first search
+    query.max_frontier = 1
+    query.on_limit = solution.FlightQuery.ON_LIMIT_IDDFS
+    result = flight_oracle.find_flights(query, stats)
+
+    # THEN
+    assert not result.truncated
+    assert sorted(json.loads(result.to_json()), key=json.dumps) == sorted(
+        json.loads(expected), key=json.dumps
+    )
+    assert stats.found == len(result.trips)